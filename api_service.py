@@ -7,10 +7,14 @@ API服务模块
 
 import base64
 import json
+import math
+import time
 import requests
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Union
 from io import BytesIO
-from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QPixmap, QImage
 
 
 # API提供商预设配置
@@ -38,36 +42,84 @@ API_PROVIDERS = {
     }
 }
 
+# 语音识别提供商预设配置（本地服务需兼容 OpenAI 的 /v1/audio/transcriptions 接口，
+# 如 faster-whisper-server、LocalAI 等）
+STT_PROVIDER_SILICONFLOW = "硅基流动"
+STT_PROVIDER_LOCAL = "本地 (OpenAI兼容)"
+STT_PROVIDER_CUSTOM = "自定义"
+STT_PROVIDERS = {
+    STT_PROVIDER_SILICONFLOW: {
+        "endpoint": "https://api.siliconflow.cn/v1/audio/transcriptions",
+        "model": "FunAudioLLM/SenseVoiceSmall"
+    },
+    STT_PROVIDER_LOCAL: {
+        "endpoint": "http://127.0.0.1:8000/v1/audio/transcriptions",
+        "model": "whisper-1"
+    },
+    STT_PROVIDER_CUSTOM: {
+        "endpoint": "",
+        "model": ""
+    }
+}
 
-def get_text_from_image(api_key: str, endpoint: str, model: str, pixmap: QPixmap) -> str:
+# 截图文字识别引擎
+OCR_BACKEND_CLOUD = "云端多模态"
+OCR_BACKEND_LOCAL = "本地OCR"
+OCR_BACKEND_AUTO = "自动 (本地优先)"
+OCR_BACKENDS = [OCR_BACKEND_CLOUD, OCR_BACKEND_LOCAL, OCR_BACKEND_AUTO]
+
+
+# 截图识别提示词
+IMAGE_OCR_PROMPT = (
+    "你的任务是扮演一位专业的游戏场景分析师，精确地分析我提供的游戏截图。"
+    "请严格按照以下格式进行输出，缺一不可：\\n\\n"
+    "## 画面描述\\n"
+    "[在这里用1-2句话，客观、精炼地描述画面中的核心内容。例如：在昏暗的审讯室里，一个身穿红衣的女人正低头沉思，对面的宦官打扮的男人表情严肃地看着她。]\\n\\n"
+    "## 对话内容\\n"
+    "[在这里一字不差地、完整地提取出图片中所有的对话文本、旁白、系统提示或任何形式的文字内容。如果图片中没有任何文字，请在此处明确写出\"无对话文字\"。]"
+)
+
+# 分块识别：每个区块只提取文字
+TILE_OCR_PROMPT = (
+    "这是一张游戏截图中的局部区块。请一字不差地提取其中所有文字，"
+    "按从上到下、从左到右的阅读顺序输出，每行文字单独一行，不要添加任何解释或标题。"
+    "如果区块中没有任何文字，只输出\"无对话文字\"。"
+)
+
+# 分块识别：缩略全图只生成画面描述
+OVERVIEW_PROMPT = (
+    "你的任务是扮演一位专业的游戏场景分析师。"
+    "请用1-2句话，客观、精炼地描述这张游戏截图的核心内容，不要提取文字，不要添加标题。"
+)
+
+
+def _encode_image_base64(image) -> str:
+    """将QPixmap或QImage编码为PNG格式的Base64字符串"""
+    from PyQt6.QtCore import QBuffer, QIODevice
+    qbuffer = QBuffer()
+    qbuffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(qbuffer, "PNG")
+    return base64.b64encode(qbuffer.data().data()).decode('utf-8')
+
+
+def _post_vision_request(api_key: str, endpoint: str, model: str, base64_image: str,
+                         system_prompt: str, user_text: str = "请识别图片中的文字内容：",
+                         max_tokens: int = 1000) -> tuple:
     """
-    使用多模态大模型API从图像中提取文字 (智能适配OpenAI格式和Gemini格式)
+    发送一次多模态请求 (智能适配OpenAI格式和Gemini格式)
+
+    Returns:
+        tuple: (HTTP状态码, 模型回复或错误信息)，网络异常时状态码为0
     """
     try:
         is_gemini = "googleapis.com" in endpoint
 
-        # 将QPixmap转换为Base64字符串
-        from PyQt6.QtCore import QBuffer, QIODevice
-        qbuffer = QBuffer()
-        qbuffer.open(QIODevice.OpenModeFlag.WriteOnly)
-        pixmap.save(qbuffer, "PNG")
-        image_data = qbuffer.data().data()
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-
         if is_gemini:
             # Gemini API的特殊处理
             final_endpoint = f"{endpoint.replace('/openai/chat/completions', '')}/models/{model}:generateContent?key={api_key}"
             headers = {"Content-Type": "application/json"}
 
             # 构建Gemini的多模态请求体
-            system_prompt = (
-                "你的任务是扮演一位专业的游戏场景分析师，精确地分析我提供的游戏截图。"
-                "请严格按照以下格式进行输出，缺一不可：\\n\\n"
-                "## 画面描述\\n"
-                "[在这里用1-2句话，客观、精炼地描述画面中的核心内容。例如：在昏暗的审讯室里，一个身穿红衣的女人正低头沉思，对面的宦官打扮的男人表情严肃地看着她。]\\n\\n"
-                "## 对话内容\\n"
-                "[在这里一字不差地、完整地提取出图片中所有的对话文本、旁白、系统提示或任何形式的文字内容。如果图片中没有任何文字，请在此处明确写出\"无对话文字\"。]"
-            )
             request_body = {
                 "contents": [
                     {
@@ -86,23 +138,15 @@ def get_text_from_image(api_key: str, endpoint: str, model: str, pixmap: QPixmap
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {api_key}"
             }
-            system_prompt = (
-                "你的任务是扮演一位专业的游戏场景分析师，精确地分析我提供的游戏截图。"
-                "请严格按照以下格式进行输出，缺一不可：\\n\\n"
-                "## 画面描述\\n"
-                "[在这里用1-2句话，客观、精炼地描述画面中的核心内容。例如：在昏暗的审讯室里，一个身穿红衣的女人正低头沉思，对面的宦官打扮的男人表情严肃地看着她。]\\n\\n"
-                "## 对话内容\\n"
-                "[在这里一字不差地、完整地提取出图片中所有的对话文本、旁白、系统提示或任何形式的文字内容。如果图片中没有任何文字，请在此处明确写出\"无对话文字\"。]"
-            )
             request_body = {
                 "model": model,
-                "max_tokens": 1000,
+                "max_tokens": max_tokens,
                 "messages": [
                     {"role": "system", "content": system_prompt},
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": "请识别图片中的文字内容："},
+                            {"type": "text", "text": user_text},
                             {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
                         ]
                     }
@@ -122,30 +166,234 @@ def get_text_from_image(api_key: str, endpoint: str, model: str, pixmap: QPixmap
                 # 解析Gemini的响应
                 candidates = response_data.get("candidates", [])
                 if candidates and "content" in candidates[0] and "parts" in candidates[0]["content"]:
-                    return candidates[0]["content"]["parts"][0].get("text", "未识别到文字")
-                return "Gemini API返回格式异常"
+                    return 200, candidates[0]["content"]["parts"][0].get("text", "未识别到文字")
+                return 200, "Gemini API返回格式异常"
             else:
                 # 解析OpenAI的响应
                 if "choices" in response_data and len(response_data["choices"]) > 0:
                     message = response_data["choices"][0].get("message", {})
-                    return message.get("content", "未识别到文字").strip()
-                return "API返回格式异常，未找到文字内容"
+                    return 200, message.get("content", "未识别到文字").strip()
+                return 200, "API返回格式异常，未找到文字内容"
         else:
             try:
                 error_data = response.json()
                 error_message = error_data.get("error", {}).get("message", "未知错误")
-                return f"API调用失败 (状态码: {response.status_code}): {error_message}"
+                return response.status_code, f"API调用失败 (状态码: {response.status_code}): {error_message}"
             except:
-                return f"API调用失败，状态码: {response.status_code}"
+                return response.status_code, f"API调用失败，状态码: {response.status_code}"
 
     except requests.exceptions.Timeout:
-        return "API调用超时，请检查网络连接"
+        return 0, "API调用超时，请检查网络连接"
     except requests.exceptions.ConnectionError:
-        return "网络连接错误，请检查API端点地址和网络状态"
+        return 0, "网络连接错误，请检查API端点地址和网络状态"
+    except Exception as e:
+        return 0, f"图像识别过程中出现错误: {str(e)}"
+
+
+def _as_qimage(image: Union[QPixmap, QImage]) -> QImage:
+    """统一为QImage（工作线程中只能安全使用QImage）"""
+    return image.toImage() if isinstance(image, QPixmap) else image
+
+
+def get_text_from_image(api_key: str, endpoint: str, model: str, pixmap: Union[QPixmap, QImage],
+                        tile_options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    使用多模态大模型API从图像中提取文字 (智能适配OpenAI格式和Gemini格式)
+
+    图像像素数超过 tile_options["pixel_threshold"] 时自动切换为分块并行识别，
+    避免服务商压缩大图导致小字丢失。
+    """
+    options = tile_options or {}
+    pixel_threshold = int(options.get("pixel_threshold", 0))
+    if pixel_threshold > 0 and pixmap.width() * pixmap.height() > pixel_threshold:
+        return get_text_from_image_tiled(api_key, endpoint, model, _as_qimage(pixmap), options)
+
+    try:
+        base64_image = _encode_image_base64(pixmap)
+    except Exception as e:
+        return f"图像识别过程中出现错误: {str(e)}"
+    _, result = _post_vision_request(api_key, endpoint, model, base64_image, IMAGE_OCR_PROMPT)
+    return result
+
+
+def compute_tiles(width: int, height: int, tile_size: int = 1600, overlap: int = 160) -> List[QRect]:
+    """
+    将图像划分为相互重叠的区块，按从上到下、从左到右的顺序返回
+
+    每个方向上的区块数取不超过 tile_size 所需的最小值，再按该数量均分长度，
+    使相邻区块恰好重叠 overlap 像素。
+    """
+    def _spans(length: int) -> List[Tuple[int, int]]:
+        if length <= tile_size:
+            return [(0, length)]
+        count = math.ceil((length - overlap) / (tile_size - overlap))
+        size = math.ceil((length + (count - 1) * overlap) / count)
+        return [(min(i * (size - overlap), length - size), size) for i in range(count)]
+
+    return [QRect(x, y, w, h) for y, h in _spans(height) for x, w in _spans(width)]
+
+
+def _normalize_line(line: str) -> str:
+    """去掉空白和标点后用于比较的文本"""
+    return "".join(char for char in line if char.isalnum())
+
+
+def _tile_lines(text: str) -> List[str]:
+    """解析单个区块的识别结果为文本行（去掉模型可能附带的标题和"无对话文字"）"""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line == "无对话文字":
+            continue
+        lines.append(line)
+    return lines
+
+
+def merge_tile_texts(tile_results: List[Tuple[QRect, List[str]]]) -> List[str]:
+    """
+    按阅读顺序合并各区块的文本行，并去除重叠区域造成的重复行
+
+    与相邻（重叠）区块中已输出的行相同、或互为包含关系的行视为重复：
+    较短的一方被丢弃，较长（更完整）的一方保留在先出现的位置。
+    """
+    merged = []  # [原始行, 规范化文本, 所属区块]
+    for rect, lines in tile_results:
+        for line in lines:
+            key = _normalize_line(line)
+            if not key:
+                continue
+            duplicate = False
+            for entry in merged:
+                # 只与有重叠的区块比较，避免误删画面中不同位置的相同文字
+                if entry[2] == rect or not entry[2].intersects(rect):
+                    continue
+                if key in entry[1]:
+                    duplicate = True
+                    break
+                if entry[1] in key and len(entry[1]) >= 2:
+                    entry[0], entry[1] = line, key
+                    duplicate = True
+                    break
+            if not duplicate:
+                merged.append([line, key, rect])
+    return [entry[0] for entry in merged]
+
+
+def get_text_from_image_tiled(api_key: str, endpoint: str, model: str, image: QImage,
+                              tile_options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    分块并行识别超大截图
+
+    图像被切分为相互重叠的区块并发识别文字（并发数受 max_workers 限制，遇到限流自动重试），
+    同时将缩略全图单独请求一次用于生成画面描述，最后按阅读顺序合并并去重。
+
+    Args:
+        tile_options: {"tile_size", "overlap", "max_workers", "overview_size"}
+
+    Returns:
+        str: 与 get_text_from_image 相同格式的识别结果或错误信息
+    """
+    options = tile_options or {}
+    tile_size = max(512, int(options.get("tile_size", 1600)))
+    overlap = min(tile_size // 4, max(0, int(options.get("overlap", 160))))
+    max_workers = max(1, int(options.get("max_workers", 4)))
+    overview_size = max(256, int(options.get("overview_size", 1280)))
+
+    def _request(region_image: QImage, system_prompt: str, user_text: str) -> tuple:
+        """发送一次请求，遇到限流 (429) 时按 Retry-After 或指数退避重试"""
+        base64_image = _encode_image_base64(region_image)
+        for attempt in range(3):
+            status, text = _post_vision_request(api_key, endpoint, model, base64_image, system_prompt, user_text)
+            if status != 429:
+                break
+            time.sleep(2 ** attempt)
+        return status, text
+
+    try:
+        start_time = time.perf_counter()
+        tiles = compute_tiles(image.width(), image.height(), tile_size, overlap)
+        overview = image.scaled(overview_size, overview_size, Qt.AspectRatioMode.KeepAspectRatio,
+                                Qt.TransformationMode.SmoothTransformation)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            overview_future = executor.submit(_request, overview, OVERVIEW_PROMPT, "请描述这张截图：")
+            tile_futures = [executor.submit(_request, image.copy(rect), TILE_OCR_PROMPT, "请提取区块中的文字：")
+                            for rect in tiles]
+            tile_responses = [future.result() for future in tile_futures]
+            overview_status, description = overview_future.result()
+
+        tile_results = [(rect, _tile_lines(text)) for rect, (status, text) in zip(tiles, tile_responses)
+                        if status == 200]
+        failed = len(tiles) - len(tile_results)
+        if not tile_results:
+            return tile_responses[0][1]
+
+        print(f"分块识别完成：{len(tiles)} 个区块 ({tile_size}px, 重叠 {overlap}px)，并发 {max_workers}，"
+              f"失败 {failed} 个，耗时 {time.perf_counter() - start_time:.1f} 秒")
+
+        lines = merge_tile_texts(tile_results)
+        if failed:
+            lines.append(f"（{failed}/{len(tiles)} 个区块识别失败，部分文字可能缺失）")
+        if overview_status != 200:
+            description = "（画面描述生成失败）"
+
+        return (
+            "## 画面描述\n"
+            f"{description.strip()}\n\n"
+            "## 对话内容\n"
+            f"{chr(10).join(lines) if lines else '无对话文字'}"
+        )
+
     except Exception as e:
         return f"图像识别过程中出现错误: {str(e)}"
 
 
+def recognize_image_text(api_key: str, endpoint: str, model: str, pixmap: Union[QPixmap, QImage],
+                         ocr_options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    按识别引擎路由规则提取截图文字
+
+    - 云端多模态：直接调用 get_text_from_image
+    - 本地OCR：只使用本地Tesseract，不产生API调用
+    - 自动：先用本地OCR，置信度低于阈值或未识别到文字时回退到云端多模态模型
+
+    Args:
+        ocr_options: {"backend", "lang", "min_confidence", "tesseract_cmd", "tiling"}，缺省为云端；
+                     "tiling" 为云端识别的分块参数，见 get_text_from_image
+
+    Returns:
+        str: 与 get_text_from_image 相同格式的识别结果或错误信息
+    """
+    options = ocr_options or {}
+    backend = options.get("backend", OCR_BACKEND_CLOUD)
+
+    if backend in (OCR_BACKEND_LOCAL, OCR_BACKEND_AUTO):
+        from local_ocr import get_text_from_image_local, is_local_ocr_available
+
+        tesseract_cmd = options.get("tesseract_cmd", "")
+        if is_local_ocr_available(tesseract_cmd):
+            result, confidence = get_text_from_image_local(
+                _as_qimage(pixmap), options.get("lang", "chi_sim"), tesseract_cmd
+            )
+            failed = result.startswith("本地OCR")
+
+            if backend == OCR_BACKEND_LOCAL:
+                return f"图像识别过程中出现错误: {result}" if failed else result
+
+            min_confidence = float(options.get("min_confidence", 70))
+            if not failed and confidence >= min_confidence and not result.endswith("无对话文字"):
+                print(f"本地OCR识别完成，置信度 {confidence:.1f}")
+                return result
+            print(f"本地OCR置信度不足 ({confidence:.1f} < {min_confidence:.0f})，回退到云端模型")
+
+        elif backend == OCR_BACKEND_LOCAL:
+            return "图像识别过程中出现错误: 本地OCR引擎不可用，请安装 pytesseract 与 Tesseract-OCR（含 chi_sim 语言包）"
+        else:
+            print("本地OCR引擎不可用，回退到云端模型")
+
+    return get_text_from_image(api_key, endpoint, model, pixmap, options.get("tiling"))
+
+
 def send_chat_request(api_key: str, endpoint: str, model: str, messages: list, max_tokens: int = 2000) -> str:
     """
     发送对话请求到对话模型API (智能适配OpenAI格式和Gemini格式)
@@ -280,6 +528,26 @@ def save_api_config(config: dict) -> bool:
         return False
 
 
+def get_stt_settings(config: dict, provider_name: str = "") -> tuple:
+    """
+    读取语音识别提供商的配置
+
+    硅基流动的 API Key 沿用 stt_siliconflow_api_key；其余提供商保存在 stt_providers 中，
+    端点或模型留空时使用 STT_PROVIDERS 中的预设。
+
+    Returns:
+        tuple: (API Key, 端点, 模型名称)
+    """
+    provider_name = provider_name or config.get("stt_provider", STT_PROVIDER_SILICONFLOW)
+    preset = STT_PROVIDERS.get(provider_name, STT_PROVIDERS[STT_PROVIDER_CUSTOM])
+    saved = config.get("stt_providers", {}).get(provider_name, {})
+    if provider_name == STT_PROVIDER_SILICONFLOW:
+        api_key = config.get("stt_siliconflow_api_key", "")
+    else:
+        api_key = saved.get("api_key", "")
+    return api_key, saved.get("endpoint") or preset["endpoint"], saved.get("model") or preset["model"]
+
+
 def get_provider_config(provider_name: str) -> dict:
     """
     获取指定提供商的预设配置
@@ -456,35 +724,40 @@ def test_api_connection(api_key: str, endpoint: str, model: str) -> dict:
         return {"success": False, "message": f"测试异常: {str(e)}"}
 
 
-def get_text_from_audio(api_key: str, audio_data: bytes, sample_rate: int = 16000) -> str:
+def get_text_from_audio(api_key: str, audio_data: bytes, sample_rate: int = 16000,
+                        filename: str = "temp_audio.wav", mime_type: str = "audio/wav",
+                        endpoint: str = "", model: str = "", timeout: float = 30) -> str:
     """
-    使用硅基流动语音识别API将音频转换为文字
+    调用语音识别API（OpenAI 兼容的 /audio/transcriptions 接口）将音频转换为文字
 
     Args:
-        api_key: 硅基流动API密钥
-        audio_data: WAV格式音频数据
+        api_key: API密钥，本地服务不需要时可留空
+        audio_data: 编码后的音频数据（WAV / FLAC / Ogg Opus，见 audio_processing.encode_audio）
         sample_rate: 采样率，默认16000Hz
+        filename: 上传文件名，服务端按扩展名识别格式
+        mime_type: 上传文件的MIME类型
+        endpoint: 识别接口地址，留空使用硅基流动
+        model: 模型名称，留空使用 SenseVoiceSmall
+        timeout: 请求超时秒数
 
     Returns:
         str: 识别出的文字内容，失败时返回错误信息
     """
     try:
-        # 硅基流动语音识别API端点
-        endpoint = "https://api.siliconflow.cn/v1/audio/transcriptions"
+        preset = STT_PROVIDERS[STT_PROVIDER_SILICONFLOW]
+        endpoint = endpoint or preset["endpoint"]
 
         # 构建请求头 (不设置Content-Type，让requests自动设置)
-        headers = {
-            "Authorization": f"Bearer {api_key}"
-        }
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
 
         # 构建data参数
         data = {
-            "model": "FunAudioLLM/SenseVoiceSmall"
+            "model": model or preset["model"]
         }
 
         # 构建files参数 (使用multipart/form-data格式)
         files = {
-            "file": ("temp_audio.wav", audio_data, "audio/wav")
+            "file": (filename, audio_data, mime_type)
         }
 
         # 发送请求
@@ -493,7 +766,7 @@ def get_text_from_audio(api_key: str, audio_data: bytes, sample_rate: int = 1600
             headers=headers,
             data=data,
             files=files,
-            timeout=30
+            timeout=timeout
         )
 
         if response.status_code == 200:
@@ -516,24 +789,28 @@ def get_text_from_audio(api_key: str, audio_data: bytes, sample_rate: int = 1600
         return f"语音识别过程中出现错误: {str(e)}"
 
 
-def test_stt_connectivity(api_key: str) -> tuple:
+def test_stt_connectivity(api_key: str, endpoint: str = "", model: str = "") -> tuple:
     """
     测试语音识别API连接
 
     Args:
-        api_key: 硅基流动API密钥
+        api_key: API密钥，本地服务不需要时可留空
+        endpoint: 识别接口地址，留空使用硅基流动；测试时请求同一服务的 /models 接口
+        model: 模型名称，留空使用 SenseVoiceSmall
 
     Returns:
         tuple: (成功状态, 消息) 例如 (True, "连接成功") 或 (False, "错误信息...")
     """
     try:
-        # 硅基流动语音识别API端点
-        endpoint = "https://api.siliconflow.cn/v1/models"
+        preset = STT_PROVIDERS[STT_PROVIDER_SILICONFLOW]
+        model = model or preset["model"]
+        endpoint = (endpoint or preset["endpoint"]).rstrip("/")
+        if endpoint.endswith("/audio/transcriptions"):
+            endpoint = endpoint[:-len("/audio/transcriptions")]
+        endpoint += "/models"
 
         # 构建请求头
-        headers = {
-            "Authorization": f"Bearer {api_key}"
-        }
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
 
         # 发送简单的模型列表请求来测试连接
         response = requests.get(
@@ -548,13 +825,13 @@ def test_stt_connectivity(api_key: str) -> tuple:
                 models_data = response.json()
                 models = models_data.get("data", [])
 
-                # 检查是否包含SenseVoice模型
-                has_stt_model = any("SenseVoice" in model.get("id", "") for model in models)
+                # 检查是否包含所配置的语音识别模型
+                has_stt_model = any(model == item.get("id", "") for item in models)
 
                 if has_stt_model:
-                    return (True, "语音识别API连接成功，支持SenseVoice模型！")
+                    return (True, f"语音识别API连接成功，支持 {model} 模型！")
                 else:
-                    return (True, "API连接成功，但未发现SenseVoice语音识别模型")
+                    return (True, f"API连接成功，但模型列表中未发现 {model}")
             except:
                 return (True, "API连接成功！")
         else:
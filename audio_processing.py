@@ -5,146 +5,1330 @@
 实现"按住说话"功能的音频录制和语音转文字
 """
 
-import pyaudio
+import abc
 import wave
 import io
+import mmap
+import struct
+import tempfile
+import time
 import threading
-from PyQt6.QtCore import QThread, pyqtSignal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+try:
+    import pyaudio
+except ImportError:  # 没有录音设备的构建机可只用文件回放或合成数据源
+    pyaudio = None
+
+try:
+    import soundfile
+except ImportError:  # 压缩上传为可选功能，未安装时只能上传WAV
+    soundfile = None
+
+
+# 语音识别结果中表示失败的前缀
+STT_ERROR_PREFIXES = ("语音识别API调用失败", "网络连接错误", "语音识别API调用超时", "语音识别过程中出现错误")
+
+# 持续收录时识别积压超过上限而被丢弃的片段
+SEGMENT_DROPPED = "片段积压，已丢弃"
+
+# 语音识别上传格式：名称 -> (上传文件名, MIME类型, soundfile 容器格式, soundfile 编码)
+AUDIO_FORMAT_WAV = "WAV (无压缩)"
+AUDIO_FORMAT_FLAC = "FLAC (无损)"
+AUDIO_FORMAT_OPUS = "Opus (语音有损)"
+AUDIO_FORMATS = {
+    AUDIO_FORMAT_WAV: ("temp_audio.wav", "audio/wav", None, None),
+    AUDIO_FORMAT_FLAC: ("temp_audio.flac", "audio/flac", "FLAC", "PCM_16"),
+    AUDIO_FORMAT_OPUS: ("temp_audio.ogg", "audio/ogg", "OGG", "OPUS"),
+}
+
+
+def is_audio_format_available(audio_format: str) -> bool:
+    """检查上传格式是否可用（FLAC / Opus 需要 soundfile 及其自带的 libsndfile 支持）"""
+    if audio_format not in AUDIO_FORMATS:
+        return False
+    _, _, container, subtype = AUDIO_FORMATS[audio_format]
+    if container is None:
+        return True
+    if soundfile is None:
+        return False
+    try:
+        return soundfile.check_format(container, subtype)
+    except Exception:
+        return False
+
+
+def encode_audio(pcm_data, sample_rate: int, audio_format: str = AUDIO_FORMAT_WAV,
+                 channels: int = 1) -> Tuple[bytes, str, str]:
+    """
+    将 16 位 PCM 编码为上传格式
+
+    pcm_data 可以是 bytes 或 RecordingBuffer；RecordingBuffer 上传WAV时原地写入文件头并直接引用，不复制。
+    所选格式不可用或编码失败时回退到 WAV，保证总能得到可上传的数据。
+
+    Returns:
+        tuple: (编码后的音频数据, 上传文件名, MIME类型)
+    """
+    if audio_format != AUDIO_FORMAT_WAV and is_audio_format_available(audio_format):
+        filename, mime_type, container, subtype = AUDIO_FORMATS[audio_format]
+        try:
+            pcm_view = pcm_data.pcm_view() if isinstance(pcm_data, RecordingBuffer) else pcm_data
+            samples = np.frombuffer(pcm_view, dtype=np.int16).reshape(-1, channels)
+            buffer = io.BytesIO()
+            soundfile.write(buffer, samples, sample_rate, format=container, subtype=subtype)
+            return buffer.getvalue(), filename, mime_type
+        except Exception as e:
+            print(f"{audio_format} 编码失败，改为上传WAV: {str(e)}")
+    elif audio_format != AUDIO_FORMAT_WAV:
+        print(f"{audio_format} 不可用（需要安装 soundfile），改为上传WAV")
+
+    filename, mime_type, _, _ = AUDIO_FORMATS[AUDIO_FORMAT_WAV]
+    if isinstance(pcm_data, RecordingBuffer):
+        return pcm_data.wav_view(sample_rate, channels), filename, mime_type
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm_data)
+    return buffer.getvalue(), filename, mime_type
+
+
+def synthetic_speech_pcm(seconds: float, sample_rate: int = 16000, seed: int = 0) -> bytes:
+    """
+    生成类语音的 16 位 PCM：基频缓慢变化的谐波，按约 4 Hz 的音节包络起伏，叠加少量底噪
+
+    用于没有麦克风时的测试与基准（延迟对比、编码体积等），不代表真实识别效果。
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.5)
+    signal = 6000 * voiced * envelope + rng.normal(0, 60, t.size)
+    return np.clip(signal, -32768, 32767).astype(np.int16).tobytes()
+
+
+def detect_speech_frames(samples: np.ndarray, frame_size: int, min_energy: float = 300.0,
+                         noise_factor: float = 3.0, zcr_threshold: float = 0.25) -> np.ndarray:
+    """
+    基于短时能量和过零率的语音活动检测
+
+    每帧计算 RMS 能量与过零率：能量高于阈值判为语音；能量略低（阈值一半以上）但过零率高的帧
+    多为 s、sh 等清辅音，同样判为语音。能量阈值取 min_energy 与"底噪 × noise_factor"中的较大者，
+    底噪估计为各帧能量的 10% 分位数（连续说话时该估计偏高，因此最多取 min_energy 的 4 倍）。
+
+    Args:
+        samples: int16 单声道采样
+        frame_size: 每帧采样数
+
+    Returns:
+        np.ndarray: 每帧是否为语音的布尔数组（不足一帧的尾部不计）
+    """
+    frame_count = samples.size // frame_size
+    if frame_count == 0:
+        return np.zeros(0, dtype=bool)
+
+    frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size).astype(np.float32)
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_size - 1)
+
+    threshold = max(min_energy, min(float(np.percentile(energy, 10)) * noise_factor, min_energy * 4))
+    return (energy > threshold) | ((energy > threshold * 0.5) & (zcr > zcr_threshold))
+
+
+def _speech_keep_mask(samples: np.ndarray, sample_rate: int, frame_ms: int, padding_ms: int,
+                      max_gap_ms: int, min_energy: float) -> tuple:
+    """
+    计算裁剪静音时每帧是否保留
+
+    Returns:
+        tuple: (每帧是否保留的布尔数组，无语音时为None, 每帧采样数)
+    """
+    frame_size = max(1, sample_rate * frame_ms // 1000)
+    speech = detect_speech_frames(samples, frame_size, min_energy)
+    if not speech.any():
+        return None, frame_size
+
+    # 语音帧前后扩展 padding：用卷积做一维膨胀
+    pad_frames = max(0, padding_ms // frame_ms)
+    keep = np.convolve(speech.astype(np.int8), np.ones(2 * pad_frames + 1, dtype=np.int8), mode="same") > 0
+
+    # 压缩中间的长停顿：每段静音只保留首尾各 max_gap/2
+    half_gap = max(1, max_gap_ms // frame_ms // 2)
+    padded = np.concatenate(([1], keep.astype(np.int8), [1]))
+    edges = np.diff(padded)
+    gap_starts = np.flatnonzero(edges == -1)
+    gap_ends = np.flatnonzero(edges == 1)
+    for start, end in zip(gap_starts, gap_ends):
+        if start == 0 or end == keep.size:
+            continue  # 首尾静音整段裁掉
+        if end - start > 2 * half_gap:
+            keep[start:start + half_gap] = True
+            keep[end - half_gap:end] = True
+        else:
+            keep[start:end] = True
+    return keep, frame_size
+
+
+def trim_silence(pcm_data: bytes, sample_rate: int = 16000, frame_ms: int = 20, padding_ms: int = 200,
+                 max_gap_ms: int = 500, min_energy: float = 300.0) -> tuple:
+    """
+    裁掉录音首尾的静音，并把中间过长的停顿压缩到 max_gap_ms
+
+    语音帧前后各保留 padding_ms 的余量，避免切掉字头字尾；
+    超过 max_gap_ms 的静音段只保留开头和结尾各一半。
+
+    Returns:
+        tuple: (裁剪后的PCM数据，无语音时为None, 统计信息字典)
+    """
+    samples = np.frombuffer(pcm_data, dtype=np.int16)
+    keep, frame_size = _speech_keep_mask(samples, sample_rate, frame_ms, padding_ms, max_gap_ms, min_energy)
+
+    original_seconds = samples.size / float(sample_rate)
+    stats = {"speech": keep is not None, "original_seconds": original_seconds, "kept_seconds": 0.0,
+             "saved_seconds": original_seconds, "saved_bytes": len(pcm_data)}
+    if keep is None:
+        return None, stats
+
+    frame_count = keep.size
+    kept = samples[:frame_count * frame_size].reshape(frame_count, frame_size)[keep].ravel()
+    trimmed = kept.tobytes()
+
+    stats["kept_seconds"] = kept.size / float(sample_rate)
+    stats["saved_seconds"] = original_seconds - stats["kept_seconds"]
+    stats["saved_bytes"] = len(pcm_data) - len(trimmed)
+    return trimmed, stats
+
+
+def split_at_silence(pcm_data, sample_rate: int = 16000, max_chunk_seconds: float = 30.0,
+                     search_seconds: float = 10.0, frame_ms: int = 20) -> list:
+    """
+    把长录音切成不超过 max_chunk_seconds 的片段，切点选在每个片段末尾 search_seconds 内最安静的一帧，
+    尽量不把一句话切成两半
+
+    Returns:
+        list: [(起始字节, 结束字节), ...]，按顺序覆盖整段录音
+    """
+    samples = np.frombuffer(pcm_data, dtype=np.int16)
+    total = samples.size
+    max_chunk = max(1, int(max_chunk_seconds * sample_rate))
+    if total <= max_chunk:
+        return [(0, total * 2)] if total else []
+
+    frame_size = max(1, sample_rate * frame_ms // 1000)
+    frame_count = total // frame_size
+    frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size).astype(np.float32)
+    energy = np.mean(frames * frames, axis=1)
+
+    max_frames = max(1, max_chunk // frame_size)
+    search_frames = max(1, min(int(search_seconds * 1000 / frame_ms), max_frames // 2))
+    ranges = []
+    start = 0
+    while frame_count - start > max_frames:
+        window_start = start + max_frames - search_frames
+        cut = window_start + int(np.argmin(energy[window_start:start + max_frames]))
+        ranges.append((start * frame_size * 2, cut * frame_size * 2))
+        start = cut
+    ranges.append((start * frame_size * 2, total * 2))
+    return ranges
+
+
+WAV_HEADER_SIZE = 44
+
+
+class RecordingBuffer:
+    """
+    录音缓冲区：音频线程只把数据写入预分配的固定大小的块，块的分配和转存由后台线程完成
+
+    后台线程始终备好几个空块，写满一块时音频线程直接换用下一块，不在回调中扩容或复制；
+    录音超过 spill_bytes 后，后台线程把写满的块依次写入临时文件，内存占用交给系统页缓存管理。
+    录音结束后 finish() 把各块合并为连续的数据（转存过的直接映射临时文件），开头预留 WAV 文件头的位置，
+    上传WAV时原地写入文件头并直接引用缓冲区；裁剪静音也在缓冲区内原地完成。
+    """
+
+    def __init__(self, initial_bytes: int = 2 * 1024 * 1024, spill_bytes: int = 64 * 1024 * 1024,
+                 block_bytes: int = 1024 * 1024):
+        self.spill_bytes = spill_bytes
+        self.block_bytes = max(4096, block_bytes)
+        self.length = 0              # 已写入的PCM字节数
+        self.grow_count = 0          # 录音开始后新分配的块数
+        self.spill_file = None
+        self.spilled_bytes = 0       # 已写入临时文件的PCM字节数
+        self.data = None             # finish() 之后的连续数据（WAV文件头 + PCM）
+
+        # 录音中：当前写入的块、写满待处理的块、备用的空块（deque 的两端操作是线程安全的）
+        self.spare_target = max(2, -(-max(0, initial_bytes) // self.block_bytes))
+        self.spare = deque(bytearray(self.block_bytes) for _ in range(self.spare_target))
+        self.full_blocks = deque()
+        self.current = self.spare.popleft()
+        self.current_used = 0
+
+        self.finished = False
+        self.wakeup = threading.Event()
+        self.worker = threading.Thread(target=self._maintain, name="RecordingBufferWorker", daemon=True)
+        self.worker.start()
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def capacity(self) -> int:
+        if self.data is not None:
+            return len(self.data) - WAV_HEADER_SIZE
+        blocks = len(self.full_blocks) + len(self.spare) + 1
+        return self.spilled_bytes + blocks * self.block_bytes
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_file is not None
+
+    def append(self, chunk: bytes):
+        """追加一块PCM数据（在音频线程中调用，只复制这块数据，不分配内存）"""
+        with memoryview(chunk) as source:
+            offset = 0
+            while offset < len(source):
+                size = min(self.block_bytes - self.current_used, len(source) - offset)
+                with memoryview(self.current) as target:
+                    target[self.current_used:self.current_used + size] = source[offset:offset + size]
+                self.current_used += size
+                self.length += size
+                offset += size
+                if self.current_used == self.block_bytes:
+                    self._next_block()
+
+    def _next_block(self):
+        """当前块已写满：交给后台线程，换用一个备用块（备用块来不及准备时才在音频线程中分配）"""
+        self.full_blocks.append(self.current)
+        if self.spare:
+            self.current = self.spare.popleft()
+        else:
+            self.current = bytearray(self.block_bytes)
+            self.grow_count += 1
+        self.current_used = 0
+        self.wakeup.set()
+
+    def _maintain(self):
+        """后台线程：补足备用块，超过转存阈值后把写满的块写入临时文件"""
+        while not self.finished:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.finished:
+                break
+            while len(self.spare) < self.spare_target:
+                self.spare.append(bytearray(self.block_bytes))
+                self.grow_count += 1
+            if self.spill_file is None and self.length <= self.spill_bytes:
+                continue
+            try:
+                self._spill_full_blocks()
+            except Exception as e:
+                print(f"录音转存到临时文件失败: {str(e)}")
+
+    def _spill_full_blocks(self):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="recording_", suffix=".pcm")
+            self.spill_file.write(bytes(WAV_HEADER_SIZE))
+            print(f"录音超过 {self.spill_bytes / 1024 / 1024:.0f} MB，转存到临时文件")
+        while self.full_blocks:
+            self.spill_file.write(self.full_blocks[0])
+            self.spilled_bytes += self.block_bytes
+            self.full_blocks.popleft()
+
+    def finish(self):
+        """录音结束后（音频线程不再写入时）调用：停止后台线程，把各块合并为连续的数据"""
+        if self.data is not None:
+            return
+        self.finished = True
+        self.wakeup.set()
+        self.worker.join()
+        self.spare.clear()
+
+        tail = memoryview(self.current)[:self.current_used]
+        if self.spill_file is not None:
+            self._spill_full_blocks()
+            self.spill_file.write(tail)
+            self.spill_file.flush()
+            self.data = mmap.mmap(self.spill_file.fileno(), WAV_HEADER_SIZE + self.length)
+        else:
+            self.data = bytearray(WAV_HEADER_SIZE + self.length)
+            with memoryview(self.data) as target:
+                position = WAV_HEADER_SIZE
+                for block in self.full_blocks:
+                    target[position:position + self.block_bytes] = block
+                    position += self.block_bytes
+                target[position:position + self.current_used] = tail
+        tail.release()
+        self.full_blocks.clear()
+        self.current = None
+
+    def pcm_view(self) -> memoryview:
+        """引用已录制的PCM数据（不复制）"""
+        return memoryview(self.data)[WAV_HEADER_SIZE:WAV_HEADER_SIZE + self.length]
+
+    def wav_view(self, sample_rate: int, channels: int = 1, sample_width: int = 2) -> memoryview:
+        """在预留位置原地写入WAV文件头，返回完整WAV数据的引用（不复制）"""
+        byte_rate = sample_rate * channels * sample_width
+        struct.pack_into(
+            "<4sI4s4sIHHIIHH4sI", self.data, 0, b"RIFF", 36 + self.length, b"WAVE", b"fmt ", 16, 1, channels,
+            sample_rate, byte_rate, channels * sample_width, sample_width * 8, b"data", self.length)
+        return memoryview(self.data)[:WAV_HEADER_SIZE + self.length]
+
+    def keep_frames(self, keep: np.ndarray, frame_bytes: int):
+        """原地只保留 keep 为True的帧（各段依次前移），丢弃不足一帧的尾部"""
+        padded = np.concatenate(([0], keep.astype(np.int8), [0]))
+        edges = np.diff(padded)
+        view = memoryview(self.data)
+        write = WAV_HEADER_SIZE
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            source = WAV_HEADER_SIZE + int(start) * frame_bytes
+            size = int(end - start) * frame_bytes
+            if source != write:
+                view[write:write + size] = view[source:source + size]
+            write += size
+        view.release()
+        self.length = write - WAV_HEADER_SIZE
+
+    def close(self):
+        """停止后台线程并释放临时文件；仍有上传中的引用时交给垃圾回收"""
+        if not self.finished:
+            self.finished = True
+            self.wakeup.set()
+            self.worker.join()
+            self.spare.clear()
+            self.full_blocks.clear()
+        if self.spill_file is None:
+            return
+        try:
+            self.data.close()
+        except BufferError:
+            return
+        self.spill_file.close()
+        self.spill_file = None
+
+
+class PauseSegmenter:
+    """
+    按说话停顿切分录音
+
+    逐块计算音量 (RMS)，累计到足够的语音后，一旦出现超过 pause_ms 的静音
+    （或片段超过 max_segment_seconds）就切出一个片段。尚未出现语音时只保留
+    很短的前置静音，避免长时间静默占用内存。
+    """
+
+    def __init__(self, sample_rate: int = 16000, silence_rms: float = 400, pause_ms: int = 700,
+                 min_speech_ms: int = 300, max_segment_seconds: float = 15.0, preroll_ms: int = 300):
+        self.sample_rate = sample_rate
+        self.silence_rms = silence_rms
+        self.pause_ms = pause_ms
+        self.min_speech_ms = min_speech_ms
+        self.max_segment_ms = max_segment_seconds * 1000
+        self.preroll_ms = preroll_ms
+        self._reset()
+
+    def _reset(self):
+        self.blocks = deque()
+        self.block_ms = deque()
+        self.total_ms = 0.0
+        self.speech_ms = 0.0
+        self.silence_run_ms = 0.0
+
+    def _take(self) -> bytes:
+        segment = b"".join(self.blocks)
+        self._reset()
+        return segment
+
+    def feed(self, block: bytes) -> Optional[bytes]:
+        """
+        输入一块16位单声道PCM数据
+
+        Returns:
+            bytes: 切出的完整片段（PCM），尚未形成片段时返回None
+        """
+        samples = np.frombuffer(block, dtype=np.int16)
+        if samples.size == 0:
+            return None
+        duration_ms = samples.size * 1000.0 / self.sample_rate
+        rms = float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+
+        self.blocks.append(block)
+        self.block_ms.append(duration_ms)
+        self.total_ms += duration_ms
+
+        if rms >= self.silence_rms:
+            self.speech_ms += duration_ms
+            self.silence_run_ms = 0.0
+        else:
+            self.silence_run_ms += duration_ms
+
+        if self.speech_ms == 0:
+            # 还没开始说话：只保留一小段前置静音
+            while self.total_ms - self.block_ms[0] >= self.preroll_ms:
+                self.blocks.popleft()
+                self.total_ms -= self.block_ms.popleft()
+            return None
+
+        if self.speech_ms >= self.min_speech_ms and (self.silence_run_ms >= self.pause_ms or
+                                                     self.total_ms >= self.max_segment_ms):
+            return self._take()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        """录音结束时取出剩余片段，语音过短时丢弃"""
+        if self.speech_ms >= self.min_speech_ms:
+            return self._take()
+        self._reset()
+        return None
+
+
+class AudioSource(abc.ABC):
+    """
+    录音数据源：打开后持续以回调方式交出 16 位 PCM 数据块
+
+    回调签名为 callback(数据块, 帧数, 是否发生输入溢出)，在数据源自己的线程中调用，须快速返回。
+    dropped_frames / cpu_seconds 为打开以来累计的丢失帧数和回调占用的采集线程CPU时间，
+    None 表示数据源无法统计（由录音器按时长估计丢帧）。
+    """
+
+    def __init__(self):
+        self.dropped_frames = None
+        self.cpu_seconds = None
+
+    @abc.abstractmethod
+    def start(self, sample_rate: int, channels: int, chunk_size: int, callback) -> bool:
+        """打开数据源并开始回调，失败时返回False"""
+
+    def stop(self):
+        pass
+
+    def is_active(self) -> bool:
+        return False
+
+
+class PyAudioSource(AudioSource):
+    """麦克风（或"立体声混音"等回环设备）输入：PyAudio 回调模式，由 PortAudio 的音频线程取数"""
+
+    def __init__(self, input_device_index: Optional[int] = None):
+        super().__init__()
+        # 输入设备序号，None 为系统默认麦克风
+        self.input_device_index = input_device_index
+        self.pyaudio_instance = None
+        self.stream = None
+
+    def start(self, sample_rate: int, channels: int, chunk_size: int, callback) -> bool:
+        if pyaudio is None:
+            print("未安装 PyAudio，无法打开录音设备")
+            return False
+
+        def _stream_callback(in_data, frame_count, time_info, status_flags):
+            callback(in_data, frame_count, bool(status_flags & pyaudio.paInputOverflow))
+            return None, pyaudio.paContinue
+
+        self.pyaudio_instance = pyaudio.PyAudio()
+        try:
+            self.stream = self.pyaudio_instance.open(
+                format=pyaudio.paInt16,
+                channels=channels,
+                rate=sample_rate,
+                input=True,
+                input_device_index=self.input_device_index,
+                frames_per_buffer=chunk_size,
+                stream_callback=_stream_callback
+            )
+        except Exception:
+            # 打开失败时释放PyAudio，避免残留的 PortAudio 实例
+            self.stop()
+            raise
+        return True
+
+    def stop(self):
+        """关闭音频流（stop_stream 会等待回调线程结束）并释放PyAudio"""
+        try:
+            if self.stream:
+                self.stream.stop_stream()
+                self.stream.close()
+        except Exception as e:
+            print(f"关闭音频流失败: {str(e)}")
+        finally:
+            self.stream = None
+
+        if self.pyaudio_instance:
+            self.pyaudio_instance.terminate()
+            self.pyaudio_instance = None
+
+    def is_active(self) -> bool:
+        return bool(self.stream and self.stream.is_active())
+
+
+class _PacedSource(AudioSource):
+    """
+    模拟数据源的基类：后台线程按采样率的节奏交出数据块，用于没有麦克风时测试和调优录音器
+
+    speed 为相对实时的倍速，0 表示不限速。模拟声卡 device_buffer_blocks 个块的缓冲区：
+    回调处理过慢、落后超过缓冲容量时像真实设备一样丢弃数据，并在下一块报告输入溢出。
+    """
+
+    def __init__(self, speed: float = 1.0, device_buffer_blocks: int = 4):
+        super().__init__()
+        self.speed = speed
+        self.device_buffer_blocks = device_buffer_blocks
+        self.dropped_frames = 0
+        self.cpu_seconds = 0.0
+        self.running = False
+        self.thread = None
+
+    @abc.abstractmethod
+    def _prepare(self, sample_rate: int, channels: int) -> bool:
+        """打开数据（每次 start 时调用），参数不支持时返回False"""
+
+    @abc.abstractmethod
+    def _read_block(self, frames: int) -> Optional[bytes]:
+        """读取下一块数据，数据耗尽时返回None"""
+
+    def start(self, sample_rate: int, channels: int, chunk_size: int, callback) -> bool:
+        if self.running or not self._prepare(sample_rate, channels):
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(sample_rate, channels, chunk_size, callback),
+                                       name=type(self).__name__, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def is_active(self) -> bool:
+        return self.running
+
+    def _run(self, sample_rate: int, channels: int, chunk_size: int, callback):
+        period = chunk_size / sample_rate / self.speed if self.speed > 0 else 0.0
+        next_time = time.monotonic()
+        overflow = False
+
+        while self.running:
+            if period:
+                lag = time.monotonic() - next_time
+                if lag < 0:
+                    time.sleep(-lag)
+                elif lag > period * self.device_buffer_blocks:
+                    # 设备缓冲区已满：落后期间的数据被丢弃，只保留缓冲区内的块
+                    lost_blocks = int(lag / period) - self.device_buffer_blocks
+                    for _ in range(lost_blocks):
+                        if self._read_block(chunk_size) is None:
+                            break
+                        self.dropped_frames += chunk_size
+                    next_time += lost_blocks * period
+                    overflow = True
+
+            block = self._read_block(chunk_size)
+            if block is None:
+                break
+
+            cpu_start = time.thread_time()
+            callback(block, len(block) // (2 * channels), overflow)
+            self.cpu_seconds += time.thread_time() - cpu_start
+            overflow = False
+            next_time += period
+
+        self.running = False
+
+
+class SyntheticSource(_PacedSource):
+    """
+    合成语音数据源：循环播放 synthetic_speech_pcm 生成的片段
+
+    seconds 为总时长，None 表示一直产生数据直到 stop()。
+    """
+
+    def __init__(self, seconds: Optional[float] = None, speed: float = 1.0, seed: int = 0,
+                 loop_seconds: float = 10.0, device_buffer_blocks: int = 4):
+        super().__init__(speed, device_buffer_blocks)
+        self.seconds = seconds
+        self.seed = seed
+        self.loop_seconds = loop_seconds
+        self.clip = b""
+        self.frame_bytes = 2
+        self.position = 0
+        self.remaining = None
+
+    def _prepare(self, sample_rate: int, channels: int) -> bool:
+        clip_seconds = min(self.seconds, self.loop_seconds) if self.seconds else self.loop_seconds
+        samples = np.frombuffer(synthetic_speech_pcm(clip_seconds, sample_rate, self.seed), dtype=np.int16)
+        self.clip = np.repeat(samples, channels).tobytes() if channels > 1 else samples.tobytes()
+        self.frame_bytes = 2 * channels
+        self.position = 0
+        self.remaining = int(self.seconds * sample_rate) * self.frame_bytes if self.seconds else None
+        return len(self.clip) > 0
+
+    def _read_block(self, frames: int) -> Optional[bytes]:
+        size = frames * self.frame_bytes
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return None
+            size = min(size, self.remaining)
+            self.remaining -= size
+
+        end = self.position + size
+        if end <= len(self.clip):
+            block = self.clip[self.position:end]
+        else:
+            # 片段结尾与开头拼接
+            block = self.clip[self.position:] + self.clip[:end - len(self.clip)]
+        self.position = end % len(self.clip)
+        return block
+
+
+class WavFileSource(_PacedSource):
+    """WAV 录音回放数据源：按实时节奏（或 speed 倍速）回放 16 位 WAV，loop 为真时循环播放"""
+
+    def __init__(self, path: str, loop: bool = False, speed: float = 1.0, device_buffer_blocks: int = 4):
+        super().__init__(speed, device_buffer_blocks)
+        self.path = path
+        self.loop = loop
+        self.wav_file = None
+
+    def _prepare(self, sample_rate: int, channels: int) -> bool:
+        self._close_file()
+        try:
+            self.wav_file = wave.open(self.path, "rb")
+        except Exception as e:
+            print(f"打开回放录音失败: {str(e)}")
+            return False
+
+        params = (self.wav_file.getsampwidth(), self.wav_file.getnchannels(), self.wav_file.getframerate())
+        if params != (2, channels, sample_rate):
+            print(f"回放录音格式不匹配: {self.path} 为 {params[0] * 8} 位 {params[1]} 声道 {params[2]} Hz，"
+                  f"需要 16 位 {channels} 声道 {sample_rate} Hz")
+            self._close_file()
+            return False
+        return True
+
+    def _read_block(self, frames: int) -> Optional[bytes]:
+        if self.wav_file is None:
+            return None
+        block = self.wav_file.readframes(frames)
+        if not block and self.loop and self.wav_file.getnframes() > 0:
+            self.wav_file.rewind()
+            block = self.wav_file.readframes(frames)
+        if not block:
+            self._close_file()
+            return None
+        return block
+
+    def _close_file(self):
+        if self.wav_file is not None:
+            self.wav_file.close()
+            self.wav_file = None
+
+
+def create_audio_source(spec: str = "", input_device_index: Optional[int] = None) -> AudioSource:
+    """
+    按配置创建录音数据源
+
+    Args:
+        spec: 留空为麦克风；"synthetic" 为合成语音；其它值视为 WAV 录音路径（实时循环回放）
+        input_device_index: 麦克风输入设备序号
+    """
+    if not spec:
+        return PyAudioSource(input_device_index)
+    if spec == "synthetic":
+        return SyntheticSource()
+    return WavFileSource(spec, loop=True)
 
 
 class AudioRecorder:
     """
     简单的音频录制器，用于"按住说话"功能
+
+    数据来自 AudioSource（默认为 PyAudio 麦克风，也可换成 WAV 回放或合成数据源）：
+    数据源线程持续把数据块写入 RecordingBuffer 的预分配块（回调只复制数据，扩容和转存由缓冲区的后台线程完成），
+    GUI 线程不做任何阻塞读取。
+
+    语音功能开启期间可调用 open_session() 保持设备常开：录音间隙的数据进入预录缓冲，
+    开始录音时不再打开设备，并带上按键前的一小段声音，避免首字被截断。
     """
 
-    def __init__(self):
-        # 音频参数
+    def __init__(self, source: Optional[AudioSource] = None):
+        # 音频参数（16位深度）
         self.sample_rate = 16000      # 采样率 16kHz
         self.channels = 1             # 单声道
         self.chunk_size = 1024        # 每次读取的样本数
-        self.format = pyaudio.paInt16 # 16位深度
 
         # 录制状态
         self.is_recording = False
-        self.audio_frames = []
-        self.pyaudio_instance = None
-        self.stream = None
+        self.buffer = None
+        # 录音数据源，默认为系统默认麦克风
+        self.source = source or PyAudioSource()
+
+        # 常驻音频会话：录音间隙的数据块进入预录缓冲（deque 满后自动丢弃最旧的块）
+        self.session_open = False
+        self.preroll_frames = deque()
+        # 保护"预录 / 录音"状态切换，避免切换瞬间的数据块被丢弃或重复
+        self.state_lock = threading.Lock()
+
+        # 边录边切分：设置后每切出一个片段就调用 on_segment(序号, PCM数据)（在音频线程中调用）
+        self.segmenter = None
+        self.on_segment = None
+        self.segment_count = 0
+
+        # 录音缓冲：预分配约 buffer_initial_seconds 秒，超过 spill_mb 后转存到临时文件
+        self.buffer_initial_seconds = 60
+        self.spill_mb = 64
+
+        # 上传前裁剪静音（语音活动检测），last_vad_stats 记录最近一次的节省情况
+        self.vad_enabled = True
+        self.last_vad_stats = {}
+
+        # 录制统计（回调线程写入，停止录制后读取）
+        self.start_time = 0.0
+        self.callback_count = 0
+        self.frames_received = 0
+        self.overflow_count = 0
+        # 录音开始时数据源的累计丢帧数和采集线程CPU时间，用于计算本次录音的增量
+        self.source_marks = (0, 0.0)
+        self.last_stats = {}
+
+    def open_session(self, preroll_ms: int = 300) -> bool:
+        """
+        打开常驻音频会话：打开数据源并持续采集，录音间隙的数据只保留最近 preroll_ms 毫秒
+
+        Returns:
+            bool: 是否成功打开；失败时 start_recording 仍会按需临时打开设备
+        """
+        if self.session_open:
+            return True
+        if self.is_recording:
+            return False
+
+        preroll_blocks = max(0, round(preroll_ms / 1000 * self.sample_rate / self.chunk_size))
+        self.preroll_frames = deque(maxlen=preroll_blocks)
+        if self._open_stream():
+            self.session_open = True
+            return True
+        self._close_stream()
+        return False
+
+    def close_session(self):
+        """关闭常驻音频会话并释放设备；正在录音时在停止录音后关闭"""
+        self.session_open = False
+        if not self.is_recording:
+            self._close_stream()
+        self.preroll_frames.clear()
+
+    def _open_stream(self) -> bool:
+        """打开数据源，由数据源线程持续回调取数"""
+        try:
+            start_time = time.perf_counter()
+            if not self.source.start(self.sample_rate, self.channels, self.chunk_size, self._audio_callback):
+                return False
+            print(f"打开录音设备耗时 {(time.perf_counter() - start_time) * 1000:.0f} ms")
+            return True
+        except Exception as e:
+            print(f"打开录音设备失败: {str(e)}")
+            return False
+
+    def _close_stream(self):
+        """关闭数据源（会等待回调线程结束）"""
+        self.source.stop()
 
     def start_recording(self):
-        """开始录制"""
+        """开始录制；常驻会话已打开时立即开始，并带上按键前的预录数据"""
         if self.is_recording:
             return False
 
         try:
-            # 初始化PyAudio
-            self.pyaudio_instance = pyaudio.PyAudio()
+            # 设备被拔出或驱动重置后流会停止，重新打开会话
+            if self.session_open and not self.source.is_active():
+                print("常驻录音设备已失效，重新打开")
+                self.session_open = False
+                self._close_stream()
+                self.open_session(round(self.preroll_frames.maxlen * self.chunk_size / self.sample_rate * 1000))
 
-            # 打开音频流
-            self.stream = self.pyaudio_instance.open(
-                format=self.format,
-                channels=self.channels,
-                rate=self.sample_rate,
-                input=True,
-                frames_per_buffer=self.chunk_size
-            )
+            self.last_vad_stats = {}
+            self.segment_count = 0
+            self.callback_count = 0
+            self.overflow_count = 0
+            self.source_marks = (self.source.dropped_frames or 0, self.source.cpu_seconds or 0.0)
+
+            if not self.session_open:
+                # 未打开常驻会话：临时打开设备，打开后的第一个数据块就开始录制
+                self.buffer = self._new_buffer_if_needed()
+                self.frames_received = 0
+                self.start_time = time.monotonic()
+                self.is_recording = True
+                if not self._open_stream():
+                    self.is_recording = False
+                    self._close_stream()
+                    if self.buffer is not None:
+                        self.buffer.close()
+                        self.buffer = None
+                    return False
+                return True
 
-            self.is_recording = True
-            self.audio_frames = []
+            # 在锁内切换到录音状态，预录缓冲中的数据作为录音开头
+            buffer = self._new_buffer_if_needed()
+            with self.state_lock:
+                self.buffer = buffer
+                for block in self.preroll_frames:
+                    self._consume_block(block)
+                self.frames_received = len(self.preroll_frames) * self.chunk_size
+                self.start_time = time.monotonic() - self.frames_received / self.sample_rate
+                self.preroll_frames.clear()
+                self.is_recording = True
             return True
 
         except Exception as e:
             print(f"开始录制失败: {str(e)}")
             return False
 
+    def _new_buffer_if_needed(self) -> Optional[RecordingBuffer]:
+        """按当前参数创建本次录音的缓冲区（每次录音独立，上一段可能仍在上传）；边录边切分时不保留整段录音，返回None"""
+        if self.segmenter and self.on_segment:
+            return None
+        bytes_per_second = self.sample_rate * self.channels * 2
+        return RecordingBuffer(int(self.buffer_initial_seconds * bytes_per_second),
+                               int(self.spill_mb * 1024 * 1024))
+
     def stop_recording(self):
-        """停止录制并返回音频数据"""
+        """停止录制并返回 16 位 PCM 录音缓冲区（上传前由识别线程按所选格式编码）"""
         if not self.is_recording:
             return None
 
         try:
-            self.is_recording = False
+            # 常驻会话保持设备打开，之后的数据回到预录缓冲；否则关闭设备
+            with self.state_lock:
+                self.is_recording = False
+            if not self.session_open:
+                self._close_stream()
 
-            # 关闭音频流
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
-                self.stream = None
+            self._update_stats()
+            buffer, self.buffer = self.buffer, None
 
-            if self.pyaudio_instance:
-                self.pyaudio_instance.terminate()
-                self.pyaudio_instance = None
+            # 边录边切分时取出最后一个未遇到停顿的片段，各片段已单独识别，不再返回整段录音
+            if self.segmenter and self.on_segment:
+                segment = self.segmenter.flush()
+                if segment:
+                    self._emit_segment(segment)
+                return None
 
-            # 将音频帧转换为WAV格式字节数据
-            if self.audio_frames:
-                return self._convert_to_wav(self.audio_frames)
-            else:
+            if buffer is None:
+                return None
+            # 音频线程已不再写入，把各块合并为连续的数据
+            buffer.finish()
+            if not buffer:
+                buffer.close()
                 return None
 
+            # 裁掉静音，整段无语音时不再上传
+            if self.vad_enabled and not self.apply_vad(buffer):
+                buffer.close()
+                return None
+
+            return buffer
+
         except Exception as e:
             print(f"停止录制失败: {str(e)}")
             return None
 
-    def record_chunk(self):
-        """录制一个音频块"""
-        if not self.is_recording or not self.stream:
-            return
+    def _audio_callback(self, in_data: bytes, frame_count: int, overflow: bool):
+        """数据源线程回调：只做追加和计数，不能阻塞"""
+        with self.state_lock:
+            if not self.is_recording:
+                # 录音间隙：只保留最近的预录数据
+                if in_data and self.preroll_frames.maxlen:
+                    self.preroll_frames.append(in_data)
+                return
 
-        try:
-            audio_data = self.stream.read(self.chunk_size, exception_on_overflow=False)
-            self.audio_frames.append(audio_data)
-        except Exception as e:
-            print(f"录制音频块失败: {str(e)}")
+            if overflow:
+                self.overflow_count += 1
+            if in_data:
+                self._consume_block(in_data)
+                self.frames_received += frame_count
+            self.callback_count += 1
 
-    def _convert_to_wav(self, audio_frames):
-        """将音频帧转换为WAV格式字节数据"""
-        try:
-            # 创建内存中的WAV文件
-            wav_buffer = io.BytesIO()
+    def _consume_block(self, block: bytes):
+        """边录边切分时只交给切分器（各片段单独识别，不保留整段录音），否则写入录音缓冲"""
+        if self.segmenter and self.on_segment:
+            segment = self.segmenter.feed(block)
+            if segment:
+                self._emit_segment(segment)
+        else:
+            self.buffer.append(block)
 
-            with wave.open(wav_buffer, 'wb') as wav_file:
-                wav_file.setnchannels(self.channels)
-                wav_file.setsampwidth(pyaudio.get_sample_size(self.format))
-                wav_file.setframerate(self.sample_rate)
+    def _emit_segment(self, pcm_data: bytes):
+        """按顺序编号并交出一个片段"""
+        index = self.segment_count
+        self.segment_count += 1
+        self.on_segment(index, pcm_data)
 
-                # 写入音频数据
-                for frame in audio_frames:
-                    wav_file.writeframes(frame)
+    def _update_stats(self):
+        """统计本次录音的时长、回调次数、输入溢出、丢失的帧数和采集线程CPU时间"""
+        elapsed = time.monotonic() - self.start_time if self.start_time else 0.0
+        if self.source.dropped_frames is not None:
+            dropped_frames = self.source.dropped_frames - self.source_marks[0]
+        else:
+            # 数据源无法统计时按时长估计；停止时最后一个未满的缓冲块不会回调，允许一个块的误差
+            expected_frames = int(elapsed * self.sample_rate)
+            dropped_frames = max(0, expected_frames - self.frames_received - self.chunk_size)
+        self.last_stats = {
+            "seconds": elapsed,
+            "callbacks": self.callback_count,
+            "frames": self.frames_received,
+            "overflows": self.overflow_count,
+            "dropped_frames": dropped_frames
+        }
+        if self.source.cpu_seconds is not None:
+            self.last_stats["capture_cpu_seconds"] = self.source.cpu_seconds - self.source_marks[1]
+        print(f"录音统计: 时长 {elapsed:.2f} 秒，回调 {self.callback_count} 次，"
+              f"输入溢出 {self.overflow_count} 次，估计丢失 {dropped_frames} 帧")
 
-            wav_buffer.seek(0)
-            return wav_buffer.read()
+    def apply_vad(self, buffer: RecordingBuffer, frame_ms: int = 20, padding_ms: int = 200,
+                  max_gap_ms: int = 500, min_energy: float = 300.0) -> bool:
+        """在缓冲区内原地裁剪静音（规则同 trim_silence）并记录统计，无语音时返回False"""
+        original_bytes = len(buffer)
+        samples = np.frombuffer(buffer.pcm_view(), dtype=np.int16)
+        keep, frame_size = _speech_keep_mask(samples, self.sample_rate, frame_ms, padding_ms, max_gap_ms, min_energy)
+        del samples
+        if keep is not None:
+            buffer.keep_frames(keep, frame_size * 2)
+
+        bytes_per_second = self.sample_rate * 2.0
+        stats = {"speech": keep is not None, "original_seconds": original_bytes / bytes_per_second,
+                 "kept_seconds": len(buffer) / bytes_per_second if keep is not None else 0.0}
+        stats["saved_seconds"] = stats["original_seconds"] - stats["kept_seconds"]
+        stats["saved_bytes"] = original_bytes - len(buffer) if keep is not None else original_bytes
+        self.last_vad_stats = stats
+        if keep is None:
+            print(f"语音活动检测: {stats['original_seconds']:.1f} 秒录音中未检测到语音，跳过上传")
+        else:
+            print(f"语音活动检测: 原始 {stats['original_seconds']:.1f} 秒 → 上传 {stats['kept_seconds']:.1f} 秒，"
+                  f"节省 {stats['saved_seconds']:.1f} 秒 / {stats['saved_bytes'] / 1024:.0f} KB")
+        return keep is not None
 
-        except Exception as e:
-            print(f"转换WAV格式失败: {str(e)}")
-            return None
+
+def list_input_devices() -> list:
+    """列出可用的录音输入设备，返回 [(设备序号, 设备名称), ...]"""
+    devices = []
+    if pyaudio is None:
+        return devices
+    instance = pyaudio.PyAudio()
+    try:
+        for index in range(instance.get_device_count()):
+            info = instance.get_device_info_by_index(index)
+            if info.get("maxInputChannels", 0) > 0:
+                devices.append((index, info.get("name", "")))
+    finally:
+        instance.terminate()
+    return devices
 
 
 class STTWorker(QThread):
     """
     语音转文字工作线程
+
+    pcm_data 为 16 位 PCM，可以是 bytes 或 AudioRecorder 返回的 RecordingBuffer
     """
 
     # 信号定义
     stt_completed = pyqtSignal(str)  # 转换完成
     stt_failed = pyqtSignal(str)     # 转换失败
 
-    def __init__(self, audio_data: bytes, api_key: str):
+    def __init__(self, pcm_data, api_key: str, sample_rate: int = 16000,
+                 audio_format: str = AUDIO_FORMAT_WAV, endpoint: str = "", model: str = ""):
         super().__init__()
-        self.audio_data = audio_data
+        self.pcm_data = pcm_data
         self.api_key = api_key
+        self.sample_rate = sample_rate
+        self.audio_format = audio_format
+        self.endpoint = endpoint
+        self.model = model
 
     def run(self):
         """执行语音转文字"""
         try:
             from api_service import get_text_from_audio
 
+            # 在工作线程中编码，避免压缩长录音时阻塞界面
+            start_time = time.perf_counter()
+            audio_data, filename, mime_type = encode_audio(self.pcm_data, self.sample_rate, self.audio_format)
+            print(f"音频编码: {filename} {len(self.pcm_data) / 1024:.0f} KB → {len(audio_data) / 1024:.0f} KB，"
+                  f"耗时 {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
             # 调用语音识别API
-            result = get_text_from_audio(self.api_key, self.audio_data)
+            result = get_text_from_audio(self.api_key, audio_data, self.sample_rate, filename, mime_type,
+                                         self.endpoint, self.model)
+
+            # 上传完成后释放录音缓冲（长录音可能占用临时文件）
+            audio_data = None
+            if isinstance(self.pcm_data, RecordingBuffer):
+                self.pcm_data.close()
 
             # 检查结果
-            if result.startswith(("语音识别API调用失败", "网络连接错误", "语音识别API调用超时", "语音识别过程中出现错误")):
+            if result.startswith(STT_ERROR_PREFIXES):
                 self.stt_failed.emit(result)
             else:
                 self.stt_completed.emit(result)
 
         except Exception as e:
-            self.stt_failed.emit(f"语音转文字异常: {str(e)}")
\ No newline at end of file
+            self.stt_failed.emit(f"语音转文字异常: {str(e)}")
+
+class ChunkedSTTWorker(QThread):
+    """
+    长录音分段识别工作线程
+
+    在静音处把录音切成不超过 max_chunk_seconds 的片段，限制并发数同时上传识别，
+    失败的片段单独重试，最后按顺序拼接。个别片段最终失败时以占位文字标出，不影响其余结果。
+    """
+
+    stt_completed = pyqtSignal(str)
+    stt_failed = pyqtSignal(str)
+    progress_updated = pyqtSignal(int, int)  # 已完成片段数, 片段总数
+
+    def __init__(self, pcm_data, api_key: str, sample_rate: int = 16000, audio_format: str = AUDIO_FORMAT_WAV,
+                 max_chunk_seconds: float = 30.0, max_workers: int = 3, max_retries: int = 2,
+                 endpoint: str = "", model: str = ""):
+        super().__init__()
+        self.pcm_data = pcm_data
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.model = model
+        self.sample_rate = sample_rate
+        self.audio_format = audio_format
+        self.max_chunk_seconds = max_chunk_seconds
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(0, max_retries)
+        self.done_lock = threading.Lock()
+        self.done_count = 0
+
+    def run(self):
+        try:
+            pcm_view = self.pcm_data.pcm_view() if isinstance(self.pcm_data, RecordingBuffer) else memoryview(self.pcm_data)
+            ranges = split_at_silence(pcm_view, self.sample_rate, self.max_chunk_seconds)
+            if not ranges:
+                self.stt_completed.emit("")
+                return
+
+            start_time = time.perf_counter()
+            self.progress_updated.emit(0, len(ranges))
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(
+                    lambda item: self._transcribe_chunk(item[0], pcm_view[item[1][0]:item[1][1]], len(ranges)),
+                    enumerate(ranges)))
+            pcm_view.release()
+            if isinstance(self.pcm_data, RecordingBuffer):
+                self.pcm_data.close()
+
+            failed = [index for index, (ok, _) in enumerate(results) if not ok]
+            print(f"分段识别: {len(ranges)} 段，失败 {len(failed)} 段，耗时 {time.perf_counter() - start_time:.1f} 秒")
+            if len(failed) == len(results):
+                self.stt_failed.emit(results[0][1])
+                return
+
+            texts = []
+            for index, (ok, text) in enumerate(results):
+                if not ok:
+                    texts.append(f"[第{index + 1}段识别失败]")
+                elif text != "未识别到语音内容":
+                    texts.append(text)
+            self.stt_completed.emit("\n".join(texts))
+
+        except Exception as e:
+            self.stt_failed.emit(f"语音转文字异常: {str(e)}")
+
+    def _transcribe_chunk(self, index: int, pcm_chunk, total: int) -> tuple:
+        """识别线程：编码并识别一个片段，失败时按 1、2、4 秒退避重试"""
+        from api_service import get_text_from_audio
+
+        audio_data, filename, mime_type = encode_audio(pcm_chunk, self.sample_rate, self.audio_format)
+        result = ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+                print(f"第{index + 1}段识别失败，第{attempt}次重试: {result}")
+            result = get_text_from_audio(self.api_key, audio_data, self.sample_rate, filename, mime_type,
+                                         self.endpoint, self.model)
+            if not result.startswith(STT_ERROR_PREFIXES):
+                break
+
+        with self.done_lock:
+            self.done_count += 1
+            self.progress_updated.emit(self.done_count, total)
+        return not result.startswith(STT_ERROR_PREFIXES), result
+
+
+class STTLatencyWorker(QThread):
+    """
+    语音识别延迟对比工作线程
+
+    用同一段合成音频依次请求各个提供商，每个重复 repeat 次，统计"编码 + 上传 + 识别"的耗时。
+    """
+
+    comparison_finished = pyqtSignal(list)  # [(提供商, 中位数ms, 最小ms, 最后一次结果), ...]
+
+    def __init__(self, targets: list, audio_format: str = AUDIO_FORMAT_WAV, seconds: float = 3.0, repeat: int = 3):
+        """
+        Args:
+            targets: [(提供商名称, API Key, 端点, 模型名称), ...]
+        """
+        super().__init__()
+        self.targets = targets
+        self.audio_format = audio_format
+        self.seconds = seconds
+        self.repeat = max(1, repeat)
+
+    def run(self):
+        from api_service import get_text_from_audio
+
+        sample_rate = 16000
+        pcm_data = synthetic_speech_pcm(self.seconds, sample_rate)
+        rows = []
+        for name, api_key, endpoint, model in self.targets:
+            timings = []
+            result = ""
+            for _ in range(self.repeat):
+                start_time = time.perf_counter()
+                audio_data, filename, mime_type = encode_audio(pcm_data, sample_rate, self.audio_format)
+                result = get_text_from_audio(api_key, audio_data, sample_rate, filename, mime_type, endpoint, model)
+                timings.append((time.perf_counter() - start_time) * 1000)
+                if result.startswith(STT_ERROR_PREFIXES):
+                    break
+            timings.sort()
+            rows.append((name, timings[len(timings) // 2], timings[0], result))
+        self.comparison_finished.emit(rows)
+
+
+class StreamingTranscriber(QObject):
+    """
+    边录边识别：录音过程中按停顿切出的片段并发上传识别，结果按片段顺序输出
+
+    片段可能乱序完成，先到的结果暂存，等前面的片段都完成后再依次发出 text_ready。
+    设置 max_pending 后，等待识别的片段达到上限时丢弃新片段，长时间收录时内存不会随积压增长。
+    """
+
+    # 信号定义
+    segment_ready = pyqtSignal(int, bytes)     # 音频线程切出片段（内部使用，跨线程排队到主线程）
+    segment_finished = pyqtSignal(int, str)    # 识别线程完成片段（内部使用）
+    text_ready = pyqtSignal(str)               # 按顺序输出的识别文字
+    timed_text_ready = pyqtSignal(float, str)  # 同 text_ready，附带片段开始的时间戳
+    progress_updated = pyqtSignal(int, int)    # 已完成片段数, 已切出片段数
+    all_finished = pyqtSignal(int)             # 录音结束且全部片段处理完毕，参数为成功识别的片段数
+
+    def __init__(self, recorder: AudioRecorder, api_key: str, max_workers: int = 3,
+                 audio_format: str = AUDIO_FORMAT_WAV, max_pending: int = 0, endpoint: str = "", model: str = ""):
+        super().__init__()
+        self.recorder = recorder
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.model = model
+        self.audio_format = audio_format
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.max_pending = max_pending
+
+        self.results = {}
+        self.segment_times = {}
+        self.next_index = 0
+        self.submitted = 0
+        self.finished_count = 0
+        self.recognized = 0
+        self.dropped = 0
+        self.expected_segments = None
+
+        # 本次录音各片段语音活动检测的累计节省（识别线程写入）
+        self.vad_lock = threading.Lock()
+        self.vad_totals = {"original_seconds": 0.0, "saved_seconds": 0.0, "saved_bytes": 0, "skipped": 0}
+
+        self.segment_ready.connect(self._submit_segment)
+        self.segment_finished.connect(self._on_segment_finished)
+
+    def attach(self, segmenter: PauseSegmenter):
+        """开始录音前调用：让录音器在音频线程中切分片段"""
+        self.recorder.segmenter = segmenter
+        self.recorder.on_segment = self.segment_ready.emit
+
+    def detach(self):
+        """停止录音后调用：断开切分回调，并在全部片段完成时发出 all_finished"""
+        self.recorder.segmenter = None
+        self.recorder.on_segment = None
+        # 音频线程已停止，此时的片段计数即为总数（部分片段的信号可能仍在排队）
+        self.expected_segments = self.recorder.segment_count
+        self._check_finished()
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未识别完成的片段数（排队中 + 识别中）"""
+        return self.submitted - self.finished_count
+
+    def _submit_segment(self, index: int, pcm_data: bytes):
+        """主线程：提交一个片段到识别线程池，积压达到上限时丢弃"""
+        bytes_per_second = self.recorder.sample_rate * self.recorder.channels * 2
+        self.segment_times[index] = time.time() - len(pcm_data) / bytes_per_second
+        over_limit = self.max_pending and self.pending >= self.max_pending
+        self.submitted = max(self.submitted, index + 1)
+        if over_limit:
+            self.dropped += 1
+            self._on_segment_finished(index, SEGMENT_DROPPED)
+            return
+        self.executor.submit(self._transcribe, index, pcm_data)
+        self.progress_updated.emit(self.next_index, self.submitted)
+
+    def _transcribe(self, index: int, pcm_data: bytes):
+        """识别线程：裁剪静音、按所选格式编码并调用语音识别API"""
+        try:
+            from api_service import get_text_from_audio
+            if self.recorder.vad_enabled:
+                trimmed, stats = trim_silence(pcm_data, self.recorder.sample_rate)
+                with self.vad_lock:
+                    self.vad_totals["original_seconds"] += stats["original_seconds"]
+                    self.vad_totals["saved_seconds"] += stats["saved_seconds"]
+                    self.vad_totals["saved_bytes"] += stats["saved_bytes"]
+                    self.vad_totals["skipped"] += 0 if stats["speech"] else 1
+                pcm_data = trimmed
+                if pcm_data is None:
+                    self.segment_finished.emit(index, "未识别到语音内容")
+                    return
+            sample_rate = self.recorder.sample_rate
+            audio_data, filename, mime_type = encode_audio(pcm_data, sample_rate, self.audio_format,
+                                                           self.recorder.channels)
+            result = get_text_from_audio(self.api_key, audio_data, sample_rate, filename, mime_type,
+                                         self.endpoint, self.model)
+        except Exception as e:
+            result = f"语音识别过程中出现错误: {str(e)}"
+        self.segment_finished.emit(index, result)
+
+    def _on_segment_finished(self, index: int, result: str):
+        """主线程：暂存结果，并按顺序输出已连续完成的片段"""
+        self.results[index] = result
+        self.finished_count += 1
+        while self.next_index in self.results:
+            text = self.results.pop(self.next_index)
+            started_at = self.segment_times.pop(self.next_index, time.time())
+            self.next_index += 1
+            if text.startswith(STT_ERROR_PREFIXES) or text == SEGMENT_DROPPED:
+                print(f"片段 {self.next_index} 识别失败: {text}")
+            elif text and text != "未识别到语音内容":
+                self.recognized += 1
+                self.text_ready.emit(text)
+                self.timed_text_ready.emit(started_at, text)
+        self.progress_updated.emit(self.next_index, self.submitted)
+        self._check_finished()
+
+    def _check_finished(self):
+        if self.expected_segments is not None and self.next_index >= self.expected_segments:
+            self.expected_segments = None
+            if self.recorder.vad_enabled:
+                totals = self.vad_totals
+                print(f"语音活动检测: 本次录音 {totals['original_seconds']:.1f} 秒，节省 {totals['saved_seconds']:.1f} 秒 / "
+                      f"{totals['saved_bytes'] / 1024:.0f} KB，跳过 {totals['skipped']} 个无语音片段")
+            self.executor.shutdown(wait=False)
+            self.all_finished.emit(self.recognized)
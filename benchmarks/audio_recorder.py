@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+录音器吞吐基准
+
+用合成语音（或 --wav 指定的录音）代替麦克风驱动 AudioRecorder，按 --speed 倍速回放
+5 秒到 60 分钟的录音，输出每种时长的：
+  - 丢失帧数 / 输入溢出次数（数据源模拟 4 块的声卡缓冲，回调跟不上节奏时丢帧）
+  - 采集线程CPU（回调耗时，占录音时长的比例）
+  - 录音缓冲区容量、扩容次数、是否转存到临时文件
+  - 停止录音（裁剪静音）、写入WAV文件头以及各上传格式的编码耗时
+
+无需麦克风和 PyAudio，可在构建机上运行。
+
+用法:
+    python benchmarks/audio_recorder.py [--durations 5,60,600,3600] [--speed 20] [--wav 录音.wav]
+                                        [--spill-mb 64] [--formats wav,flac] [--no-vad]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_processing import (AudioRecorder, SyntheticSource, WavFileSource, AUDIO_FORMATS,
+                              encode_audio, is_audio_format_available)
+
+
+def format_seconds(seconds: float) -> str:
+    return f"{seconds / 60:g} 分钟" if seconds >= 60 else f"{seconds:g} 秒"
+
+
+def run_recording(seconds: float, args, audio_formats: list):
+    if args.wav:
+        source = WavFileSource(args.wav, loop=True, speed=args.speed)
+    else:
+        source = SyntheticSource(seconds, speed=args.speed)
+    recorder = AudioRecorder(source)
+    recorder.spill_mb = args.spill_mb
+    recorder.vad_enabled = not args.no_vad
+
+    if not recorder.start_recording():
+        raise SystemExit("打开数据源失败")
+    start_time = time.monotonic()
+    if args.wav:
+        # 回放录音循环播放，按墙钟时间折算到目标时长
+        time.sleep(seconds / args.speed if args.speed > 0 else seconds)
+    else:
+        while source.is_active():
+            time.sleep(0.02)
+    wall_seconds = time.monotonic() - start_time
+
+    buffer = recorder.buffer
+    capacity, grow_count, spilled = buffer.capacity, buffer.grow_count, buffer.spilled
+
+    stop_start = time.perf_counter()
+    buffer = recorder.stop_recording()
+    stop_ms = (time.perf_counter() - stop_start) * 1000
+    stats = recorder.last_stats
+    audio_seconds = stats["frames"] / recorder.sample_rate
+    cpu_seconds = stats.get("capture_cpu_seconds", 0.0)
+
+    print(f"{format_seconds(seconds):>8} | 实际 {wall_seconds:7.1f} 秒墙钟 | "
+          f"丢帧 {stats['dropped_frames']:7d} ({stats['overflows']} 次溢出) | "
+          f"采集CPU {cpu_seconds * 1000:8.1f} ms ({cpu_seconds / max(audio_seconds, 1e-6) * 100:5.2f}% 录音时长) | "
+          f"缓冲 {capacity / 1024 / 1024:6.1f} MB (扩容 {grow_count} 次{'，已转存' if spilled else ''}) | "
+          f"停止+裁剪 {stop_ms:7.1f} ms")
+
+    if buffer is None:
+        print("         录音中未检测到语音")
+        return
+
+    header_start = time.perf_counter()
+    wav_data = buffer.wav_view(recorder.sample_rate)
+    header_ms = (time.perf_counter() - header_start) * 1000
+    wav_bytes = len(wav_data)
+    wav_data.release()
+    line = f"         WAV 文件头 {header_ms:6.3f} ms ({wav_bytes / 1024 / 1024:.1f} MB)"
+
+    for audio_format in audio_formats:
+        encode_start = time.perf_counter()
+        audio_data, _, _ = encode_audio(buffer, recorder.sample_rate, audio_format)
+        encode_ms = (time.perf_counter() - encode_start) * 1000
+        line += f" | {audio_format} {encode_ms:8.1f} ms ({len(audio_data) / 1024 / 1024:.1f} MB)"
+        if isinstance(audio_data, memoryview):
+            audio_data.release()
+        del audio_data
+    print(line)
+    buffer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录音器吞吐基准")
+    parser.add_argument("--durations", default="5,60,600,3600", help="录音时长列表（秒，逗号分隔）")
+    parser.add_argument("--speed", type=float, default=20.0, help="相对实时的回放倍速，0 为不限速（不会丢帧）")
+    parser.add_argument("--wav", help="使用指定的 16 位单声道 16 kHz WAV 录音代替合成语音（循环回放）")
+    parser.add_argument("--spill-mb", type=float, default=64, help="录音缓冲转存到临时文件的阈值（MB）")
+    parser.add_argument("--formats", default="", help="测量编码耗时的格式（wav,flac,opus，逗号分隔），留空为全部可用格式")
+    parser.add_argument("--no-vad", action="store_true", help="停止录音时不裁剪静音")
+    args = parser.parse_args()
+
+    audio_formats = [audio_format for audio_format in AUDIO_FORMATS if is_audio_format_available(audio_format)]
+    if args.formats:
+        wanted = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+        audio_formats = [audio_format for audio_format in audio_formats
+                         if audio_format.split()[0].lower() in wanted]
+
+    print(f"数据源: {args.wav or '合成语音'}，倍速 {args.speed:g}x，编码格式: {', '.join(audio_formats) or '无'}")
+    for seconds in (float(value) for value in args.durations.split(",") if value.strip()):
+        run_recording(seconds, args, audio_formats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OCR预处理性能基准
+
+在合成的 1080p / 4K 截图（渐变背景 + 对话框文字）上运行所有预处理预设，
+输出每个阶段的平均耗时。
+
+用法:
+    python benchmarks/ocr_preprocess.py [--repeat 10]
+无显示器环境可设置 QT_QPA_PLATFORM=offscreen 运行。
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtGui import QGuiApplication, QImage, QPainter, QColor, QFont, QLinearGradient
+from PyQt6.QtCore import QRect
+
+from image_processing import preprocess_for_ocr, PREPROCESS_PRESETS, PREPROCESS_NONE
+
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "4K": (3840, 2160),
+}
+
+
+def make_synthetic_frame(width: int, height: int) -> QImage:
+    """生成带渐变背景和半透明对话框文字的合成截图"""
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0.0, QColor(30, 60, 120))
+    gradient.setColorAt(1.0, QColor(200, 150, 60))
+    painter.fillRect(image.rect(), gradient)
+
+    box = QRect(width // 10, height * 3 // 4, width * 8 // 10, height // 6)
+    painter.fillRect(box, QColor(0, 0, 0, 150))
+    painter.setPen(QColor(240, 240, 240))
+    painter.setFont(QFont("Sans", max(12, height // 40)))
+    painter.drawText(box.adjusted(20, 20, -20, -20), 0, "旅行者，你终于来了。\nThe gate will open at dawn.")
+    painter.end()
+    return image
+
+
+def run_benchmark(label: str, width: int, height: int, repeat: int):
+    frame = make_synthetic_frame(width, height)
+    for preset in PREPROCESS_PRESETS:
+        if preset == PREPROCESS_NONE:
+            continue
+
+        # 预热一次，排除首次分配内存的开销
+        preprocess_for_ocr(frame, preset)
+        totals = {}
+        for _ in range(repeat):
+            _, timings = preprocess_for_ocr(frame, preset)
+            for stage, ms in timings.items():
+                totals[stage] = totals.get(stage, 0.0) + ms
+
+        stages = " | ".join(f"{stage} {ms / repeat:6.2f}" for stage, ms in totals.items())
+        print(f"{label:>5} {preset:<16} 合计 {sum(totals.values()) / repeat:7.2f} ms  ({stages})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR预处理性能基准")
+    parser.add_argument("--repeat", type=int, default=10, help="每个预设重复运行的次数")
+    args = parser.parse_args()
+
+    app = QGuiApplication(sys.argv)
+    for label, (width, height) in RESOLUTIONS.items():
+        run_benchmark(label, width, height, args.repeat)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
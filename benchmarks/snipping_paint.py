@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+截图遮罩重绘性能基准
+
+在合成的 4K / 8K 截图上模拟一次拖动框选，对比旧版"每次整屏重绘"
+与当前"预渲染遮罩 + 脏区域重绘"的单帧绘制耗时。
+
+用法:
+    python benchmarks/snipping_paint.py [--moves 120]
+无显示器环境可设置 QT_QPA_PLATFORM=offscreen 运行。
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import Qt, QRect, QPoint
+from PyQt6.QtGui import QPainter, QPen, QColor, QPixmap, QLinearGradient
+
+from snipping_tool import SnippingWidget
+
+
+RESOLUTIONS = {
+    "4K": (3840, 2160),
+    "8K": (7680, 4320),
+}
+
+
+def make_synthetic_pixmap(width: int, height: int) -> QPixmap:
+    """生成带渐变和色块的合成截图，避免纯色图被绘制引擎特殊优化"""
+    pixmap = QPixmap(width, height)
+    painter = QPainter(pixmap)
+    gradient = QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0.0, QColor(30, 60, 120))
+    gradient.setColorAt(1.0, QColor(200, 150, 60))
+    painter.fillRect(pixmap.rect(), gradient)
+    for i in range(0, width, 160):
+        painter.fillRect(QRect(i, (i * 7) % height, 120, 80), QColor((i * 13) % 255, 90, 160))
+    painter.end()
+    return pixmap
+
+
+def legacy_paint(canvas: QPixmap, screen_pixmap: QPixmap, logical_rect: QRect):
+    """旧版 paintEvent 的绘制流程：整屏贴图 + 整屏遮罩 + 选区贴图"""
+    painter = QPainter(canvas)
+    painter.drawPixmap(canvas.rect(), screen_pixmap)
+    painter.fillRect(canvas.rect(), QColor(0, 0, 0, 100))
+    painter.drawPixmap(logical_rect, screen_pixmap, logical_rect)
+    painter.setPen(QPen(QColor(0, 120, 215), 3))
+    painter.setBrush(Qt.BrushStyle.NoBrush)
+    painter.drawRect(logical_rect)
+    painter.fillRect(QRect(logical_rect.x() + 4, logical_rect.y() - 40, 90, 20), QColor(255, 255, 255, 220))
+    painter.setPen(QColor(0, 0, 0))
+    painter.drawText(logical_rect.x() + 8, logical_rect.y() - 25, f"{logical_rect.width()} × {logical_rect.height()}")
+    painter.end()
+
+
+def drag_path(width: int, height: int, moves: int):
+    """模拟从屏幕左上区域向右下拖动的鼠标轨迹"""
+    start = QPoint(width // 8, height // 6)
+    for step in range(1, moves + 1):
+        yield start, QPoint(start.x() + step * (width // 2) // moves,
+                            start.y() + step * (height // 2) // moves)
+
+
+def run_benchmark(label: str, width: int, height: int, moves: int):
+    screen_pixmap = make_synthetic_pixmap(width, height)
+    canvas = QPixmap(width, height)
+
+    # 旧版：每次鼠标移动都整屏重绘
+    start_time = time.perf_counter()
+    for start, end in drag_path(width, height, moves):
+        legacy_paint(canvas, screen_pixmap, QRect(start, end).normalized())
+    legacy_ms = (time.perf_counter() - start_time) * 1000 / moves
+
+    # 新版：遮罩预渲染（单独计时），之后每次只重绘新旧选区的并集
+    start_time = time.perf_counter()
+    widget = SnippingWidget(screen_pixmap, QRect(0, 0, width, height))
+    setup_ms = (time.perf_counter() - start_time) * 1000
+
+    widget.is_selecting = True
+    total_dirty_pixels = 0
+    start_time = time.perf_counter()
+    for start, end in drag_path(width, height, moves):
+        old_region = widget.selection_dirty_region()
+        widget.start_point, widget.end_point = start, end
+        dirty = old_region.united(widget.selection_dirty_region())
+        total_dirty_pixels += dirty.boundingRect().width() * dirty.boundingRect().height()
+        widget.render(canvas, QPoint(), dirty)
+    incremental_ms = (time.perf_counter() - start_time) * 1000 / moves
+
+    widget.is_selecting = False
+    widget.close()
+
+    dirty_ratio = total_dirty_pixels / moves / (width * height) * 100
+    print(f"{label:>3} ({width}x{height}) | 旧版整屏重绘 {legacy_ms:8.2f} ms/帧 | "
+          f"脏区域重绘 {incremental_ms:8.2f} ms/帧 (平均重绘面积 {dirty_ratio:5.1f}%) | "
+          f"遮罩预渲染 {setup_ms:8.2f} ms (一次性) | 加速 {legacy_ms / max(incremental_ms, 1e-6):5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图遮罩重绘性能基准")
+    parser.add_argument("--moves", type=int, default=120, help="模拟的鼠标移动次数")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    for label, (width, height) in RESOLUTIONS.items():
+        run_benchmark(label, width, height, args.moves)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
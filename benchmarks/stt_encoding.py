@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+语音识别上传格式基准
+
+对比 WAV / FLAC / Opus 的上传体积与编码耗时；提供 API Key 时额外测量
+"编码 + 上传 + 识别"的端到端耗时。
+
+输入为合成的类语音信号（带音节起伏的谐波 + 底噪），也可用 --wav 指定
+16 位单声道录音。
+
+用法:
+    python benchmarks/stt_encoding.py [--seconds 300] [--wav 录音.wav] [--api-key KEY] [--repeat 3]
+                                      [--endpoint URL --model NAME]
+"""
+
+import os
+import sys
+import time
+import wave
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_processing import AUDIO_FORMATS, encode_audio, is_audio_format_available, synthetic_speech_pcm
+
+
+def load_wav(path: str):
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1:
+            raise SystemExit("仅支持 16 位单声道 WAV")
+        return wav_file.readframes(wav_file.getnframes()), wav_file.getframerate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音识别上传格式基准")
+    parser.add_argument("--seconds", type=float, default=300, help="合成录音的时长（秒）")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="合成录音的采样率")
+    parser.add_argument("--wav", help="使用指定的 16 位单声道 WAV 录音代替合成信号")
+    parser.add_argument("--api-key", help="语音识别 API Key，提供时测量端到端识别耗时")
+    parser.add_argument("--endpoint", default="", help="语音识别端点，留空为硅基流动（本地服务可配合 --api-key none 使用）")
+    parser.add_argument("--model", default="", help="语音识别模型名称，留空为 SenseVoiceSmall")
+    parser.add_argument("--repeat", type=int, default=3, help="编码重复次数")
+    args = parser.parse_args()
+
+    if args.wav:
+        pcm_data, sample_rate = load_wav(args.wav)
+    else:
+        pcm_data, sample_rate = synthetic_speech_pcm(args.seconds, args.sample_rate), args.sample_rate
+    print(f"输入: {len(pcm_data) / 2 / sample_rate:.1f} 秒，{sample_rate} Hz，PCM {len(pcm_data) / 1024:.0f} KB")
+
+    for audio_format in AUDIO_FORMATS:
+        if not is_audio_format_available(audio_format):
+            print(f"{audio_format:<14} 不可用（需要安装 soundfile）")
+            continue
+
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            audio_data, filename, mime_type = encode_audio(pcm_data, sample_rate, audio_format)
+        encode_ms = (time.perf_counter() - start_time) * 1000 / args.repeat
+
+        line = (f"{audio_format:<14} {mime_type:<10} {len(audio_data) / 1024:8.0f} KB "
+                f"({len(audio_data) / len(pcm_data) * 100:5.1f}%) | 编码 {encode_ms:7.1f} ms")
+
+        if args.api_key:
+            from api_service import get_text_from_audio
+            start_time = time.perf_counter()
+            audio_data, filename, mime_type = encode_audio(pcm_data, sample_rate, audio_format)
+            api_key = "" if args.api_key == "none" else args.api_key
+            result = get_text_from_audio(api_key, audio_data, sample_rate, filename, mime_type,
+                                         args.endpoint, args.model)
+            line += f" | 端到端 {(time.perf_counter() - start_time) * 1000:7.0f} ms | {result[:30]}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,7 +38,7 @@ where py >NUL 2>&1 && (set "PYEXE=py -3") || (set "PYEXE=python")
 
 echo === Installing/updating dependencies ===
 %PYEXE% -m pip install -U pip >> "%LOG%" 2>&1 || goto error
-%PYEXE% -m pip install -U PyInstaller PyQt6 requests pillow pyaudio >> "%LOG%" 2>&1 || goto error
+%PYEXE% -m pip install -U PyInstaller PyQt6 requests pillow pyaudio numpy >> "%LOG%" 2>&1 || goto error
 
 echo === Cleaning previous build ===
 if exist build rmdir /s /q build
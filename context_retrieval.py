@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+上下文检索模块
+把角色档案和风闻记录切成条目级的片段，用 BM25（汉字二元组）按当前局面排序，结合记录时间加权，
+在 token 预算内挑选最相关的片段放入抉择 Prompt；可选用本地向量模型补充语义相似度
+"""
+
+import math
+import re
+import datetime
+from collections import Counter
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # 向量检索为可选功能，未安装时只用 BM25
+    SentenceTransformer = None
+
+from dossier_store import (split_markdown_entries, entry_body, DOCUMENT_CHARACTER, DOCUMENT_RUMOR,
+                           RUMOR_DOCUMENT_NAME)
+
+
+_CJK_RUN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def tokenize(text: str) -> list:
+    """分词：连续汉字切成相邻的二元组（单个汉字保留为一个词），英文和数字按单词切分"""
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD_PATTERN.findall(text))
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：汉字约每字 1 个，其余字符约每 4 个 1 个"""
+    cjk_chars = sum(len(run) for run in _CJK_RUN_PATTERN.findall(text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+
+def chunk_document(content: str, max_chars: int = 800) -> list:
+    """
+    按档案条目切分片段，返回 [(章节名, 记录时间, 文本), ...]
+
+    每个章节或"## 记录时间"条目为一个片段，超过 max_chars 的按段落拆分（标题行保留在每一段开头）；
+    只有标题没有正文的章节被跳过。
+    """
+    chunks = []
+    for section, timestamp, raw in split_markdown_entries(content):
+        if not entry_body(raw):
+            continue
+        text = raw.strip()
+        if len(text) <= max_chars:
+            chunks.append((section, timestamp, text))
+            continue
+
+        heading, body = (text.split("\n", 1) + [""])[:2] if text.startswith("#") else ("", text)
+        body = body.strip()
+        piece = ""
+        for paragraph in body.split("\n\n"):
+            while len(paragraph) > max_chars:
+                # 超长段落按长度硬切
+                if piece:
+                    chunks.append((section, timestamp, f"{heading}\n{piece}".strip()))
+                    piece = ""
+                chunks.append((section, timestamp, f"{heading}\n{paragraph[:max_chars]}".strip()))
+                paragraph = paragraph[max_chars:]
+            if piece and len(piece) + len(paragraph) > max_chars:
+                chunks.append((section, timestamp, f"{heading}\n{piece}".strip()))
+                piece = ""
+            piece = f"{piece}\n\n{paragraph}" if piece else paragraph
+        if piece.strip():
+            chunks.append((section, timestamp, f"{heading}\n{piece}".strip()))
+    return chunks
+
+
+def read_documents(repository) -> list:
+    """读出档案仓库中的全部文档，返回 [(文档类型, 名称, 内容), ...]（只在GUI线程中调用）"""
+    documents = [(DOCUMENT_CHARACTER, name, repository.read_character(name) or "")
+                 for name in repository.character_names()]
+    documents.append((DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME, repository.read_rumors() or ""))
+    return documents
+
+
+def _parse_timestamp(timestamp: str) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.strptime(timestamp, _TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+class ContextRetriever:
+    """
+    档案与风闻记录的检索引擎（倒排索引 + BM25）
+
+    sync() / update_document() 按片段增量更新：文档内容未变时直接跳过，变化时只为新增或改动的
+    片段分词建索引（追加记录时通常只有最后一两个片段）。首次建索引较慢，可在后台线程中用
+    build() 建好新的实例后交给GUI线程使用；之后只在GUI线程中使用。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_chunk_chars: int = 800,
+                 embedding_model: str = ""):
+        self.k1 = k1
+        self.b = b
+        self.max_chunk_chars = max_chunk_chars
+
+        # 片段编号 -> {"kind", "name", "section", "timestamp", "text", "order", "length", "tokens", "time"}
+        self.chunks = {}
+        # (文档类型, 名称) -> (已索引的内容, [片段编号])
+        self.documents = {}
+        # 词 -> {片段编号: 词频}
+        self.postings = {}
+        self.total_length = 0
+        self.next_id = 0
+
+        # 可选的本地向量模型（sentence-transformers 模型名或路径），首次检索时加载
+        self.embedding_model = embedding_model
+        self.embedder = None
+        self.embeddings = {}
+
+    def sync(self, repository) -> int:
+        """按档案仓库的当前内容更新索引（删除已不存在的档案），返回新建索引的片段数"""
+        return self.build(read_documents(repository))
+
+    def build(self, documents: list) -> int:
+        """按 [(文档类型, 名称, 内容), ...] 更新索引（删除列表中没有的文档），返回新建索引的片段数"""
+        added = 0
+        current = set()
+        for kind, name, content in documents:
+            added += self.update_document(kind, name, content)
+            current.add((kind, name))
+
+        for key in [key for key in self.documents if key not in current]:
+            for chunk_id in self.documents.pop(key)[1]:
+                self._remove_chunk(chunk_id)
+        return added
+
+    def update_document(self, kind: str, name: str, content: str) -> int:
+        """更新一份文档的索引：文本未变的片段沿用原索引，返回新建索引的片段数"""
+        key = (kind, name)
+        previous = self.documents.get(key)
+        if previous is not None and (previous[0] is content or previous[0] == content):
+            return 0
+
+        reusable = {}
+        for chunk_id in (previous[1] if previous else []):
+            chunk = self.chunks[chunk_id]
+            reusable.setdefault((chunk["section"], chunk["timestamp"], chunk["text"]), []).append(chunk_id)
+
+        chunk_ids = []
+        added = 0
+        for order, (section, timestamp, text) in enumerate(chunk_document(content, self.max_chunk_chars)):
+            candidates = reusable.get((section, timestamp, text))
+            if candidates:
+                chunk_id = candidates.pop()
+            else:
+                chunk_id = self._add_chunk(kind, name, section, timestamp, text)
+                added += 1
+            self.chunks[chunk_id]["order"] = order
+            chunk_ids.append(chunk_id)
+
+        for leftover in reusable.values():
+            for chunk_id in leftover:
+                self._remove_chunk(chunk_id)
+        self.documents[key] = (content, chunk_ids)
+        return added
+
+    def _add_chunk(self, kind: str, name: str, section: str, timestamp: str, text: str) -> int:
+        chunk_id = self.next_id
+        self.next_id += 1
+        # 角色档案的片段不一定提到角色名，把名字一并索引
+        tokens = Counter(tokenize(f"{name}\n{text}" if kind == DOCUMENT_CHARACTER else text))
+        length = sum(tokens.values())
+        self.chunks[chunk_id] = {"kind": kind, "name": name, "section": section, "timestamp": timestamp,
+                                 "text": text, "order": 0, "length": length, "tokens": estimate_tokens(text),
+                                 "time": _parse_timestamp(timestamp) if timestamp else None}
+        for term, frequency in tokens.items():
+            self.postings.setdefault(term, {})[chunk_id] = frequency
+        self.total_length += length
+        return chunk_id
+
+    def _remove_chunk(self, chunk_id: int):
+        chunk = self.chunks.pop(chunk_id)
+        kind, name, text = chunk["kind"], chunk["name"], chunk["text"]
+        for term in set(tokenize(f"{name}\n{text}" if kind == DOCUMENT_CHARACTER else text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= chunk["length"]
+        self.embeddings.pop(chunk_id, None)
+
+    def rank(self, query: str, boost_names: tuple = (), exclude_names: tuple = (), include_rumors: bool = True,
+             recency_weight: float = 0.3, half_life_days: float = 7.0, boost: float = 1.5,
+             embedding_weight: float = 0.5) -> list:
+        """
+        按相关度排序片段，返回 [(得分, 片段编号), ...]（得分从高到低，不含得分为0的片段）
+
+        得分 = BM25（启用向量模型时与余弦相似度按 embedding_weight 混合）
+               × 时间衰减（相对最新一条记录，每 half_life_days 天减半，按 recency_weight 混入）
+               × boost（boost_names 中角色的档案片段）。没有记录时间的章节（如基本信息）不衰减。
+        """
+        if not self.chunks:
+            return []
+
+        def allowed(chunk: dict) -> bool:
+            if chunk["kind"] == DOCUMENT_RUMOR:
+                return include_rumors
+            return chunk["name"] not in exclude_names
+
+        chunk_count = len(self.chunks)
+        average_length = self.total_length / chunk_count or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                length = self.chunks[chunk_id]["length"]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * (1 - self.b + self.b * length / average_length))
+
+        similarities = self._embedding_similarities(query)
+        if similarities:
+            top_score = max(scores.values(), default=0.0) or 1.0
+            scores = {chunk_id: (1 - embedding_weight) * scores.get(chunk_id, 0.0) / top_score
+                      + embedding_weight * max(similarity, 0.0)
+                      for chunk_id, similarity in similarities.items()}
+
+        times = [chunk["time"] for chunk in self.chunks.values() if chunk["time"]]
+        newest = max(times) if times else None
+        ranked = []
+        for chunk_id, score in scores.items():
+            chunk = self.chunks[chunk_id]
+            if score <= 0 or not allowed(chunk):
+                continue
+            if newest and chunk["time"] and half_life_days > 0:
+                age_days = (newest - chunk["time"]).total_seconds() / 86400
+                score *= (1 - recency_weight) + recency_weight * 0.5 ** (age_days / half_life_days)
+            if chunk["kind"] == DOCUMENT_CHARACTER and chunk["name"] in boost_names:
+                score *= boost
+            ranked.append((score, chunk_id))
+        ranked.sort(reverse=True)
+        return ranked
+
+    def select(self, query: str, budget_tokens: int, required_names: tuple = (), **rank_options) -> Tuple[list, int]:
+        """
+        按相关度从高到低挑选片段直到用完 token 预算（放不下的片段跳过，继续尝试更短的）
+
+        required_names 中的角色无论得分如何都先放入其基本信息章节（没有时为开头的其它章节或最新一条记录），
+        计入预算，剩余预算再按得分挑选。
+
+        Returns:
+            tuple: (片段列表（必选片段在前，其余按得分排序）, 已用 token 数)
+        """
+        selected = []
+        selected_ids = set()
+        used_tokens = 0
+        for name in required_names:
+            chunk_id = self._anchor_chunk(name)
+            if chunk_id is not None and chunk_id not in selected_ids:
+                selected.append(self.chunks[chunk_id])
+                selected_ids.add(chunk_id)
+                used_tokens += self.chunks[chunk_id]["tokens"]
+
+        for _, chunk_id in self.rank(query, **rank_options):
+            if chunk_id in selected_ids:
+                continue
+            chunk = self.chunks[chunk_id]
+            if used_tokens + chunk["tokens"] > budget_tokens:
+                continue
+            selected.append(chunk)
+            used_tokens += chunk["tokens"]
+            if budget_tokens - used_tokens < 50:
+                break
+        return selected, used_tokens
+
+    def _anchor_chunk(self, name: str) -> Optional[int]:
+        """角色档案中代表该角色的片段：优先"基本信息"章节，其次第一个有标题的开头章节，都没有时取最新一条记录"""
+        document = self.documents.get((DOCUMENT_CHARACTER, name))
+        if not document or not document[1]:
+            return None
+        sections = [chunk_id for chunk_id in document[1]
+                    if self.chunks[chunk_id]["section"] and not self.chunks[chunk_id]["timestamp"]]
+        for chunk_id in sections:
+            if self.chunks[chunk_id]["section"] == "基本信息":
+                return chunk_id
+        return sections[0] if sections else document[1][-1]
+
+    def prepare_embeddings(self):
+        """预先加载向量模型并为所有片段计算向量（可在后台线程中调用），未配置模型时不做任何事"""
+        self._embedding_similarities("")
+
+    def _embedding_similarities(self, query: str) -> dict:
+        """用本地向量模型计算查询与所有片段的余弦相似度；未配置或不可用时返回空字典"""
+        if not self.embedding_model:
+            return {}
+        if self.embedder is None:
+            if SentenceTransformer is None:
+                print("未安装 sentence-transformers，智能检索只使用 BM25")
+                self.embedding_model = ""
+                return {}
+            try:
+                self.embedder = SentenceTransformer(self.embedding_model)
+            except Exception as e:
+                print(f"加载向量模型失败，智能检索只使用 BM25: {str(e)}")
+                self.embedding_model = ""
+                return {}
+
+        missing = [chunk_id for chunk_id in self.chunks if chunk_id not in self.embeddings]
+        if missing:
+            vectors = self.embedder.encode([self.chunks[chunk_id]["text"] for chunk_id in missing],
+                                           normalize_embeddings=True)
+            self.embeddings.update(zip(missing, vectors))
+        query_vector = self.embedder.encode([query], normalize_embeddings=True)[0]
+        return {chunk_id: float(np.dot(vector, query_vector)) for chunk_id, vector in self.embeddings.items()}
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+档案压缩模块
+角色档案超过大小阈值后，把较早的"## 记录时间"条目交给对话模型整理成"## 历史摘要"章节，
+只保留最近的若干条原文；压缩前的完整档案按版本存档，便于核对和恢复
+"""
+
+import os
+import re
+import datetime
+from typing import Optional
+
+from dossier_store import split_markdown_entries, entry_body, ENTRY_SECTION
+from context_retrieval import estimate_tokens
+
+
+SUMMARY_SECTION = "历史摘要"
+
+_ARCHIVE_VERSION_PATTERN = re.compile(r"^v(\d+)_")
+# 摘要正文中的一、二级标题会被当成新的章节，降为三级标题
+_TOP_HEADING_PATTERN = re.compile(r"(?m)^#{1,2}\s")
+
+
+def plan_compaction(content: str, keep_recent: int = 10, threshold_tokens: int = 8000,
+                    min_batch: int = 5) -> Optional[dict]:
+    """
+    判断档案是否需要压缩，需要时返回压缩计划，否则返回None
+
+    待压缩的旧记录少于 min_batch 条时不压缩（只保留的最近记录就超过阈值时，避免每追加一条就调用一次对话模型）。
+
+    Returns:
+        dict: {"preamble": 保留的开头章节, "previous_summary": 已有的历史摘要正文,
+               "old_entries": 待压缩的条目原文, "old_count": 待压缩条数, "recent": 保留原文的最近条目,
+               "last_timestamp": 待压缩部分最后一条的记录时间}
+    """
+    if estimate_tokens(content) <= threshold_tokens:
+        return None
+
+    preamble = []
+    previous_summary = ""
+    entries = []
+    for section, timestamp, raw in split_markdown_entries(content):
+        if section == ENTRY_SECTION and timestamp:
+            entries.append((timestamp, raw))
+        elif section == SUMMARY_SECTION:
+            previous_summary = entry_body(raw)
+        else:
+            preamble.append(raw)
+
+    old_count = len(entries) - max(0, keep_recent)
+    if old_count < max(1, min_batch):
+        return None
+    return {
+        "preamble": "".join(preamble),
+        "previous_summary": previous_summary,
+        "old_entries": "".join(raw for _, raw in entries[:old_count]),
+        "old_count": old_count,
+        "recent": "".join(raw for _, raw in entries[old_count:]),
+        "last_timestamp": entries[old_count - 1][0],
+    }
+
+
+def build_compaction_prompt(character_name: str, plan: dict) -> list:
+    """构建把旧记录整理为历史摘要的Prompt"""
+    system_prompt = (
+        "你是一名严谨的档案整理员，负责把互动游戏中某个角色的历次观察记录压缩成简明的历史摘要。\n"
+        "要求：\n"
+        "1. 保留对后续决策有用的事实：身份与立场、与其他角色的关系、关键事件（注明大致时间）、"
+        "承诺与约定、秘密与把柄、态度和好感的变化。\n"
+        "2. 合并重复信息，删去寒暄和无关细节，不要编造记录中没有的内容；前后矛盾时以较新的记录为准并注明变化。\n"
+        "3. 如果提供了已有的历史摘要，把它与新记录合并成一份完整的摘要。\n"
+        "4. 直接输出摘要正文，可以用列表和三级标题（###）组织，不要使用一级或二级标题，不要输出任何解释。"
+    )
+    user_parts = [f"角色：{character_name}"]
+    if plan["previous_summary"]:
+        user_parts.append(f"【已有的历史摘要】\n{plan['previous_summary']}")
+    user_parts.append(f"【待压缩的记录（共 {plan['old_count']} 条）】\n{plan['old_entries'].strip()}")
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "\n\n".join(user_parts)},
+    ]
+
+
+def compose_compacted_dossier(plan: dict, summary: str, archive_version: int) -> str:
+    """用历史摘要替换旧记录，拼出压缩后的档案"""
+    summary = _TOP_HEADING_PATTERN.sub("### ", summary.strip())
+    preamble = plan["preamble"].rstrip()
+    section = (f"## {SUMMARY_SECTION}\n\n"
+               f"> 由 {plan['last_timestamp']} 及之前的记录整理而成，原文见存档 v{archive_version:03d}\n\n"
+               f"{summary}\n")
+    recent = plan["recent"]
+    return f"{preamble}\n\n{section}" + (f"\n{recent}" if recent else "")
+
+
+def next_archive_version(archive_dir: str, character_name: str) -> int:
+    """角色档案下一个存档版本号（从1开始）"""
+    try:
+        names = os.listdir(os.path.join(archive_dir, character_name))
+    except FileNotFoundError:
+        return 1
+    versions = [int(match.group(1)) for match in map(_ARCHIVE_VERSION_PATTERN.match, names) if match]
+    return max(versions, default=0) + 1
+
+
+def archive_dossier(archive_dir: str, character_name: str, content: str, version: int) -> str:
+    """把压缩前的完整档案存为 <存档目录>/<角色名>/v<版本>_<时间>.md，返回文件路径"""
+    directory = os.path.join(archive_dir, character_name)
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"v{version:03d}_{timestamp}.md")
+    with open(path, "x", encoding="utf-8") as f:
+        f.write(content)
+    return path
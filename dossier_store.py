@@ -0,0 +1,553 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+角色档案存储模块
+在内存中缓存 characters/*.md 与风闻记录，按文件监视和修改时间失效，避免每次点击都重新读盘；
+可选 SQLite 存储：按条目存储并建立 FTS5 全文索引，与 Markdown 文件双向导入导出
+"""
+
+import os
+import re
+import sqlite3
+from typing import Optional, Tuple
+
+from PyQt6.QtCore import QObject, QFileSystemWatcher
+
+
+# 档案存储方式（config.json 中的 dossier_backend）
+DOSSIER_BACKEND_MARKDOWN = "Markdown 文件"
+DOSSIER_BACKEND_SQLITE = "SQLite 数据库"
+DOSSIER_BACKENDS = [DOSSIER_BACKEND_MARKDOWN, DOSSIER_BACKEND_SQLITE]
+
+# 每次记录追加的条目标题（速记台和风闻记录共用）
+ENTRY_HEADER_PREFIX = "## 记录时间:"
+ENTRY_SECTION = "记录"
+
+# 搜索结果中的文档类型
+DOCUMENT_CHARACTER = "character"
+DOCUMENT_RUMOR = "rumor"
+RUMOR_DOCUMENT_NAME = "风闻记录"
+
+_ENTRY_SPLIT_PATTERN = re.compile(r"(?m)^(?=## 记录时间:)")
+_SECTION_SPLIT_PATTERN = re.compile(r"(?m)^(?=## )")
+# 风闻条目中的【参与人员】部分：到下一个【...】小节（如"3. **【对话还原】**"）为止
+_PARTICIPANTS_PATTERN = re.compile(r"【参与人员】[*\s:：]*(.*?)(?=\n\s*(?:\d+\.\s*)?\**【|\Z)", re.S)
+_NAME_SEPARATOR_PATTERN = re.compile(r"[、,，;；/|\n]+")
+_NAME_ANNOTATION_PATTERN = re.compile(r"[（(].*?[)）]")
+# 全文索引把每个汉字作为一个词，搜索词按短语匹配，相当于子串搜索
+_CJK_PATTERN = re.compile(r"([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff])")
+
+
+def split_markdown_entries(content: str) -> list:
+    """
+    把档案拆分为条目，返回 [(章节名, 记录时间, 原文), ...]，各条原文按顺序拼接即为完整档案
+
+    每个"## 记录时间: ..."标题开始一条记录（记录内容中的其它二级标题不再拆分）；
+    第一条记录之前的部分按"## "标题拆成章节，标题之前的开头部分章节名为空。
+    """
+    entries = []
+    parts = _ENTRY_SPLIT_PATTERN.split(content)
+    for section_raw in _SECTION_SPLIT_PATTERN.split(parts[0]):
+        if section_raw:
+            heading = section_raw.split("\n", 1)[0]
+            section = heading[3:].strip() if heading.startswith("## ") else ""
+            entries.append((section, "", section_raw))
+    for raw in parts[1:]:
+        timestamp = raw.split("\n", 1)[0][len(ENTRY_HEADER_PREFIX):].strip()
+        entries.append((ENTRY_SECTION, timestamp, raw))
+    return entries
+
+
+def entry_body(raw: str) -> str:
+    """条目去掉标题行后的正文"""
+    if raw.startswith("## "):
+        raw = raw.split("\n", 1)[1] if "\n" in raw else ""
+    return raw.strip()
+
+
+def make_snippet(text: str, terms: list, width: int = 60) -> str:
+    """截取第一个命中词附近的一段文字作为搜索结果摘要"""
+    lowered = text.lower()
+    positions = [position for position in (lowered.find(term.lower()) for term in terms) if position >= 0]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    snippet = text[start:start + width].replace("\n", " ")
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else "")
+
+
+def parse_participants(raw: str) -> list:
+    """从风闻条目的【参与人员】部分提取角色名（去掉括号注释和 Markdown 列表符号），没有该部分时返回空列表"""
+    match = _PARTICIPANTS_PATTERN.search(raw)
+    if not match:
+        return []
+    names = []
+    for token in _NAME_SEPARATOR_PATTERN.split(_NAME_ANNOTATION_PATTERN.sub("", match.group(1))):
+        name = token.strip(" \t*-•·:：。.")
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+class RumorIndex:
+    """
+    风闻记录索引：按"## 记录时间:"标题拆分条目，记录每条的时间和【参与人员】，并按角色名索引
+
+    update() 传入最新的风闻记录全文；内容只是在末尾追加时，只重新解析最后一条及新增部分。
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.entries = []         # [(记录时间, 参与人员列表, 原文)]，按文件顺序（即记录顺序）
+        self.entry_offsets = []   # 各条目在全文中的起始位置
+        self.by_character = {}    # 角色名 -> 条目序号列表
+        self.unlabeled = []       # 没有【参与人员】部分的条目序号（手写或旧格式记录）
+
+    def update(self, content: str) -> "RumorIndex":
+        if content is self.content or (len(content) == len(self.content) and content == self.content):
+            return self
+
+        if self.entries and len(content) > len(self.content) and content.startswith(self.content):
+            # 追加：最后一条可能被新内容延长（追加内容开头的换行属于上一条），从它开始重新解析
+            start = self.entry_offsets[-1]
+            self._remove_last()
+        else:
+            self.entries, self.entry_offsets, self.by_character, self.unlabeled = [], [], {}, []
+            start = 0
+
+        offset = start
+        for section, timestamp, raw in split_markdown_entries(content[start:]):
+            if section == ENTRY_SECTION:
+                self._add(timestamp, raw, offset)
+            offset += len(raw)
+        self.content = content
+        return self
+
+    def _add(self, timestamp: str, raw: str, offset: int):
+        index = len(self.entries)
+        participants = parse_participants(raw)
+        self.entries.append((timestamp, participants, raw))
+        self.entry_offsets.append(offset)
+        for name in participants:
+            self.by_character.setdefault(name, []).append(index)
+        if not participants:
+            self.unlabeled.append(index)
+
+    def _remove_last(self):
+        index = len(self.entries) - 1
+        _, participants, _ = self.entries.pop()
+        self.entry_offsets.pop()
+        for name in participants:
+            indices = self.by_character[name]
+            indices.pop()
+            if not indices:
+                del self.by_character[name]
+        if self.unlabeled and self.unlabeled[-1] == index:
+            self.unlabeled.pop()
+
+    def select(self, names: list, recent: int = 3, max_related: Optional[int] = 20) -> Tuple[list, int]:
+        """
+        挑选与 names 中任一角色有关的条目（最新的 max_related 条，None 为不限）以及最近的 recent 条
+
+        没有【参与人员】部分的条目按正文是否提到该角色判断。
+
+        Returns:
+            tuple: (按记录顺序排列的条目列表, 其中与角色有关的条目数)
+        """
+        related = set()
+        for name in names:
+            related.update(self.by_character.get(name, ()))
+        for index in self.unlabeled:
+            if any(name in self.entries[index][2] for name in names):
+                related.add(index)
+
+        related = sorted(related)
+        if max_related is not None:
+            related = related[len(related) - max_related:] if max_related > 0 else []
+        chosen = set(related) | set(range(max(0, len(self.entries) - recent), len(self.entries)))
+        return [self.entries[index] for index in sorted(chosen)], len(related)
+
+
+def _search_result(kind: str, name: str, section: str, timestamp: str, raw: str, terms: list) -> dict:
+    return {"kind": kind, "name": name, "section": section, "timestamp": timestamp,
+            "snippet": make_snippet(entry_body(raw), terms)}
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """文件的 (修改时间, 大小)，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DossierRepository(QObject):
+    """
+    档案仓库：每个文件只读取一次，之后从内存返回内容
+
+    被 QFileSystemWatcher 监视的文件在外部修改时失效，下次读取时重新加载；
+    未能加入监视的文件（超出系统监视数量等）每次读取前比对修改时间和大小。
+    本程序自己的追加和保存直接更新缓存，写入后触发的文件变化通知因签名一致而被忽略。
+    只在GUI线程中使用。
+    """
+
+    def __init__(self, characters_dir: str, rumor_log_file: str, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.characters_dir = os.path.abspath(characters_dir)
+        self.rumor_log_file = os.path.abspath(rumor_log_file)
+
+        # 绝对路径 -> (文件签名, 内容)
+        self.cache = {}
+        # 角色名列表，目录变化时失效
+        self.names = None
+        # 已加入监视的文件
+        self.watched = set()
+        self.rumor_entries = RumorIndex()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self.watching_directory = self.watcher.addPath(self.characters_dir)
+
+    def character_path(self, name: str) -> str:
+        return os.path.join(self.characters_dir, f"{name}.md")
+
+    def character_names(self) -> list:
+        """characters 目录下所有角色名（按目录顺序）"""
+        if self.names is None or not self.watching_directory:
+            try:
+                self.names = [os.path.splitext(f)[0] for f in os.listdir(self.characters_dir) if f.endswith('.md')]
+            except FileNotFoundError:
+                self.names = []
+        return list(self.names)
+
+    def has_character(self, name: str) -> bool:
+        return os.path.exists(self.character_path(name))
+
+    def read_character(self, name: str) -> Optional[str]:
+        """读取角色档案，档案不存在时返回None"""
+        return self.read_path(self.character_path(name))
+
+    def append_character(self, name: str, text: str):
+        self.append_path(self.character_path(name), text)
+
+    def write_character(self, name: str, content: str):
+        self.write_path(self.character_path(name), content)
+
+    def read_rumors(self) -> Optional[str]:
+        """读取风闻记录，文件不存在时返回None"""
+        return self.read_path(self.rumor_log_file)
+
+    def append_rumor(self, text: str):
+        self.append_path(self.rumor_log_file, text)
+
+    def rumor_index(self) -> RumorIndex:
+        """风闻记录的条目索引（内容未变时直接返回，追加后增量更新）"""
+        return self.rumor_entries.update(self.read_rumors() or "")
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """
+        在所有角色档案和风闻记录中查找同时包含全部关键字（空格分隔，不区分大小写）的条目
+
+        Returns:
+            list: [{"kind", "name", "section", "timestamp", "snippet"}, ...]，记录时间新的在前
+        """
+        terms = [term.lower() for term in query.split()]
+        if not terms:
+            return []
+
+        documents = [(DOCUMENT_CHARACTER, name, self.read_character(name)) for name in self.character_names()]
+        documents.append((DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME, self.read_rumors()))
+        results = []
+        for kind, name, content in documents:
+            # 先按整个文件过滤，多数文件不必拆分条目
+            if not content or not all(term in content.lower() for term in terms):
+                continue
+            for section, timestamp, raw in split_markdown_entries(content):
+                lowered = raw.lower()
+                if all(term in lowered for term in terms):
+                    results.append(_search_result(kind, name, section, timestamp, raw, terms))
+
+        results.sort(key=lambda result: result["timestamp"], reverse=True)
+        return results[:limit]
+
+    def read_path(self, path: str) -> Optional[str]:
+        """读取任意文本文件（如风闻记录），文件不存在时返回None"""
+        path = os.path.abspath(path)
+        entry = self.cache.get(path)
+        if entry is not None and path in self.watched:
+            return entry[1]
+
+        # 先取签名再读取：读取期间文件被修改时，签名不一致会让下次读取重新加载
+        signature = _file_signature(path)
+        if signature is None:
+            self.cache.pop(path, None)
+            return None
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        with open(path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        self.cache[path] = (signature, content)
+        self._watch(path)
+        return content
+
+    def append_path(self, path: str, text: str):
+        """追加内容到文件末尾；缓存与文件一致时直接在缓存末尾追加"""
+        path = os.path.abspath(path)
+        before = _file_signature(path)
+        entry = self.cache.get(path)
+
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(text)
+
+        if before is None:
+            self.names = None
+        if entry is not None and entry[0] == before:
+            self.cache[path] = (_file_signature(path), entry[1] + text)
+            self._watch(path)
+        else:
+            self.cache.pop(path, None)
+
+    def write_path(self, path: str, content: str):
+        """覆盖写入文件并更新缓存"""
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            self.names = None
+
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+        self.cache[path] = (_file_signature(path), content)
+        self._watch(path)
+
+    def _watch(self, path: str):
+        if path not in self.watched and self.watcher.addPath(path):
+            self.watched.add(path)
+
+    def _on_file_changed(self, path: str):
+        """外部修改时丢弃缓存；签名与缓存一致说明是本程序自己的写入"""
+        entry = self.cache.get(path)
+        signature = _file_signature(path)
+        if entry is not None and entry[0] == signature:
+            return
+
+        self.cache.pop(path, None)
+        # 部分编辑器以"写临时文件再替换"的方式保存，原文件的监视会随之失效，需重新加入
+        self.watched.discard(path)
+        if signature is not None and (path in self.watcher.files() or self.watcher.addPath(path)):
+            self.watched.add(path)
+
+    def _on_directory_changed(self, path: str):
+        self.names = None
+
+
+class SQLiteDossierRepository(QObject):
+    """
+    SQLite 档案仓库：接口与 DossierRepository 相同，档案和风闻记录按条目存储在数据库中
+
+    每条记录一行（所属档案、记录时间、章节、原文），按顺序拼接原文即还原 Markdown 档案；
+    FTS5 全文索引支持按关键字搜索（SQLite 未编译 FTS5 时退回逐行匹配）。
+    import_markdown / export_markdown 与 characters/*.md 和风闻记录文件双向同步。
+    只在GUI线程中使用。
+    """
+
+    def __init__(self, db_path: str, characters_dir: str, rumor_log_file: str, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.characters_dir = os.path.abspath(characters_dir)
+        self.rumor_log_file = os.path.abspath(rumor_log_file)
+        self.rumor_entries = RumorIndex()
+
+        self.connection = sqlite3.connect(db_path)
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    UNIQUE (kind, name)
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    document_id INTEGER NOT NULL REFERENCES documents(id),
+                    position INTEGER NOT NULL,
+                    section TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    raw TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_by_document ON entries (document_id, position);
+            """)
+        try:
+            with self.connection:
+                self.connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(text)")
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"SQLite 不支持 FTS5，搜索改为逐行匹配: {str(e)}")
+            self.fts_enabled = False
+
+    def close(self):
+        self.connection.close()
+
+    def is_empty(self) -> bool:
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 0
+
+    def character_names(self) -> list:
+        rows = self.connection.execute(
+            "SELECT name FROM documents WHERE kind = ? ORDER BY id", (DOCUMENT_CHARACTER,))
+        return [name for name, in rows]
+
+    def has_character(self, name: str) -> bool:
+        return self._document_id(DOCUMENT_CHARACTER, name) is not None
+
+    def read_character(self, name: str) -> Optional[str]:
+        return self._read(DOCUMENT_CHARACTER, name)
+
+    def append_character(self, name: str, text: str):
+        self._append(DOCUMENT_CHARACTER, name, text)
+
+    def write_character(self, name: str, content: str):
+        self._write(DOCUMENT_CHARACTER, name, content)
+
+    def read_rumors(self) -> Optional[str]:
+        return self._read(DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME)
+
+    def append_rumor(self, text: str):
+        self._append(DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME, text)
+
+    def rumor_index(self) -> RumorIndex:
+        return self.rumor_entries.update(self.read_rumors() or "")
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """全文搜索同时包含全部关键字的条目，有 FTS5 时按相关度（bm25）排序"""
+        terms = query.split()
+        if not terms:
+            return []
+
+        if self.fts_enabled:
+            # 每个关键字作为一个短语（汉字按单字切分后相邻匹配），多个关键字取交集
+            match = " AND ".join('"' + _fts_text(term).replace('"', '""') + '"' for term in terms)
+            rows = self.connection.execute("""
+                SELECT d.kind, d.name, e.section, e.timestamp, e.raw
+                FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid JOIN documents d ON d.id = e.document_id
+                WHERE entries_fts MATCH ? ORDER BY bm25(entries_fts) LIMIT ?
+            """, (match, limit))
+        else:
+            condition = " AND ".join("instr(lower(e.raw), ?) > 0" for _ in terms)
+            rows = self.connection.execute(f"""
+                SELECT d.kind, d.name, e.section, e.timestamp, e.raw
+                FROM entries e JOIN documents d ON d.id = e.document_id
+                WHERE {condition} ORDER BY e.timestamp DESC LIMIT ?
+            """, [term.lower() for term in terms] + [limit])
+        return [_search_result(kind, name, section, timestamp, raw, terms)
+                for kind, name, section, timestamp, raw in rows]
+
+    def import_markdown(self) -> int:
+        """从 characters/*.md 和风闻记录文件导入（覆盖数据库中的同名档案），返回导入的文件数"""
+        imported = 0
+        with self.connection:
+            if os.path.isdir(self.characters_dir):
+                for filename in os.listdir(self.characters_dir):
+                    if filename.endswith('.md'):
+                        with open(os.path.join(self.characters_dir, filename), 'r', encoding='utf-8') as file:
+                            self._write(DOCUMENT_CHARACTER, os.path.splitext(filename)[0], file.read(), commit=False)
+                        imported += 1
+            if os.path.exists(self.rumor_log_file):
+                with open(self.rumor_log_file, 'r', encoding='utf-8') as file:
+                    self._write(DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME, file.read(), commit=False)
+                imported += 1
+        return imported
+
+    def export_markdown(self) -> int:
+        """把数据库中的档案写回 characters/*.md 和风闻记录文件，返回写出的文件数"""
+        os.makedirs(self.characters_dir, exist_ok=True)
+        exported = 0
+        for kind, name in self.connection.execute("SELECT kind, name FROM documents ORDER BY id").fetchall():
+            path = self.rumor_log_file if kind == DOCUMENT_RUMOR else os.path.join(self.characters_dir, f"{name}.md")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(self._read(kind, name))
+            exported += 1
+        return exported
+
+    def _document_id(self, kind: str, name: str) -> Optional[int]:
+        row = self.connection.execute("SELECT id FROM documents WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        return row[0] if row else None
+
+    def _read(self, kind: str, name: str) -> Optional[str]:
+        document_id = self._document_id(kind, name)
+        if document_id is None:
+            return None
+        rows = self.connection.execute(
+            "SELECT raw FROM entries WHERE document_id = ? ORDER BY position", (document_id,))
+        return "".join(raw for raw, in rows)
+
+    def _write(self, kind: str, name: str, content: str, commit: bool = True):
+        """整篇替换档案的所有条目"""
+        document_id = self._document_id(kind, name)
+        if document_id is None:
+            document_id = self.connection.execute(
+                "INSERT INTO documents (kind, name) VALUES (?, ?)", (kind, name)).lastrowid
+        else:
+            if self.fts_enabled:
+                self.connection.execute(
+                    "DELETE FROM entries_fts WHERE rowid IN (SELECT id FROM entries WHERE document_id = ?)",
+                    (document_id,))
+            self.connection.execute("DELETE FROM entries WHERE document_id = ?", (document_id,))
+        self._insert_entries(document_id, split_markdown_entries(content), 0)
+        if commit:
+            self.connection.commit()
+
+    def _append(self, kind: str, name: str, text: str):
+        """追加条目；追加内容开头的换行并入上一条原文，保证拼接后与文件追加的结果一致"""
+        with self.connection:
+            document_id = self._document_id(kind, name)
+            if document_id is None:
+                self._write(kind, name, text, commit=False)
+                return
+
+            entries = split_markdown_entries(text)
+            last = self.connection.execute(
+                "SELECT id, position, raw FROM entries WHERE document_id = ? ORDER BY position DESC LIMIT 1",
+                (document_id,)).fetchone()
+            position = 0
+            if last:
+                position = last[1] + 1
+                if entries and not entries[0][2].startswith("## "):
+                    self._update_raw(last[0], last[2] + entries.pop(0)[2])
+            self._insert_entries(document_id, entries, position)
+
+    def _insert_entries(self, document_id: int, entries: list, position: int):
+        for offset, (section, timestamp, raw) in enumerate(entries):
+            entry_id = self.connection.execute(
+                "INSERT INTO entries (document_id, position, section, timestamp, raw) VALUES (?, ?, ?, ?, ?)",
+                (document_id, position + offset, section, timestamp, raw)).lastrowid
+            if self.fts_enabled:
+                self.connection.execute("INSERT INTO entries_fts (rowid, text) VALUES (?, ?)",
+                                        (entry_id, _fts_text(raw)))
+
+    def _update_raw(self, entry_id: int, raw: str):
+        self.connection.execute("UPDATE entries SET raw = ? WHERE id = ?", (raw, entry_id))
+        if self.fts_enabled:
+            self.connection.execute("UPDATE entries_fts SET text = ? WHERE rowid = ?", (_fts_text(raw), entry_id))
+
+
+def _fts_text(text: str) -> str:
+    """在每个汉字两侧加空格，让 FTS5 的 unicode61 分词器把汉字逐个切分"""
+    return _CJK_PATTERN.sub(r" \1 ", text)
+
+
+def create_dossier_repository(backend: str, characters_dir: str, rumor_log_file: str, db_path: str,
+                              parent: Optional[QObject] = None):
+    """
+    按存储方式创建档案仓库
+
+    SQLite 数据库首次创建时自动导入现有的 Markdown 档案；打开失败时回退到 Markdown 文件。
+    """
+    if backend == DOSSIER_BACKEND_SQLITE:
+        try:
+            repository = SQLiteDossierRepository(db_path, characters_dir, rumor_log_file, parent)
+            if repository.is_empty():
+                print(f"从 Markdown 档案导入 {repository.import_markdown()} 个文件到 {db_path}")
+            return repository
+        except Exception as e:
+            print(f"打开档案数据库失败，改用 Markdown 文件: {str(e)}")
+    return DossierRepository(characters_dir, rumor_log_file, parent)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+档案查看器模块
+基于 QPlainTextEdit 的分页档案视图：打开档案或风闻记录时只加载最近的若干条记录并定位到末尾，
+滚动到顶部时再逐页加载更早的记录，几 MB 的文件也不会卡住界面
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+
+from PyQt6.QtWidgets import QPlainTextEdit
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QTextCursor
+
+from dossier_store import ENTRY_HEADER_PREFIX
+
+
+_ENTRY_HEADER_PATTERN = re.compile(r"^" + re.escape(ENTRY_HEADER_PREFIX), re.MULTILINE)
+
+
+class PagedDossierView(QPlainTextEdit):
+    """
+    分页加载的档案视图
+
+    文档开头到 loaded_offset 之间的内容（更早的记录）暂不放入编辑器，保存时由 full_text() 拼回；
+    编辑只影响已加载的部分，未加载的部分保持原样。
+    """
+
+    # 已加载的记录条数、总记录条数（每次加载后发射）
+    page_loaded = pyqtSignal(int, int)
+
+    def __init__(self, page_entries: int = 50, parent=None):
+        super().__init__(parent)
+        self.page_entries = max(1, page_entries)
+        self.content = ""
+        # 各条记录标题在 content 中的起始位置
+        self.entry_offsets = []
+        self.loaded_offset = 0
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+
+    def set_document(self, content: str, read_only: bool = False):
+        """显示一份档案：只加载最后一页记录并滚动到末尾（最新的记录）"""
+        self.content = content
+        self.entry_offsets = [match.start() for match in _ENTRY_HEADER_PATTERN.finditer(content)]
+        if len(self.entry_offsets) > self.page_entries:
+            self.loaded_offset = self.entry_offsets[-self.page_entries]
+        else:
+            self.loaded_offset = 0
+
+        self.setReadOnly(read_only)
+        # 替换内容时滚动条会先回到顶部，屏蔽信号以免误触发加载
+        scroll_bar = self.verticalScrollBar()
+        scroll_bar.blockSignals(True)
+        self.setPlainText(content[self.loaded_offset:])
+        self.moveCursor(QTextCursor.MoveOperation.End)
+        self.ensureCursorVisible()
+        scroll_bar.blockSignals(False)
+        self._emit_page_loaded()
+
+    def full_text(self) -> str:
+        """完整的档案内容（未加载的更早记录 + 编辑器中的内容）"""
+        return self.content[:self.loaded_offset] + self.toPlainText()
+
+    def has_more(self) -> bool:
+        return self.loaded_offset > 0
+
+    def load_previous_page(self) -> bool:
+        """在开头插入更早的一页记录，保持当前可见位置不变；没有更多记录时返回 False"""
+        if not self.has_more():
+            return False
+        earlier = bisect_left(self.entry_offsets, self.loaded_offset)
+        new_offset = self.entry_offsets[earlier - self.page_entries] if earlier > self.page_entries else 0
+        self._prepend(self.content[new_offset:self.loaded_offset])
+        self.loaded_offset = new_offset
+        self._emit_page_loaded()
+        return True
+
+    def reveal(self, text: str) -> bool:
+        """定位到文本首次出现的位置，位于未加载的部分时先加载到该位置"""
+        position = self.content.find(text)
+        if 0 <= position < self.loaded_offset:
+            index = bisect_right(self.entry_offsets, position)
+            new_offset = self.entry_offsets[index - 1] if index else 0
+            self._prepend(self.content[new_offset:self.loaded_offset])
+            self.loaded_offset = new_offset
+            self._emit_page_loaded()
+
+        self.moveCursor(QTextCursor.MoveOperation.Start)
+        return self.find(text)
+
+    def _prepend(self, text: str):
+        scroll_bar = self.verticalScrollBar()
+        block_count = self.blockCount()
+        value = scroll_bar.value()
+
+        # 插入的内容不进入撤销栈（切换撤销功能会清空已有的撤销记录）
+        document = self.document()
+        modified = document.isModified()
+        scroll_bar.blockSignals(True)
+        document.setUndoRedoEnabled(False)
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.insertText(text)
+        document.setUndoRedoEnabled(True)
+        document.setModified(modified)
+
+        # QPlainTextEdit 的滚动条以文本块（行）为单位，按新增的行数下移以保持原位置
+        scroll_bar.setValue(value + self.blockCount() - block_count)
+        scroll_bar.blockSignals(False)
+
+    def _on_scrolled(self, value: int):
+        if value == self.verticalScrollBar().minimum() and self.has_more():
+            self.load_previous_page()
+
+    def _emit_page_loaded(self):
+        loaded = len(self.entry_offsets) - bisect_left(self.entry_offsets, self.loaded_offset)
+        self.page_loaded.emit(loaded, len(self.entry_offsets))
@@ -0,0 +1,571 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图像处理模块
+基于 NumPy 的截图分析工具：QImage 与数组互转、对话框区域自动检测、画面变化检测、帧环形缓冲、OCR预处理
+"""
+
+import math
+import time
+from typing import Optional, Tuple, Dict
+
+import numpy as np
+from PyQt6.QtCore import QRect, Qt
+from PyQt6.QtGui import QImage
+
+
+# 分块处理时每块的行数（4K 宽度下中间结果约 250KB，可放入 L2 缓存）
+_BLOCK_ROWS = 32
+
+
+def qimage_to_array(image: QImage) -> np.ndarray:
+    """
+    将QImage转换为形状为 (高, 宽, 4) 的 uint8 数组（BGRA 字节序）
+
+    注意：当图像本身已是32位格式时返回的是零拷贝视图，
+    调用方必须在使用数组期间保持 image 对象存活。
+    """
+    if image.format() not in (QImage.Format.Format_RGB32, QImage.Format.Format_ARGB32,
+                              QImage.Format.Format_ARGB32_Premultiplied):
+        image = image.convertToFormat(QImage.Format.Format_RGB32)
+
+    width = image.width()
+    height = image.height()
+    bytes_per_line = image.bytesPerLine()
+
+    ptr = image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    raw = np.frombuffer(ptr, dtype=np.uint8).reshape(height, bytes_per_line)
+
+    # 每行可能带有对齐填充，只取有效像素部分（仍然是视图，不会复制）
+    return raw[:, :width * 4].reshape(height, width, 4)
+
+
+def to_grayscale(bgra: np.ndarray) -> np.ndarray:
+    """
+    BGRA数组转灰度 (ITU-R BT.601 整数近似)，返回 uint8 数组
+
+    按行分块计算，16 位中间结果常驻 CPU 缓存，4K 画面比整图一次性计算快约 2.5 倍。
+    """
+    height, width = bgra.shape[:2]
+    gray = np.empty((height, width), dtype=np.uint8)
+    rows = _BLOCK_ROWS
+    accumulator = np.empty((rows, width), dtype=np.uint16)
+    channel = np.empty((rows, width), dtype=np.uint16)
+    for y in range(0, height, rows):
+        block = bgra[y:y + rows]
+        count = block.shape[0]
+        acc = accumulator[:count]
+        tmp = channel[:count]
+        np.multiply(block[..., 2], 77, out=acc, dtype=np.uint16)
+        np.multiply(block[..., 1], 150, out=tmp, dtype=np.uint16)
+        acc += tmp
+        np.multiply(block[..., 0], 29, out=tmp, dtype=np.uint16)
+        acc += tmp
+        acc >>= 8
+        gray[y:y + count] = acc
+    return gray
+
+
+def contrast_stretch(gray: np.ndarray, low_percent: float = 1.0, high_percent: float = 99.0) -> np.ndarray:
+    """
+    对比度拉伸：把灰度分布的 [low_percent, high_percent] 百分位线性映射到 0-255
+
+    百分位取自每 4×4 像素抽样一个的直方图，结果与全图几乎一致但快一个数量级；
+    线性映射按行分块、用 16 位定点运算完成。
+    """
+    histogram = np.bincount(gray[::4, ::4].ravel(), minlength=256)
+    cumulative = np.cumsum(histogram)
+    total = cumulative[-1]
+    low = int(np.searchsorted(cumulative, total * low_percent / 100.0))
+    high = int(np.searchsorted(cumulative, total * high_percent / 100.0))
+    if high <= low:
+        return gray
+
+    scale = int(255 * 256 / (high - low))
+    height, width = gray.shape
+    stretched = np.empty((height, width), dtype=np.uint8)
+    buffer = np.empty((_BLOCK_ROWS, width), dtype=np.uint16)
+    for y in range(0, height, _BLOCK_ROWS):
+        block = gray[y:y + _BLOCK_ROWS]
+        work = buffer[:block.shape[0]]
+        np.clip(block, low, high, out=work)
+        work -= low
+        work *= scale
+        work >>= 8
+        stretched[y:y + block.shape[0]] = work
+    return stretched
+
+
+def _box_mean(gray: np.ndarray, radius: int) -> np.ndarray:
+    """基于积分图的方形均值滤波，边界处按实际覆盖的像素数取平均"""
+    height, width = gray.shape
+    integral = np.zeros((height + 1, width + 1), dtype=np.int32)
+    np.cumsum(gray, axis=0, dtype=np.int32, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+
+    ys = np.arange(height)
+    xs = np.arange(width)
+    y0 = np.clip(ys - radius, 0, height)
+    y1 = np.clip(ys + radius + 1, 0, height)
+    x0 = np.clip(xs - radius, 0, width)
+    x1 = np.clip(xs + radius + 1, 0, width)
+
+    sums = (integral[y1][:, x1] - integral[y0][:, x1] - integral[y1][:, x0] + integral[y0][:, x0])
+    counts = np.outer(y1 - y0, x1 - x0)
+    return sums / counts
+
+
+def adaptive_binarize(gray: np.ndarray, block_size: int = 31, offset: int = 10,
+                      downsample: int = 4) -> np.ndarray:
+    """
+    自适应二值化：像素比邻域均值暗 offset 以上判为文字（黑），其余为背景（白）
+
+    邻域均值随位置缓慢变化，因此在缩小 downsample 倍的图上用积分图计算阈值，
+    比较时再按行分块放大回原尺寸，开销只有全分辨率计算的一小部分。
+    浅色文字深色背景（常见于游戏对话框）时自动反色，保证输出始终为白底黑字，便于OCR。
+    """
+    height, width = gray.shape
+    factor = max(1, downsample)
+    small = gray[::factor, ::factor]
+    local_mean = _box_mean(small, max(1, block_size // factor // 2))
+
+    # 背景整体偏暗时，文字是比邻域更亮的像素；整数像素与阈值比较时先取整不改变结果
+    light_text = float(small.mean()) < 128
+    if light_text:
+        threshold = np.clip(np.floor(local_mean + offset), 0, 255).astype(np.uint8)
+    else:
+        threshold = np.clip(np.ceil(local_mean - offset), 0, 255).astype(np.uint8)
+
+    text_mask = np.empty((height, width), dtype=bool)
+    rows = _BLOCK_ROWS
+    for y in range(0, height, rows):
+        block = gray[y:y + rows]
+        count = block.shape[0]
+        block_threshold = np.repeat(threshold[y // factor:(y + count - 1) // factor + 1], factor, axis=0)
+        start = y % factor
+        block_threshold = np.repeat(block_threshold[:, :], factor, axis=1)[start:start + count, :width]
+        if light_text:
+            np.greater(block, block_threshold, out=text_mask[y:y + count])
+        else:
+            np.less(block, block_threshold, out=text_mask[y:y + count])
+
+    binary = np.full((height, width), 255, dtype=np.uint8)
+    binary[text_mask] = 0
+    return binary
+
+
+def sharpen(gray: np.ndarray, amount: float = 1.0) -> np.ndarray:
+    """
+    反锐化掩模：原图 + amount × (原图 - 3x3 均值模糊)，amount 取值 0-2
+
+    3x3 均值按行、列分离求和，并用 int32 定点运算（放大 9×32 倍）代替浮点除法，保证中心权重减去
+    9 个邻域权重恰为 1，平坦区域的灰度不变；按行分块计算。
+    """
+    amount = min(2.0, max(0.0, amount))
+    box_gain = int(round(32 * amount))
+    gain = (32 + box_gain) * 9
+    scale = 9 * 32
+    height, width = gray.shape
+    padded = np.pad(gray, 1, mode="edge")
+    sharpened = np.empty((height, width), dtype=np.uint8)
+
+    rows = _BLOCK_ROWS
+    for y in range(0, height, rows):
+        block = padded[y:y + rows + 2].astype(np.int32)
+        horizontal = block[:, :-2] + block[:, 1:-1]
+        horizontal += block[:, 2:]
+        box = horizontal[:-2] + horizontal[1:-1]
+        box += horizontal[2:]
+
+        result = block[1:-1, 1:-1] * gain
+        box *= box_gain
+        result -= box
+        result += scale // 2
+        result //= scale
+        np.clip(result, 0, 255, out=result)
+        sharpened[y:y + result.shape[0]] = result
+    return sharpened
+
+
+# OCR预处理预设：按顺序执行的阶段列表
+PREPROCESS_NONE = "关闭"
+PREPROCESS_PRESETS = {
+    PREPROCESS_NONE: [],
+    "灰度+对比度拉伸": ["grayscale", "stretch"],
+    "对比度拉伸+锐化": ["grayscale", "stretch", "sharpen"],
+    "自适应二值化 (复杂背景)": ["grayscale", "stretch", "binarize"],
+    "锐化+自适应二值化 (小字)": ["grayscale", "stretch", "sharpen", "binarize"],
+}
+
+
+def preprocess_for_ocr(image: QImage, preset: str) -> Tuple[QImage, Dict[str, float]]:
+    """
+    按预设对截图执行OCR预处理
+
+    Args:
+        image: 原始截图
+        preset: PREPROCESS_PRESETS 中的名称，未知名称或"关闭"时原样返回
+
+    Returns:
+        tuple: (处理后的图像, 各阶段耗时毫秒数 {阶段名: ms})
+    """
+    stages = PREPROCESS_PRESETS.get(preset, [])
+    timings = {}
+    if not stages or image.isNull():
+        return image, timings
+
+    start = time.perf_counter()
+    pixels = qimage_to_array(image)
+    timings["view"] = (time.perf_counter() - start) * 1000
+
+    gray = None
+    for stage in stages:
+        start = time.perf_counter()
+        if stage == "grayscale":
+            gray = to_grayscale(pixels)
+        elif stage == "stretch":
+            gray = contrast_stretch(gray)
+        elif stage == "sharpen":
+            gray = sharpen(gray)
+        elif stage == "binarize":
+            gray = adaptive_binarize(gray)
+        timings[stage] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    height, width = gray.shape
+    gray = np.ascontiguousarray(gray)
+    result = QImage(gray.data, width, height, width, QImage.Format.Format_Grayscale8).copy()
+    timings["to_qimage"] = (time.perf_counter() - start) * 1000
+    return result, timings
+
+
+def _smooth_1d(values: np.ndarray, window: int) -> np.ndarray:
+    """一维滑动平均，用于平滑行/列密度曲线"""
+    if window <= 1 or values.size == 0:
+        return values
+    kernel = np.ones(window, dtype=np.float32) / window
+    return np.convolve(values, kernel, mode="same")
+
+
+def _find_runs(mask: np.ndarray, max_gap: int = 0) -> np.ndarray:
+    """
+    返回布尔序列中所有连续 True 区段的 [起点, 终点) 数组，形状 (N, 2)
+
+    间隔不超过 max_gap 的相邻区段会被合并（例如多行文字之间的行距）。
+    """
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if starts.size == 0 or max_gap <= 0:
+        return np.stack((starts, ends), axis=1)
+
+    # 间隔大于 max_gap 的位置才是真正的分组边界
+    breaks = np.flatnonzero(starts[1:] - ends[:-1] > max_gap)
+    group_starts = np.concatenate(([0], breaks + 1))
+    group_ends = np.concatenate((breaks, [starts.size - 1]))
+    return np.stack((starts[group_starts], ends[group_ends]), axis=1)
+
+
+def detect_dialogue_region(image: QImage, analysis_width: int = 480,
+                           edge_threshold: int = 40) -> Optional[QRect]:
+    """
+    自动检测画面中文字最密集的对话框区域
+
+    思路：在缩小后的灰度图上计算水平/垂直梯度，文字笔画会产生密集的强边缘；
+    按行统计边缘密度并平滑，取得分最高的水平带（偏向画面下半部分，
+    因为多数游戏的对话框位于底部），再在该水平带内按列确定左右边界。
+
+    Args:
+        image: 原始截图 (物理像素)
+        analysis_width: 分析时使用的缩放宽度，越小越快
+        edge_threshold: 判定为强边缘的灰度差阈值
+
+    Returns:
+        QRect: 对话框在原图中的物理像素区域，未检测到时返回None
+    """
+    if image.isNull() or image.width() < 16 or image.height() < 16:
+        return None
+
+    scale = min(1.0, analysis_width / image.width())
+    small = image
+    if scale < 1.0:
+        small = image.scaledToWidth(analysis_width, Qt.TransformationMode.FastTransformation)
+
+    gray = to_grayscale(qimage_to_array(small)).astype(np.int16)
+    height, width = gray.shape
+
+    # 1. 梯度幅值 -> 强边缘掩码
+    edges = np.zeros((height, width), dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(gray, axis=1)) > edge_threshold
+    edges[1:, :] |= np.abs(np.diff(gray, axis=0)) > edge_threshold
+
+    # 2. 行密度曲线（平滑窗口约为画面高度的 2%，可以把一行文字的上下笔画连在一起）
+    row_density = _smooth_1d(edges.mean(axis=1), max(3, height // 50))
+    row_threshold = max(0.04, float(row_density.mean() + 0.5 * row_density.std()))
+    row_runs = _find_runs(row_density > row_threshold, max_gap=max(2, height // 30))
+    if row_runs.size == 0:
+        return None
+
+    # 3. 为每个水平带打分：文字总量 × 位置权重（越靠下权重越高）
+    cumulative = np.concatenate(([0.0], np.cumsum(row_density)))
+    mass = cumulative[row_runs[:, 1]] - cumulative[row_runs[:, 0]]
+    centers = (row_runs[:, 0] + row_runs[:, 1]) / 2.0 / height
+    scores = mass * (0.5 + centers)
+
+    min_band_height = max(4, height // 40)
+    scores[(row_runs[:, 1] - row_runs[:, 0]) < min_band_height] = 0
+    if not np.any(scores > 0):
+        return None
+
+    top, bottom = row_runs[int(np.argmax(scores))]
+
+    # 4. 在选中的水平带内按列统计，确定左右边界
+    col_density = _smooth_1d(edges[top:bottom].mean(axis=0), max(3, width // 40))
+    col_indices = np.flatnonzero(col_density > max(0.02, float(col_density.mean()) * 0.3))
+    if col_indices.size == 0:
+        return None
+    left, right = int(col_indices[0]), int(col_indices[-1]) + 1
+
+    # 5. 四周留出少量边距，并映射回原图坐标
+    pad_y = max(2, (bottom - top) // 6)
+    pad_x = max(2, width // 100)
+    top = max(0, int(top) - pad_y)
+    bottom = min(height, int(bottom) + pad_y)
+    left = max(0, left - pad_x)
+    right = min(width, right + pad_x)
+
+    factor_x = image.width() / width
+    factor_y = image.height() / height
+    region = QRect(int(left * factor_x), int(top * factor_y),
+                   int((right - left) * factor_x), int((bottom - top) * factor_y))
+    return region.intersected(QRect(0, 0, image.width(), image.height()))
+
+
+class FrameChangeDetector:
+    """
+    基于降采样帧差的画面变化检测器
+
+    每一帧先缩小为低分辨率灰度图，再与上一帧逐像素比较；变化像素比例超过阈值
+    即视为画面在变化（例如对话文字正在逐字出现）。只有当画面连续若干帧保持稳定、
+    且与上一次提交的画面确实不同时，才判定为"新的稳定画面"需要识别。
+    """
+
+    def __init__(self, sample_width: int = 160, pixel_threshold: int = 24,
+                 change_ratio: float = 0.003, settle_frames: int = 2):
+        """
+        Args:
+            sample_width: 比较时使用的缩放宽度
+            pixel_threshold: 单个像素灰度差超过该值才计为变化
+            change_ratio: 变化像素占比超过该值视为画面发生变化
+            settle_frames: 画面需要连续稳定的帧数（防抖）
+        """
+        self.sample_width = sample_width
+        self.pixel_threshold = pixel_threshold
+        self.change_ratio = change_ratio
+        self.settle_frames = settle_frames
+
+        self.previous_frame = None
+        self.submitted_frame = None
+        self.stable_count = 0
+        self.pending = False
+
+        # 统计信息
+        self.frames_seen = 0
+        self.frames_submitted = 0
+
+    def reset(self):
+        """清空历史帧与统计信息"""
+        self.previous_frame = None
+        self.submitted_frame = None
+        self.stable_count = 0
+        self.pending = False
+        self.frames_seen = 0
+        self.frames_submitted = 0
+
+    def _downsample(self, image: QImage) -> np.ndarray:
+        """缩小并转为灰度数组（返回独立副本，不依赖 image 的生命周期）"""
+        small = image.scaledToWidth(self.sample_width, Qt.TransformationMode.FastTransformation)
+        return to_grayscale(qimage_to_array(small)).astype(np.int16)
+
+    def _changed_ratio(self, frame_a: np.ndarray, frame_b: np.ndarray) -> float:
+        """两帧之间变化像素的占比；尺寸不同时视为完全变化"""
+        if frame_a.shape != frame_b.shape:
+            return 1.0
+        return float(np.count_nonzero(np.abs(frame_a - frame_b) > self.pixel_threshold)) / frame_a.size
+
+    def feed(self, image: QImage) -> bool:
+        """
+        输入一帧画面
+
+        Returns:
+            bool: 该帧是否为需要提交识别的新稳定画面
+        """
+        frame = self._downsample(image)
+        self.frames_seen += 1
+
+        if self.previous_frame is None or self._changed_ratio(frame, self.previous_frame) > self.change_ratio:
+            # 画面仍在变化（或刚开始监视），等待其稳定
+            self.stable_count = 0
+            self.pending = True
+        else:
+            self.stable_count += 1
+        self.previous_frame = frame
+
+        if not self.pending or self.stable_count < self.settle_frames:
+            return False
+
+        self.pending = False
+        if (self.submitted_frame is not None and
+                self._changed_ratio(frame, self.submitted_frame) <= self.change_ratio):
+            # 画面变化后又恢复原状（如鼠标划过），无需重复识别
+            return False
+
+        self.submitted_frame = frame
+        self.frames_submitted += 1
+        return True
+
+
+class FrameRingBuffer:
+    """
+    预分配的截图帧环形缓冲区
+
+    所有帧存放在一块 (容量, 高, 宽, 4) 的 uint8 数组中，写入时直接覆盖最旧的槽位，
+    运行期间不再分配内存。容量会按内存上限自动收缩；收缩后放不下 min_frames 帧时
+    （如 4K 或多屏拼接的大画面）自动降低缩放比例。画面尺寸变化（如切换截图目标）
+    时丢弃旧帧并按新尺寸重新分配。
+    """
+
+    def __init__(self, max_frames: int = 20, max_bytes: int = 256 * 1024 * 1024, scale: float = 1.0,
+                 min_frames: int = 1):
+        """
+        Args:
+            max_frames: 最多保留的帧数
+            max_bytes: 缓冲区内存上限（字节）
+            scale: 入库前的缩放比例 (0-1]，1.0 保留原始分辨率
+            min_frames: 至少要保留的帧数，内存上限放不下时自动降低缩放比例（最低 0.1）
+        """
+        self.max_frames = max(1, max_frames)
+        self.max_bytes = max_bytes
+        self.scale = min(1.0, max(0.1, scale))
+        self.min_frames = min(self.max_frames, max(1, min_frames))
+        # 实际使用的缩放比例（按画面尺寸和内存上限确定）及其对应的原始画面尺寸
+        self.effective_scale = self.scale
+        self.source_size = None
+
+        self.frames = None
+        self.timestamps = None
+        self.regions = []
+        self.capacity = 0
+        self.count = 0
+        self.next_index = 0
+
+        # 统计信息
+        self.frames_pushed = 0
+        self.total_push_ms = 0.0
+
+    @property
+    def memory_bytes(self) -> int:
+        """缓冲区实际占用的内存"""
+        return 0 if self.frames is None else self.frames.nbytes
+
+    @property
+    def average_push_ms(self) -> float:
+        """单帧写入（缩放+复制）的平均耗时"""
+        return self.total_push_ms / self.frames_pushed if self.frames_pushed else 0.0
+
+    def clear(self):
+        """释放缓冲区"""
+        self.frames = None
+        self.timestamps = None
+        self.regions = []
+        self.capacity = 0
+        self.count = 0
+        self.next_index = 0
+
+    def fit_scale(self, width: int, height: int) -> float:
+        """原始尺寸为 width×height 的画面能在内存上限内保留 min_frames 帧的缩放比例（不超过设定值）"""
+        frame_bytes = width * height * 4 * self.scale ** 2
+        if frame_bytes * self.min_frames <= self.max_bytes:
+            return self.scale
+        # 面积按比例的平方缩小，留一点余量抵消取整
+        return max(0.1, self.scale * math.sqrt(self.max_bytes / (frame_bytes * self.min_frames)) * 0.99)
+
+    def _allocate(self, width: int, height: int):
+        """按帧尺寸和内存上限分配缓冲区"""
+        frame_bytes = width * height * 4
+        self.capacity = max(1, min(self.max_frames, self.max_bytes // frame_bytes))
+        self.frames = np.empty((self.capacity, height, width, 4), dtype=np.uint8)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.regions = [None] * self.capacity
+        self.count = 0
+        self.next_index = 0
+
+    def push(self, image: QImage, region: QRect, timestamp: Optional[float] = None):
+        """
+        写入一帧
+
+        Args:
+            image: 截图（物理像素）
+            region: 该帧对应的全局逻辑坐标区域
+            timestamp: 采样时刻 (time.monotonic)，默认当前时间
+        """
+        start = time.perf_counter()
+        if self.source_size != (image.width(), image.height()):
+            self.source_size = (image.width(), image.height())
+            self.effective_scale = self.fit_scale(image.width(), image.height())
+        if self.effective_scale < 1.0:
+            image = image.scaledToWidth(max(1, int(image.width() * self.effective_scale)),
+                                        Qt.TransformationMode.FastTransformation)
+        pixels = qimage_to_array(image)
+        height, width = pixels.shape[:2]
+
+        if self.frames is None or self.frames.shape[1:3] != (height, width):
+            self._allocate(width, height)
+
+        slot = self.next_index
+        self.frames[slot] = pixels
+        self.timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+        self.regions[slot] = QRect(region)
+        self.next_index = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+        self.frames_pushed += 1
+        self.total_push_ms += (time.perf_counter() - start) * 1000
+
+    def span_seconds(self) -> float:
+        """缓冲区覆盖的时间跨度"""
+        if self.count < 2:
+            return 0.0
+        valid = self.timestamps[self._ordered_slots()]
+        return float(valid[-1] - valid[0])
+
+    def _ordered_slots(self) -> np.ndarray:
+        """按时间从旧到新排列的槽位索引"""
+        if self.count < self.capacity:
+            return np.arange(self.count)
+        return (np.arange(self.capacity) + self.next_index) % self.capacity
+
+    def frame_before(self, seconds_ago: float, now: Optional[float] = None) -> Tuple[Optional[QImage], Optional[QRect], float]:
+        """
+        取出指定秒数之前屏幕上的画面
+
+        选取采样时刻不晚于 (当前 - seconds_ago) 的最新一帧；缓冲区时间跨度不足时返回最旧的一帧。
+
+        Returns:
+            tuple: (帧图像副本, 全局逻辑坐标区域, 该帧距今的秒数)，缓冲区为空时返回 (None, None, 0.0)
+        """
+        if self.count == 0:
+            return None, None, 0.0
+        now = time.monotonic() if now is None else now
+
+        slots = self._ordered_slots()
+        times = self.timestamps[slots]
+        position = int(np.searchsorted(times, now - seconds_ago, side="right")) - 1
+        slot = int(slots[max(0, position)])
+
+        pixels = self.frames[slot]
+        height, width = pixels.shape[:2]
+        image = QImage(pixels.data, width, height, width * 4, QImage.Format.Format_RGB32).copy()
+        return image, QRect(self.regions[slot]), float(now - self.timestamps[slot])
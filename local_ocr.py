@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地OCR模块
+基于 Tesseract 的离线文字识别，输出格式与多模态API的识别结果保持一致
+"""
+
+from typing import Tuple
+
+from PyQt6.QtGui import QImage
+
+from image_processing import qimage_to_array
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # 本地OCR为可选功能，未安装时自动回退到云端
+    pytesseract = None
+    Image = None
+
+
+def is_local_ocr_available(tesseract_cmd: str = "") -> bool:
+    """检查本地OCR引擎是否可用"""
+    if pytesseract is None:
+        return False
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def _is_cjk(char: str) -> bool:
+    """判断字符是否为中日韩文字或全角标点（这些字符之间不需要空格）"""
+    code = ord(char)
+    return (0x3000 <= code <= 0x303F or 0x3400 <= code <= 0x9FFF or
+            0xF900 <= code <= 0xFAFF or 0xFF00 <= code <= 0xFFEF)
+
+
+def _join_words(words: list) -> str:
+    """按语言习惯拼接同一行的单词：中文之间直接相连，西文单词之间补空格"""
+    line = ""
+    for word in words:
+        if line and not (_is_cjk(line[-1]) or _is_cjk(word[0])):
+            line += " "
+        line += word
+    return line
+
+
+def get_text_from_image_local(image: QImage, lang: str = "chi_sim", tesseract_cmd: str = "") -> Tuple[str, float]:
+    """
+    使用本地Tesseract从图像中提取文字
+
+    Args:
+        image: 待识别图像
+        lang: Tesseract语言包，可用 "+" 组合，例如 "chi_sim+eng"
+        tesseract_cmd: tesseract可执行文件路径，留空使用系统PATH
+
+    Returns:
+        tuple: (与 get_text_from_image 相同格式的识别结果, 平均置信度0-100)
+               引擎不可用或出错时返回 (错误信息, 0.0)
+    """
+    if pytesseract is None:
+        return "本地OCR不可用：未安装 pytesseract", 0.0
+
+    try:
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+        # BGRA -> RGB，交给 PIL（Tesseract 不需要透明通道）
+        bgra = qimage_to_array(image)
+        pil_image = Image.fromarray(bgra[..., 2::-1].copy(), "RGB")
+
+        data = pytesseract.image_to_data(pil_image, lang=lang, output_type=pytesseract.Output.DICT)
+
+        # 按 (块, 段落, 行) 分组还原文本行，同时按字符数加权统计置信度
+        lines = {}
+        weighted_conf = 0.0
+        total_chars = 0
+        for i, word in enumerate(data.get("text", [])):
+            word = word.strip()
+            conf = float(data["conf"][i])
+            if not word or conf < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            weighted_conf += conf * len(word)
+            total_chars += len(word)
+
+        text = "\n".join(_join_words(words) for _, words in sorted(lines.items()))
+        confidence = weighted_conf / total_chars if total_chars else 0.0
+
+        result = (
+            "## 画面描述\n"
+            "（本地OCR仅提取文字，未生成画面描述）\n\n"
+            "## 对话内容\n"
+            f"{text if text else '无对话文字'}"
+        )
+        return result, confidence
+
+    except Exception as e:
+        return f"本地OCR识别失败: {str(e)}", 0.0
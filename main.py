@@ -8,6 +8,7 @@
 import sys
 import os
 import datetime
+import time
 from pathlib import Path
 import ctypes
 from ctypes import wintypes
@@ -15,10 +16,10 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QTabWidget, QWidget,
     QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QComboBox,
     QPushButton, QTextEdit, QLineEdit, QInputDialog, QMessageBox,
-    QMenuBar, QMenu, QCheckBox
+    QMenuBar, QMenu, QCheckBox, QListWidget, QListWidgetItem
 )
 from PyQt6.QtCore import Qt, QRect, QTimer, QThread, pyqtSignal, QObject, QSize
-from PyQt6.QtGui import QFont, QPixmap, QClipboard, QAction, QKeySequence, QIcon, QShortcut
+from PyQt6.QtGui import QFont, QPixmap, QClipboard, QAction, QKeySequence, QIcon, QShortcut, QPainter, QTextCursor
 
 BASE_DIR = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
 
@@ -38,10 +39,39 @@ if hasattr(Qt.ApplicationAttribute, 'AA_UseHighDpiPixmaps'):
 from snipping_tool import SnippingWidget
 
 # 导入API服务
-from api_service import get_text_from_image, load_api_config, save_api_config, get_provider_config, test_api_connectivity, API_PROVIDERS
+from api_service import (
+    get_text_from_image, recognize_image_text, load_api_config, save_api_config, get_provider_config,
+    test_api_connectivity, API_PROVIDERS, OCR_BACKENDS, OCR_BACKEND_CLOUD, OCR_BACKEND_LOCAL,
+    get_stt_settings, STT_PROVIDERS, STT_PROVIDER_SILICONFLOW
+)
 
 # 导入音频处理模块
-from audio_processing import AudioRecorder, STTWorker
+from audio_processing import (AudioRecorder, STTWorker, ChunkedSTTWorker, PauseSegmenter, StreamingTranscriber,
+                              STTLatencyWorker, STT_ERROR_PREFIXES, AUDIO_FORMATS, AUDIO_FORMAT_WAV,
+                              is_audio_format_available, list_input_devices,
+                              create_audio_source)
+
+# 导入屏幕捕获模块
+from screen_capture import (grab_capture_target, exclude_window_from_capture, wait_for_compositor,
+                            CAPTURE_TARGETS, CAPTURE_TARGET_PRIMARY, CAPTURE_TARGET_WINDOW)
+
+# 导入图像处理模块
+from image_processing import (detect_dialogue_region, preprocess_for_ocr, FrameChangeDetector, FrameRingBuffer,
+                              PREPROCESS_PRESETS, PREPROCESS_NONE)
+
+# 导入档案存储模块
+from dossier_store import (create_dossier_repository, SQLiteDossierRepository, DOSSIER_BACKEND_MARKDOWN,
+                           DOCUMENT_CHARACTER, DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME, ENTRY_HEADER_PREFIX)
+
+# 导入上下文检索模块
+from context_retrieval import ContextRetriever, read_documents, estimate_tokens
+
+# 导入档案压缩模块
+from dossier_compaction import (plan_compaction, build_compaction_prompt, compose_compacted_dossier,
+                                next_archive_version, archive_dossier)
+
+# 导入分页档案视图
+from dossier_view import PagedDossierView
 
 
 
@@ -62,6 +92,8 @@ class WinHotkeyWorker(QThread):
         self.MOD_CONTROL = 0x0002
         self.VK_1 = 0x31
         self.VK_2 = 0x32
+        self.VK_3 = 0x33
+        self.VK_4 = 0x34
 
         class WNDCLASS(ctypes.Structure):
             _fields_ = [("style", ctypes.c_uint),
@@ -90,6 +122,10 @@ class WinHotkeyWorker(QThread):
                     self.hotkey.emit("ctrl+1")
                 elif hotkey_id == 102:
                     self.hotkey.emit("ctrl+2")
+                elif hotkey_id == 103:
+                    self.hotkey.emit("ctrl+3")
+                elif hotkey_id == 104:
+                    self.hotkey.emit("ctrl+4")
                 return 0
             elif msg == 0x0002:  # WM_DESTROY
                 user32.PostQuitMessage(0)
@@ -133,6 +169,10 @@ class WinHotkeyWorker(QThread):
             print("RegisterHotKey(hwnd, Alt+1) 失败")
         if not user32.RegisterHotKey(self.hwnd, 102, self.MOD_ALT, self.VK_2):
             print("RegisterHotKey(hwnd, Alt+2) 失败")
+        if not user32.RegisterHotKey(self.hwnd, 103, self.MOD_ALT, self.VK_3):
+            print("RegisterHotKey(hwnd, Alt+3) 失败")
+        if not user32.RegisterHotKey(self.hwnd, 104, self.MOD_ALT, self.VK_4):
+            print("RegisterHotKey(hwnd, Alt+4) 失败")
 
         msg = wintypes.MSG()
         while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) != 0:
@@ -142,6 +182,8 @@ class WinHotkeyWorker(QThread):
         # 清理
         user32.UnregisterHotKey(self.hwnd, 101)
         user32.UnregisterHotKey(self.hwnd, 102)
+        user32.UnregisterHotKey(self.hwnd, 103)
+        user32.UnregisterHotKey(self.hwnd, 104)
         user32.DestroyWindow(self.hwnd)
         self.hwnd = None
 
@@ -167,30 +209,47 @@ class VoiceInputManager(QObject):
         self.service_enabled = False
         self.is_recording = False
 
-        # 音频相关组件
-        self.audio_recorder = AudioRecorder()
+        # 音频相关组件（stt_audio_source 可改为合成语音或 WAV 回放，便于在没有麦克风的机器上调试）
+        self.audio_recorder = AudioRecorder(create_audio_source(api_config.get("stt_audio_source", "")))
         self.stt_worker = None
-        self.recording_timer = None
+        # 边录边识别模式下的片段转写器：每次录音新建一个，停止录音后移入 draining_transcribers 等待剩余片段
+        self.streaming_transcriber = None
+        self.draining_transcribers = []
 
         # 重置定时器句柄
         self.reset_timer = None
 
+    def get_stt_target(self) -> tuple:
+        """当前语音识别提供商的 (API Key, 端点, 模型名称)"""
+        return get_stt_settings(self.api_config)
+
+    def is_stt_configured(self) -> bool:
+        """硅基流动需要API Key，本地或自定义服务只需要端点"""
+        api_key, endpoint, _ = self.get_stt_target()
+        if self.api_config.get("stt_provider", STT_PROVIDER_SILICONFLOW) == STT_PROVIDER_SILICONFLOW:
+            return bool(api_key)
+        return bool(endpoint)
+
     def toggle_service(self, enabled: bool):
         """启用或禁用语音服务"""
         self.service_enabled = enabled
 
         if enabled:
             # 检查API配置
-            stt_api_key = self.api_config.get("stt_siliconflow_api_key", "")
-            if not stt_api_key:
-                self.status_updated.emit("请先配置语音识别API Key", "#F44336")
+            if not self.is_stt_configured():
+                self.status_updated.emit("请先配置语音识别API Key或端点", "#F44336")
                 return False
 
+            # 语音功能开启期间保持录音设备常开，按下Shift即可录音，并保留按键前的预录数据
+            if self.api_config.get("stt_keep_device_open", True):
+                self.audio_recorder.open_session(int(self.api_config.get("stt_preroll_ms", 300)))
+
             self.status_updated.emit("语音功能开启 (按Shift键切换录音)", "#4CAF50")
         else:
             # 如果正在录音，先停止
             if self.is_recording:
                 self._stop_recording()
+            self.audio_recorder.close_session()
             self.status_updated.emit("语音功能关闭", "#888888")
 
         return True
@@ -221,14 +280,40 @@ class VoiceInputManager(QObject):
             self.reset_timer.stop()
 
         try:
+            self.audio_recorder.vad_enabled = self.api_config.get("stt_vad", True)
+            self.audio_recorder.spill_mb = float(self.api_config.get("stt_buffer_spill_mb", 64))
+
+            # 边录边识别：每次录音使用新的转写器（上一次录音的转写器可能仍在识别剩余片段）
+            if self.api_config.get("stt_streaming", False):
+                stt_api_key, stt_endpoint, stt_model = self.get_stt_target()
+                transcriber = StreamingTranscriber(
+                    self.audio_recorder,
+                    stt_api_key,
+                    int(self.api_config.get("stt_max_concurrency", 3)),
+                    self.api_config.get("stt_audio_format", AUDIO_FORMAT_WAV),
+                    endpoint=stt_endpoint,
+                    model=stt_model
+                )
+                transcriber.text_ready.connect(self.text_recognized.emit)
+                transcriber.progress_updated.connect(
+                    lambda done, total, transcriber=transcriber: self._on_streaming_progress(transcriber, done, total))
+                transcriber.all_finished.connect(
+                    lambda count, transcriber=transcriber: self._on_streaming_finished(transcriber, count))
+                transcriber.attach(PauseSegmenter(
+                    self.audio_recorder.sample_rate,
+                    silence_rms=float(self.api_config.get("stt_silence_rms", 400)),
+                    pause_ms=int(self.api_config.get("stt_pause_ms", 700))
+                ))
+                self.streaming_transcriber = transcriber
+
             if self.audio_recorder.start_recording():
                 self.is_recording = True
+                # 录音数据由 AudioRecorder 的音频回调线程持续采集，GUI线程无需轮询
                 self.status_updated.emit("🔴 正在录音... (再按Shift键停止)", "#F44336")
-
-                # 启动录制定时器
-                self.recording_timer = QTimer()
-                self.recording_timer.timeout.connect(self.audio_recorder.record_chunk)
-                self.recording_timer.start(50)  # 每50ms录制一次
+            elif self.streaming_transcriber:
+                transcriber, self.streaming_transcriber = self.streaming_transcriber, None
+                self.draining_transcribers.append(transcriber)
+                transcriber.detach()
 
         except Exception as e:
             self.status_updated.emit(f"录音启动失败: {str(e)}", "#F44336")
@@ -238,10 +323,16 @@ class VoiceInputManager(QObject):
         try:
             self.is_recording = False
 
-            # 停止录制定时器
-            if self.recording_timer:
-                self.recording_timer.stop()
-                self.recording_timer = None
+            # 按本次录音是否接入了转写器决定停止方式
+            transcriber, self.streaming_transcriber = self.streaming_transcriber, None
+            if transcriber is not None:
+                # 边录边识别：大部分片段已在录音时识别完，只需等待剩余片段
+                self.status_updated.emit("🔄 正在识别剩余片段...", "#FF9800")
+                self.audio_recorder.stop_recording()
+                # 先移入等待列表再断开：没有剩余片段时 detach() 会立即发出 all_finished
+                self.draining_transcribers.append(transcriber)
+                transcriber.detach()
+                return
 
             # 获取录制的音频数据
             audio_data = self.audio_recorder.stop_recording()
@@ -249,18 +340,69 @@ class VoiceInputManager(QObject):
             if audio_data:
                 self.status_updated.emit("🔄 正在识别中...", "#FF9800")
 
-                # 启动语音转文字
-                stt_api_key = self.api_config.get("stt_siliconflow_api_key", "")
-                self.stt_worker = STTWorker(audio_data, stt_api_key)
+                # 启动语音转文字：长录音（如风闻记录的整段对话）在静音处分段并发识别
+                stt_api_key, stt_endpoint, stt_model = self.get_stt_target()
+                sample_rate = self.audio_recorder.sample_rate
+                audio_format = self.api_config.get("stt_audio_format", AUDIO_FORMAT_WAV)
+                chunk_seconds = float(self.api_config.get("stt_chunk_seconds", 30))
+                if len(audio_data) / (sample_rate * 2) > chunk_seconds:
+                    self.stt_worker = ChunkedSTTWorker(
+                        audio_data, stt_api_key, sample_rate, audio_format,
+                        max_chunk_seconds=chunk_seconds,
+                        max_workers=int(self.api_config.get("stt_max_concurrency", 3)),
+                        max_retries=int(self.api_config.get("stt_chunk_retries", 2)),
+                        endpoint=stt_endpoint,
+                        model=stt_model
+                    )
+                    self.stt_worker.progress_updated.connect(self._on_chunked_progress)
+                else:
+                    self.stt_worker = STTWorker(audio_data, stt_api_key, sample_rate, audio_format,
+                                                stt_endpoint, stt_model)
                 self.stt_worker.stt_completed.connect(self._on_stt_completed)
                 self.stt_worker.stt_failed.connect(self._on_stt_failed)
                 self.stt_worker.start()
+            elif self.audio_recorder.vad_enabled and self.audio_recorder.last_vad_stats.get("speech") is False:
+                # 整段录音都是静音，不上传
+                self._on_stt_completed("")
             else:
                 self.status_updated.emit("语音功能开启 (按Shift键切换录音)", "#4CAF50")
 
         except Exception as e:
             self.status_updated.emit(f"录音停止失败: {str(e)}", "#F44336")
 
+    def _on_chunked_progress(self, done: int, total: int):
+        """长录音分段识别进度"""
+        self.status_updated.emit(f"🔄 正在分段识别 ({done}/{total})...", "#FF9800")
+
+    def _on_streaming_progress(self, transcriber, done: int, total: int):
+        """边录边识别进度"""
+        if transcriber is self.streaming_transcriber and self.is_recording:
+            self.status_updated.emit(f"🔴 正在录音... 已识别 {done}/{total} 段 (再按Shift键停止)", "#F44336")
+        elif not self.is_recording:
+            # 新的录音进行中时不显示上一次录音的收尾进度
+            self.status_updated.emit(f"🔄 正在识别剩余片段 ({done}/{total})...", "#FF9800")
+
+    def _on_streaming_finished(self, transcriber, recognized_count: int):
+        """某次录音的边录边识别全部完成"""
+        if transcriber in self.draining_transcribers:
+            self.draining_transcribers.remove(transcriber)
+        transcriber.deleteLater()
+        if self.is_recording:
+            # 已开始新的录音，保留录音中的状态提示
+            return
+
+        if recognized_count:
+            self.status_updated.emit(f"✅ 识别完成，共 {recognized_count} 段", "#4CAF50")
+        else:
+            self.status_updated.emit("❌ 未识别到有效语音", "#FF9800")
+
+        if self.reset_timer:
+            self.reset_timer.stop()
+        self.reset_timer = QTimer(self)
+        self.reset_timer.setSingleShot(True)
+        self.reset_timer.timeout.connect(self._reset_status)
+        self.reset_timer.start(3000)
+
     def _on_stt_completed(self, text: str):
         """语音识别完成"""
         if text and text != "未识别到语音内容":
@@ -306,18 +448,28 @@ class OCRWorker(QThread):
     ocr_completed = pyqtSignal(str)  # OCR完成信号，传递识别结果
     ocr_failed = pyqtSignal(str)     # OCR失败信号，传递错误信息
 
-    def __init__(self, pixmap: QPixmap, api_key: str, endpoint: str, model: str):
+    def __init__(self, pixmap: QPixmap, api_key: str, endpoint: str, model: str, ocr_options: dict = None):
         super().__init__()
-        self.pixmap = pixmap
+        # QPixmap 只能在主线程使用，这里先转为 QImage 交给工作线程
+        self.image = pixmap.toImage()
         self.api_key = api_key
         self.endpoint = endpoint
         self.model = model
+        self.ocr_options = ocr_options
 
     def run(self):
         """在后台线程中执行OCR"""
         try:
-            # 调用多模态API进行图像识别
-            result = get_text_from_image(self.api_key, self.endpoint, self.model, self.pixmap)
+            # 识别前的图像预处理（灰度、对比度拉伸、二值化、锐化）
+            image = self.image
+            preset = (self.ocr_options or {}).get("preprocess", PREPROCESS_NONE)
+            if preset != PREPROCESS_NONE:
+                image, timings = preprocess_for_ocr(image, preset)
+                stages = "，".join(f"{name} {ms:.1f} ms" for name, ms in timings.items())
+                print(f"OCR预处理「{preset}」{image.width()}x{image.height()}：{stages}，合计 {sum(timings.values()):.1f} ms")
+
+            # 按识别引擎路由：本地OCR / 云端多模态API
+            result = recognize_image_text(self.api_key, self.endpoint, self.model, image, self.ocr_options)
 
             # 检查结果是否包含错误信息
             if result.startswith(("API调用失败", "网络连接错误", "API调用超时", "图像识别过程中出现错误")):
@@ -361,6 +513,33 @@ class ChatWorker(QThread):
 
 
 
+class ContextIndexWorker(QThread):
+    """智能检索索引工作线程：在后台为所有档案和风闻记录分词建索引，建好后交给GUI线程替换使用"""
+
+    index_ready = pyqtSignal(object, int, float)  # 新的检索引擎, 片段数, 耗时（秒）
+
+    def __init__(self, documents: list, embedding_model: str):
+        super().__init__()
+        self.documents = documents
+        self.embedding_model = embedding_model
+
+    def run(self):
+        start_time = time.perf_counter()
+        try:
+            retriever = ContextRetriever(embedding_model=self.embedding_model)
+            added = 0
+            for kind, name, content in self.documents:
+                # 窗口关闭时尽快退出
+                if self.isInterruptionRequested():
+                    return
+                added += retriever.update_document(kind, name, content)
+            retriever.prepare_embeddings()
+        except Exception as e:
+            print(f"建立检索索引失败: {str(e)}")
+            retriever, added = None, 0
+        self.index_ready.emit(retriever, added, time.perf_counter() - start_time)
+
+
 class DecisionAnalysisWorker(QThread):
     """抉择分析工作线程，用于在后台调用多模态API进行画面分析"""
 
@@ -468,9 +647,37 @@ class MainWindow(QMainWindow):
         self.is_capturing = False
         # 定义常量
         self.NO_CHARACTER_NOTICE = "暂无角色档案"
+        self.AUTO_REGION_NAME = "自动识别对话框"
+
+        # 最近一次框选的截图区域（逻辑坐标），用于保存为预设区域
+        self.last_capture_rect = None
+
+        # 主窗口是否已从屏幕截图中排除（排除成功时截图无需隐藏主窗口）
+        self.excluded_from_capture = False
+        # 正在等待主窗口真正隐藏后再抓屏
+        self.waiting_for_hide = False
+        # 截图延迟统计：热键触发时刻与各阶段耗时
+        self.capture_request_time = None
+        self.capture_grab_ms = 0.0
+
+        # 加载API配置
+        self.api_config = load_api_config()
 
         self.init_directories()
         self.RUMOR_LOG_FILE = str(BASE_DIR / "风闻.md")
+        # 档案压缩前的原文按版本存档在此目录下（每个角色一个子目录）
+        self.DOSSIER_ARCHIVE_DIR = "dossier_archive"
+        # 角色档案与风闻记录：默认为 Markdown 文件（只读取一次，之后从内存返回，文件被外部修改时自动失效），
+        # 可在 config.json 中改用 SQLite 数据库（按条目存储，全文索引）
+        self.dossier_repository = create_dossier_repository(
+            self.api_config.get("dossier_backend", DOSSIER_BACKEND_MARKDOWN),
+            self.characters_dir, self.RUMOR_LOG_FILE, "dossiers.db", self)
+        # 智能检索：按与当前局面的相关度从档案和风闻记录中挑选片段，填满抉择Prompt的 token 预算
+        # 首次建索引要为所有档案分词，在首次启用智能检索时于后台线程中进行，建好前抉择辅助按手动选择的相关人读取档案
+        self.context_retriever = ContextRetriever(
+            embedding_model=self.api_config.get("retrieval_embedding_model", ""))
+        self.context_index_ready = False
+        self.context_index_worker = None
         self.is_viewing_rumors = False
         self.init_ui()
         self.load_character_list()
@@ -490,8 +697,36 @@ class MainWindow(QMainWindow):
         # 风闻记录分析工作线程
         self.rumor_worker = None
 
-        # 加载API配置
-        self.api_config = load_api_config()
+        # 档案压缩：档案超过阈值后在后台把旧记录整理为历史摘要，多个角色排队逐个处理
+        self.compaction_worker = None
+        self.compaction_queue = []
+        self.compaction_saved_tokens = 0
+
+        # 语音识别延迟对比工作线程
+        self.stt_latency_worker = None
+
+        # 监视模式：定时抓屏，画面稳定变化后自动识别
+        self.watch_timer = QTimer(self)
+        self.watch_timer.timeout.connect(self.on_watch_tick)
+        self.watch_detector = None
+        self.watch_ocr_worker = None
+        self.watch_pending_pixmap = None
+        self.last_watch_result = ""
+
+        # 回溯截图：后台定时采样，保留最近若干帧供 Alt+4 取用
+        self.retro_timer = QTimer(self)
+        self.retro_timer.timeout.connect(self.on_retro_tick)
+        self.retro_buffer = None
+        self.retro_reported_size = None
+        self.retro_tick_count = 0
+        self.retro_tick_ms_total = 0.0
+
+        # 风闻持续收录：常开录音，按停顿切分后在后台识别，带时间戳追加到转录原文
+        self.rumor_recorder = None
+        self.rumor_transcriber = None
+        self.rumor_capture_timer = QTimer(self)
+        self.rumor_capture_timer.timeout.connect(self.update_rumor_capture_stats)
+        self.rumor_capture_cpu_mark = (0.0, 0.0)
 
         # 创建语音输入管理器
         self.voice_manager = VoiceInputManager(self.api_config)
@@ -506,10 +741,35 @@ class MainWindow(QMainWindow):
         # 初始化全局热键（Windows），保留原有局部快捷键作为备用
         # 延迟到事件循环启动后注册，更稳定
         QTimer.singleShot(0, self.setup_hotkeys)
+        QTimer.singleShot(0, self.setup_capture_exclusion)
+        # 启动后检查一遍已有档案是否需要压缩
+        QTimer.singleShot(5000, self.schedule_dossier_compaction)
 
     def closeEvent(self, event):
         """窗口关闭时注销全局热键"""
         try:
+            # 停止监视模式与回溯采样
+            self.watch_timer.stop()
+            self.retro_timer.stop()
+            self.stop_rumor_capture()
+
+            # 等待后台建索引的线程退出（不再接收结果）
+            if self.context_index_worker is not None:
+                self.context_index_worker.index_ready.disconnect()
+                self.context_index_worker.requestInterruption()
+                self.context_index_worker.wait()
+
+            # 等待正在进行的档案压缩请求结束，关闭后不再改写档案
+            self.compaction_queue.clear()
+            if self.compaction_worker is not None:
+                self.compaction_worker.chat_completed.disconnect()
+                self.compaction_worker.chat_failed.disconnect()
+                self.compaction_worker.finished.disconnect()
+                self.compaction_worker.wait()
+
+            # 释放常驻的录音设备
+            self.voice_manager.audio_recorder.close_session()
+
             # 停止消息窗口热键监听线程
             if hasattr(self, 'hotkey_worker') and self.hotkey_worker and self.hotkey_worker.isRunning():
                 try:
@@ -537,12 +797,40 @@ class MainWindow(QMainWindow):
         except Exception as exc:
             print(f"全局热键监听启动失败: {exc}")
 
+    def setup_capture_exclusion(self):
+        """将主窗口从屏幕截图中排除（Windows 10 2004+），失败时截图前改为隐藏主窗口"""
+        if not self.api_config.get("exclude_from_capture", True):
+            return
+        self.excluded_from_capture = exclude_window_from_capture(self.winId())
+        if self.excluded_from_capture:
+            print("主窗口已从屏幕截图中排除，截图时无需隐藏主窗口。")
+
+    def hideEvent(self, event):
+        """主窗口隐藏后再抓屏（替代固定延时等待）"""
+        super().hideEvent(event)
+        if self.waiting_for_hide:
+            self.waiting_for_hide = False
+            # 回到事件循环，让隐藏操作提交给窗口系统后再抓屏
+            QTimer.singleShot(0, self.capture_after_hide)
+
+    def capture_after_hide(self):
+        """等待桌面合成器刷新出不含主窗口的画面后抓屏"""
+        if wait_for_compositor():
+            self.capture_and_snip()
+        else:
+            # 无法与合成器同步（非Windows或DWM不可用）时，留出一帧左右的余量
+            QTimer.singleShot(self.api_config.get("capture_hide_fallback_ms", 50), self.capture_and_snip)
+
     def on_hotkey_triggered(self, hotkey_name: str):
         print(f"全局热键触发: {hotkey_name}")
         if hotkey_name == "ctrl+1":
             self.start_smart_screenshot()
         elif hotkey_name == "ctrl+2":
             self.capture_fullscreen_and_analyze()
+        elif hotkey_name == "ctrl+3":
+            self.capture_preset_region()
+        elif hotkey_name == "ctrl+4":
+            self.capture_retro_frame()
 
     def show_message(self, title: str, text: str, icon: str = "information"):
         """显示消息弹窗（白底黑字）
@@ -667,10 +955,15 @@ class MainWindow(QMainWindow):
         """测试语音识别API连接"""
         # 获取语音识别API配置
         stt_api_key = self.stt_api_key_edit.text().strip()
+        stt_endpoint = self.stt_endpoint_edit.text().strip()
+        stt_model = self.stt_model_edit.text().strip()
 
-        if not stt_api_key:
+        if self.stt_provider_combo.currentText() == STT_PROVIDER_SILICONFLOW and not stt_api_key:
             self.show_message("配置不完整", "请先填写语音识别API Key！", "warning")
             return
+        if not stt_endpoint:
+            self.show_message("配置不完整", "请先填写语音识别API端点！", "warning")
+            return
 
         self.test_stt_button.setText("测试中...")
         self.test_stt_button.setEnabled(False)
@@ -678,7 +971,7 @@ class MainWindow(QMainWindow):
         try:
             # 调用api_service中的语音识别测试函数
             from api_service import test_stt_connectivity
-            success, message = test_stt_connectivity(stt_api_key)
+            success, message = test_stt_connectivity(stt_api_key, stt_endpoint, stt_model)
 
             if success:
                 self.show_message("测试成功", message, "information")
@@ -691,6 +984,48 @@ class MainWindow(QMainWindow):
             self.test_stt_button.setText("测试语音识别")
             self.test_stt_button.setEnabled(True)
 
+    def compare_stt_latency(self):
+        """在后台依次请求已配置的语音识别提供商，对比端到端延迟"""
+        current_provider = self.stt_provider_combo.currentText()
+        targets = []
+        for provider_name in STT_PROVIDERS:
+            if provider_name == current_provider:
+                # 当前提供商使用界面上尚未保存的填写内容
+                api_key = self.stt_api_key_edit.text().strip()
+                endpoint = self.stt_endpoint_edit.text().strip()
+                model = self.stt_model_edit.text().strip()
+            else:
+                api_key, endpoint, model = get_stt_settings(self.api_config, provider_name)
+            if not endpoint or (provider_name == STT_PROVIDER_SILICONFLOW and not api_key):
+                continue
+            targets.append((provider_name, api_key, endpoint, model))
+
+        if not targets:
+            self.show_message("配置不完整", "请先配置至少一个语音识别提供商！", "warning")
+            return
+
+        self.compare_stt_button.setText("对比中...")
+        self.compare_stt_button.setEnabled(False)
+        self.stt_latency_worker = STTLatencyWorker(
+            targets, self.stt_audio_format_combo.currentText(),
+            repeat=int(self.api_config.get("stt_latency_repeat", 3))
+        )
+        self.stt_latency_worker.comparison_finished.connect(self.on_stt_latency_compared)
+        self.stt_latency_worker.start()
+
+    def on_stt_latency_compared(self, rows: list):
+        """显示各提供商的延迟对比结果"""
+        self.compare_stt_button.setText("对比识别延迟")
+        self.compare_stt_button.setEnabled(True)
+
+        lines = ["使用 3 秒合成音频，统计编码 + 上传 + 识别的耗时：", ""]
+        for provider_name, median_ms, min_ms, result in rows:
+            if result.startswith(STT_ERROR_PREFIXES):
+                lines.append(f"• {provider_name}：失败 — {result}")
+            else:
+                lines.append(f"• {provider_name}：中位数 {median_ms:.0f} ms，最快 {min_ms:.0f} ms")
+        self.show_message("识别延迟对比", "\n".join(lines), "information")
+
     def build_polish_prompt(self, ocr_result: str, user_context: str, character_names: list) -> list:
         """构建内容整合润色的Prompt消息列表"""
         prompt_template = """# 角色与任务
@@ -884,13 +1219,13 @@ class MainWindow(QMainWindow):
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             record_content = f"\n\n## 记录时间: {timestamp}\n\n{content_to_record}\n"
 
-            # 直接记录，不再弹窗确认
-            # 构建文件路径
-            file_path = os.path.join(self.characters_dir, f"{selected_character}.md")
-
-            # 追加内容到文件
-            with open(file_path, 'a', encoding='utf-8') as file:
-                file.write(record_content)
+            # 直接记录，不再弹窗确认；追加到档案文件，同时更新内存中的档案
+            self.dossier_repository.append_character(selected_character, record_content)
+            # 增量更新检索索引（只为新追加的记录分词）
+            self.context_retriever.update_document(
+                DOCUMENT_CHARACTER, selected_character, self.dossier_repository.read_character(selected_character) or "")
+            # 档案超过阈值时在后台压缩旧记录
+            self.schedule_dossier_compaction(selected_character)
 
             # 显示内联状态反馈
             self.record_status_label.setText(f"✅ 已记录到「{selected_character}」档案")
@@ -980,6 +1315,119 @@ class MainWindow(QMainWindow):
             }
         ]
 
+    def toggle_rumor_capture(self):
+        """切换风闻持续收录"""
+        if self.rumor_capture_button.isChecked():
+            self.start_rumor_capture()
+        else:
+            self.stop_rumor_capture()
+
+    def start_rumor_capture(self):
+        """开始持续收录：常开录音设备，按停顿切分的片段在后台并发识别"""
+        api_key, endpoint, model = self.voice_manager.get_stt_target()
+        if not self.voice_manager.is_stt_configured():
+            self.rumor_capture_button.setChecked(False)
+            self.rumor_capture_status_label.setText("❌ 请先配置语音识别API Key或端点")
+            self.rumor_capture_status_label.setStyleSheet("color: #F44336; margin-right: 10px;")
+            QTimer.singleShot(3000, lambda: self.rumor_capture_status_label.setText(""))
+            return
+        if self.rumor_transcriber:
+            # 上一次收录的剩余片段仍在识别
+            self.rumor_capture_button.setChecked(False)
+            self.rumor_capture_status_label.setText("⏳ 正在识别上一段录音，请稍候")
+            self.rumor_capture_status_label.setStyleSheet("color: #FF9800; margin-right: 10px;")
+            QTimer.singleShot(3000, lambda: self.rumor_capture_status_label.setText(""))
+            return
+
+        device_index = self.api_config.get("rumor_capture_device_index")
+        self.rumor_recorder = AudioRecorder(create_audio_source(
+            self.api_config.get("stt_audio_source", ""),
+            int(device_index) if device_index is not None else None))
+        self.rumor_recorder.vad_enabled = self.api_config.get("stt_vad", True)
+
+        self.rumor_transcriber = StreamingTranscriber(
+            self.rumor_recorder, api_key,
+            int(self.api_config.get("stt_max_concurrency", 3)),
+            self.api_config.get("stt_audio_format", AUDIO_FORMAT_WAV),
+            max_pending=int(self.api_config.get("rumor_capture_max_pending", 8)),
+            endpoint=endpoint,
+            model=model
+        )
+        self.rumor_transcriber.timed_text_ready.connect(self.on_rumor_capture_text)
+        self.rumor_transcriber.all_finished.connect(self.on_rumor_capture_finished)
+        self.rumor_transcriber.attach(PauseSegmenter(
+            self.rumor_recorder.sample_rate,
+            silence_rms=float(self.api_config.get("stt_silence_rms", 400)),
+            pause_ms=int(self.api_config.get("stt_pause_ms", 700))
+        ))
+
+        if not self.rumor_recorder.start_recording():
+            try:
+                devices = ", ".join(f"{index}: {name}" for index, name in list_input_devices())
+                print(f"可用录音设备: {devices}")
+            except Exception as e:
+                print(f"列出录音设备失败: {str(e)}")
+            self.rumor_transcriber.detach()
+            self.rumor_capture_button.setChecked(False)
+            self.rumor_capture_status_label.setText("❌ 无法打开录音设备")
+            self.rumor_capture_status_label.setStyleSheet("color: #F44336; margin-right: 10px;")
+            QTimer.singleShot(3000, lambda: self.rumor_capture_status_label.setText(""))
+            return
+
+        self.rumor_capture_button.setText("⏹ 停止收录")
+        self.rumor_capture_cpu_mark = (time.process_time(), time.monotonic())
+        self.rumor_capture_timer.start(2000)
+        self.rumor_capture_status_label.setText("🔴 收录中")
+        self.rumor_capture_status_label.setStyleSheet("color: #FF9800; margin-right: 10px;")
+
+    def stop_rumor_capture(self):
+        """停止持续收录，已切出的片段继续识别完毕"""
+        if not self.rumor_recorder or not self.rumor_recorder.is_recording:
+            return
+        self.rumor_recorder.stop_recording()
+        self.rumor_transcriber.detach()
+        self.rumor_capture_button.setChecked(False)
+        self.rumor_capture_button.setText("🎙️ 持续收录")
+
+    def update_rumor_capture_stats(self):
+        """显示持续收录的CPU占用（本进程全部线程）与识别积压"""
+        if not self.rumor_transcriber:
+            self.rumor_capture_timer.stop()
+            return
+        cpu_time, wall_time = time.process_time(), time.monotonic()
+        last_cpu, last_wall = self.rumor_capture_cpu_mark
+        cpu_percent = (cpu_time - last_cpu) / max(wall_time - last_wall, 1e-6) * 100
+        self.rumor_capture_cpu_mark = (cpu_time, wall_time)
+
+        transcriber = self.rumor_transcriber
+        state = "🔴 收录中" if self.rumor_recorder and self.rumor_recorder.is_recording else "🔄 识别剩余片段"
+        text = (f"{state} | CPU {cpu_percent:.0f}% | 队列 {transcriber.pending}/{transcriber.max_pending} | "
+                f"已识别 {transcriber.recognized} 段")
+        if transcriber.dropped:
+            text += f" | 丢弃 {transcriber.dropped}"
+        self.rumor_capture_status_label.setText(text)
+        self.rumor_capture_status_label.setStyleSheet("color: #FF9800; margin-right: 10px;")
+
+    def on_rumor_capture_text(self, started_at: float, text: str):
+        """按片段顺序把识别结果带时间戳追加到转录原文末尾"""
+        timestamp = datetime.datetime.fromtimestamp(started_at).strftime("%H:%M:%S")
+        self.rumor_transcript_text.append(f"[{timestamp}] {text}")
+
+    def on_rumor_capture_finished(self, recognized_count: int):
+        """持续收录结束且剩余片段识别完毕"""
+        dropped = self.rumor_transcriber.dropped
+        self.rumor_transcriber.deleteLater()
+        self.rumor_transcriber = None
+        self.rumor_recorder = None
+        self.rumor_capture_timer.stop()
+
+        text = f"✅ 收录结束，共 {recognized_count} 段"
+        if dropped:
+            text += f"（积压丢弃 {dropped} 段）"
+        self.rumor_capture_status_label.setText(text)
+        self.rumor_capture_status_label.setStyleSheet("color: #4CAF50; margin-right: 10px;")
+        QTimer.singleShot(4000, lambda: self.rumor_capture_status_label.setText(""))
+
     def run_rumor_analysis(self):
         """触发风闻记录的AI整理流程"""
         try:
@@ -1021,10 +1469,9 @@ class MainWindow(QMainWindow):
                     )
                     continue
 
-                file_path = os.path.join(self.characters_dir, f"{speaker}.md")
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read().strip()
+                content = self.dossier_repository.read_character(speaker)
+                if content is not None:
+                    content = content.strip()
                     dossier_entries.append((speaker, content if content else "（档案内容为空）"))
                 else:
                     dossier_entries.append((speaker, "（未找到对应档案，请补充角色背景。）"))
@@ -1110,10 +1557,11 @@ class MainWindow(QMainWindow):
 
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             entry = f"\n\n## 记录时间: {timestamp}\n\n{content}\n"
-            with open(self.RUMOR_LOG_FILE, 'a', encoding='utf-8') as file:
-                file.write(entry)
+            self.dossier_repository.append_rumor(entry)
+            self.context_retriever.update_document(
+                DOCUMENT_RUMOR, RUMOR_DOCUMENT_NAME, self.dossier_repository.read_rumors() or "")
 
-            self.rumor_record_status_label.setText("✅ 已追加到风闻.md")
+            self.rumor_record_status_label.setText("✅ 已追加到风闻记录")
             self.rumor_record_status_label.setStyleSheet("color: #4CAF50; margin-left: 10px;")
             QTimer.singleShot(4000, lambda: self.rumor_record_status_label.setText(""))
 
@@ -1170,6 +1618,14 @@ class MainWindow(QMainWindow):
         # 连接快捷键的 activated 信号到新的截图方法
         self.fullscreen_shortcut.activated.connect(self.capture_fullscreen_and_analyze)
 
+        # 创建 Alt+3 快捷键（预设区域截图）
+        self.region_shortcut = QShortcut(QKeySequence("Alt+3"), self)
+        self.region_shortcut.activated.connect(self.capture_preset_region)
+
+        # 创建 Alt+4 快捷键（回溯截图）
+        self.retro_shortcut = QShortcut(QKeySequence("Alt+4"), self)
+        self.retro_shortcut.activated.connect(self.capture_retro_frame)
+
     def create_top_toolbar(self):
         """创建顶部工具栏"""
         self.top_toolbar = QWidget()
@@ -1209,6 +1665,65 @@ class MainWindow(QMainWindow):
         self.screenshot_button.clicked.connect(self.start_smart_screenshot)
         screenshot_layout.addWidget(self.screenshot_button)
 
+        # 预设区域截图按钮（无遮罩，直接裁剪预设区域）
+        self.region_capture_button = QPushButton("📐")
+        self.region_capture_button.setFixedSize(40, 30)
+        self.region_capture_button.setStyleSheet(self.screenshot_button.styleSheet())
+        self.region_capture_button.setToolTip("预设区域截图 (Alt+3)")
+        self.region_capture_button.clicked.connect(self.capture_preset_region)
+        screenshot_layout.addWidget(self.region_capture_button)
+
+        # 截图目标选择（主屏幕 / 鼠标所在屏幕 / 全部屏幕 / 指定窗口）
+        self.capture_target_combo = QComboBox()
+        self.capture_target_combo.setObjectName("capture_target_combo")
+        self.capture_target_combo.addItems(CAPTURE_TARGETS)
+        self.capture_target_combo.activated.connect(self.on_capture_target_changed)
+        screenshot_layout.addWidget(self.capture_target_combo)
+
+        # 预设区域选择
+        self.capture_region_combo = QComboBox()
+        self.capture_region_combo.setObjectName("capture_region_combo")
+        self.capture_region_combo.setToolTip("Alt+3 使用的截图区域")
+        self.capture_region_combo.setMinimumWidth(130)
+        self.capture_region_combo.activated.connect(self.on_capture_region_changed)
+        screenshot_layout.addWidget(self.capture_region_combo)
+
+        # 将最近一次框选保存为预设区域
+        self.save_region_button = QPushButton("保存区域")
+        self.save_region_button.setObjectName("save_region_button")
+        self.save_region_button.setToolTip("将最近一次 Alt+1 框选的区域保存为预设")
+        self.save_region_button.clicked.connect(self.save_last_capture_region)
+        screenshot_layout.addWidget(self.save_region_button)
+
+        # 监视模式开关：画面变化后自动识别
+        self.watch_toggle_button = QPushButton("👁")
+        self.watch_toggle_button.setCheckable(True)
+        self.watch_toggle_button.setFixedSize(40, 30)
+        self.watch_toggle_button.setStyleSheet("""
+            QPushButton {
+                font-size: 16px;
+                border: 2px solid #666666;
+                border-radius: 6px;
+                background-color: #4a4a4a;
+            }
+            QPushButton:checked {
+                background-color: #2196F3;
+                border-color: #2196F3;
+            }
+        """)
+        self.watch_toggle_button.setToolTip("监视模式：画面（或当前预设区域）内容变化并稳定后自动识别，结果追加到截图识别结果")
+        self.watch_toggle_button.clicked.connect(self.toggle_watch_mode)
+        screenshot_layout.addWidget(self.watch_toggle_button)
+
+        # 回溯缓冲开关：后台保留最近几秒的画面，Alt+4 截取数秒前的画面
+        self.retro_toggle_button = QPushButton("⏪")
+        self.retro_toggle_button.setCheckable(True)
+        self.retro_toggle_button.setFixedSize(40, 30)
+        self.retro_toggle_button.setStyleSheet(self.watch_toggle_button.styleSheet())
+        self.retro_toggle_button.setToolTip("回溯缓冲：后台保留最近几秒的画面，按 Alt+4 截取数秒前的画面")
+        self.retro_toggle_button.clicked.connect(self.toggle_retro_buffer)
+        screenshot_layout.addWidget(self.retro_toggle_button)
+
         toolbar_layout.addWidget(screenshot_widget)
 
         # 截图和语音功能之间的间距
@@ -1275,6 +1790,12 @@ class MainWindow(QMainWindow):
         self.ocr_status_label.setStyleSheet("color: #888888; margin-left: 10px; margin-top: 10px;")
         ocr_header_layout.addWidget(self.ocr_status_label)
 
+        # 监视模式状态标签
+        self.watch_status_label = QLabel("")
+        self.watch_status_label.setFont(QFont("Microsoft YaHei", 9))
+        self.watch_status_label.setStyleSheet("color: #2196F3; margin-left: 10px; margin-top: 10px;")
+        ocr_header_layout.addWidget(self.watch_status_label)
+
         ocr_header_layout.addStretch()
         layout.addLayout(ocr_header_layout)
 
@@ -1363,10 +1884,26 @@ class MainWindow(QMainWindow):
         title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(title_label)
 
+        transcript_layout = QHBoxLayout()
         transcript_label = QLabel("🎙️ 语音转录原文")
         transcript_label.setFont(QFont("Microsoft YaHei", 10, QFont.Weight.Bold))
         transcript_label.setStyleSheet("color: #FF9800; margin-top: 10px;")
-        layout.addWidget(transcript_label)
+        transcript_layout.addWidget(transcript_label)
+        transcript_layout.addStretch()
+
+        self.rumor_capture_status_label = QLabel("")
+        self.rumor_capture_status_label.setFont(QFont("Microsoft YaHei", 9))
+        self.rumor_capture_status_label.setStyleSheet("color: #888888; margin-right: 10px;")
+        transcript_layout.addWidget(self.rumor_capture_status_label)
+
+        self.rumor_capture_button = QPushButton("🎙️ 持续收录")
+        self.rumor_capture_button.setObjectName("rumor_capture_button")
+        self.rumor_capture_button.setCheckable(True)
+        self.rumor_capture_button.setToolTip("保持录音，按说话停顿自动分段识别，并带时间戳追加到下方原文\n"
+                                             "录制游戏声音可在 config.json 中设置 rumor_capture_device_index（如立体声混音设备）")
+        self.rumor_capture_button.clicked.connect(self.toggle_rumor_capture)
+        transcript_layout.addWidget(self.rumor_capture_button)
+        layout.addLayout(transcript_layout)
 
         self.rumor_transcript_text = QTextEdit()
         self.rumor_transcript_text.setObjectName("rumor_transcript_text")
@@ -1527,10 +2064,21 @@ class MainWindow(QMainWindow):
         self.include_rumors_checkbox.setFont(QFont("Microsoft YaHei", 9))
         self.include_rumors_checkbox.setStyleSheet("color: #FF9800; margin-top: 10px;")
 
+        # 智能检索模式复选框
+        self.smart_context_checkbox = QCheckBox("智能检索上下文")
+        self.smart_context_checkbox.setFont(QFont("Microsoft YaHei", 9))
+        self.smart_context_checkbox.setStyleSheet("color: #2196F3; margin-top: 10px;")
+        self.smart_context_checkbox.setToolTip(
+            "按与画面分析和补充说明的相关度，从所有角色档案（及勾选时的风闻记录）中挑选片段，\n"
+            "填满 token 预算（config.json 中的 decision_context_tokens，默认 6000）；所选相关人的档案优先")
+        self.smart_context_checkbox.stateChanged.connect(self.on_smart_context_toggled)
+
         checkbox_row = QHBoxLayout()
         checkbox_row.addWidget(self.include_all_chars_checkbox)
         checkbox_row.addSpacing(20)
         checkbox_row.addWidget(self.include_rumors_checkbox)
+        checkbox_row.addSpacing(20)
+        checkbox_row.addWidget(self.smart_context_checkbox)
         checkbox_row.addStretch()
         layout.addLayout(checkbox_row)
 
@@ -1605,6 +2153,16 @@ class MainWindow(QMainWindow):
             self.related_person2_combo.setEnabled(True)
             self.related_person3_combo.setEnabled(True)
 
+    def on_smart_context_toggled(self, state):
+        """智能检索会在所有档案中挑选，与"参考所有角色档案"互斥"""
+        if state == Qt.CheckState.Checked.value:
+            self.include_all_chars_checkbox.setChecked(False)
+            self.include_all_chars_checkbox.setEnabled(False)
+            # 首次启用时在后台建立检索索引
+            self.start_context_indexing()
+        else:
+            self.include_all_chars_checkbox.setEnabled(True)
+
     def get_decision_advice(self):
         """获取抉择建议的核心方法"""
         try:
@@ -1632,18 +2190,25 @@ class MainWindow(QMainWindow):
             # 第二步：档案读取
             character_profiles = {}
 
-            # 读取提问者档案
-            questioner_file = os.path.join(self.characters_dir, f"{questioner}.md")
-            if os.path.exists(questioner_file):
-                with open(questioner_file, 'r', encoding='utf-8') as f:
-                    character_profiles[questioner] = f.read()
-            else:
-                character_profiles[questioner] = "档案内容为空"
+            # 读取提问者档案（从档案仓库的内存缓存中取）
+            questioner_profile = self.dossier_repository.read_character(questioner)
+            character_profiles[questioner] = questioner_profile if questioner_profile is not None else "档案内容为空"
 
             # 读取相关人档案
             related_characters = []
-
-            if self.include_all_chars_checkbox.isChecked():
+            hand_picked = [person for person in (related1, related2, related3)
+                           if person and person != "无" and person != self.NO_CHARACTER_NOTICE]
+
+            use_smart_context = self.smart_context_checkbox.isChecked() and self.context_index_ready
+            if self.smart_context_checkbox.isChecked() and not use_smart_context:
+                print("智能检索索引尚未建好，本次按手动选择的相关人读取档案")
+                self.start_context_indexing()
+
+            if use_smart_context:
+                # 智能检索模式：按相关度挑选档案片段和风闻记录，手动选择的相关人必定入选
+                related_characters, rumor_content = self.retrieve_decision_context(
+                    f"{game_analysis}\n{supplement}", questioner, hand_picked, character_profiles)
+            elif self.include_all_chars_checkbox.isChecked():
                 # 全局分析模式：获取所有角色档案
                 related_characters = self.get_all_character_names()
                 # 从列表中移除提问者（避免重复）
@@ -1651,31 +2216,22 @@ class MainWindow(QMainWindow):
                     related_characters.remove(questioner)
             else:
                 # 普通模式：只读取指定的相关人
-                for related_person in [related1, related2, related3]:
-                    if related_person and related_person != "无" and related_person != self.NO_CHARACTER_NOTICE:
-                        related_characters.append(related_person)
-
-            # 读取相关角色的档案内容
-            for related_person in related_characters:
-                related_file = os.path.join(self.characters_dir, f"{related_person}.md")
-                if os.path.exists(related_file):
-                    with open(related_file, 'r', encoding='utf-8') as f:
-                        character_profiles[related_person] = f.read()
-                else:
-                    character_profiles[related_person] = "档案内容为空"
+                related_characters = hand_picked
 
-            # 第三步：Prompt构建
-            rumor_content = ""
-            if hasattr(self, 'include_rumors_checkbox') and self.include_rumors_checkbox.isChecked():
-                if os.path.exists(self.RUMOR_LOG_FILE):
+            if not use_smart_context:
+                # 读取相关角色的档案内容
+                for related_person in related_characters:
+                    related_profile = self.dossier_repository.read_character(related_person)
+                    character_profiles[related_person] = related_profile if related_profile is not None else "档案内容为空"
+
+                rumor_content = ""
+                if hasattr(self, 'include_rumors_checkbox') and self.include_rumors_checkbox.isChecked():
                     try:
-                        with open(self.RUMOR_LOG_FILE, 'r', encoding='utf-8') as rumor_file:
-                            rumor_content = rumor_file.read().strip()
+                        rumor_content = self.select_rumor_entries([questioner] + related_characters)
                     except Exception as read_error:
                         rumor_content = f"（读取风闻记录失败：{read_error}）"
-                else:
-                    rumor_content = "（暂无风闻记录）"
 
+            # 第三步：Prompt构建
             messages = self.build_decision_prompt(
                 game_analysis, supplement, questioner,
                 related_characters, character_profiles, rumor_content
@@ -1733,6 +2289,108 @@ class MainWindow(QMainWindow):
             self.get_advice_button.setText("🚀 获取抉择建议")
             self.get_advice_button.setEnabled(True)
 
+    def retrieve_decision_context(self, query: str, questioner: str, hand_picked: list,
+                                  character_profiles: dict) -> tuple:
+        """
+        智能检索：按相关度和记录时间从其他角色的档案与风闻记录中挑选片段，直到用完 token 预算
+
+        提问者的完整档案已单独放入，不参与检索；手动选择的相关人至少放入其基本信息章节（计入预算），
+        其余预算按得分挑选。选中的片段按角色分组写入 character_profiles，组内和风闻记录都按原文顺序排列。
+
+        Returns:
+            tuple: (有片段入选的相关角色列表, 风闻记录内容)
+        """
+        start_time = time.perf_counter()
+        # 索引已在后台建好，这里只增量更新变化的档案
+        added = self.context_retriever.sync(self.dossier_repository)
+        include_rumors = self.include_rumors_checkbox.isChecked()
+        budget = int(self.api_config.get("decision_context_tokens", 6000))
+
+        chunks, used_tokens = self.context_retriever.select(
+            query, budget,
+            required_names=tuple(name for name in hand_picked if name != questioner),
+            boost_names=tuple(hand_picked),
+            exclude_names=(questioner,),
+            include_rumors=include_rumors,
+            recency_weight=float(self.api_config.get("retrieval_recency_weight", 0.3)),
+            half_life_days=float(self.api_config.get("retrieval_half_life_days", 7))
+        )
+
+        related_characters = []
+        grouped = {}
+        rumor_chunks = []
+        for chunk in chunks:
+            if chunk["kind"] == DOCUMENT_RUMOR:
+                rumor_chunks.append(chunk)
+                continue
+            if chunk["name"] not in grouped:
+                related_characters.append(chunk["name"])
+            grouped.setdefault(chunk["name"], []).append(chunk)
+        for name, name_chunks in grouped.items():
+            character_profiles[name] = "\n\n".join(chunk["text"] for chunk in sorted(name_chunks, key=lambda c: c["order"]))
+
+        rumor_content = ""
+        if include_rumors:
+            rumor_content = "\n\n".join(chunk["text"] for chunk in sorted(rumor_chunks, key=lambda c: c["order"]))
+            rumor_content = rumor_content or "（未检索到与当前局面相关的风闻记录）"
+
+        print(f"智能检索: 选入 {len(chunks)} 个片段（{len(related_characters)} 个角色，风闻 {len(rumor_chunks)} 条），"
+              f"约 {used_tokens}/{budget} tokens，新索引 {added} 个片段，耗时 {(time.perf_counter() - start_time) * 1000:.0f} ms")
+        return related_characters, rumor_content
+
+    def start_context_indexing(self):
+        """在后台线程中为所有档案和风闻记录建立检索索引（已建好或正在建立时不重复）"""
+        if self.context_index_ready or self.context_index_worker is not None:
+            return
+        try:
+            documents = read_documents(self.dossier_repository)
+        except Exception as e:
+            print(f"读取档案失败，无法建立检索索引: {str(e)}")
+            return
+        self.context_index_worker = ContextIndexWorker(
+            documents, self.api_config.get("retrieval_embedding_model", ""))
+        self.context_index_worker.index_ready.connect(self.on_context_index_ready)
+        self.context_index_worker.start()
+
+    def on_context_index_ready(self, retriever, chunk_count: int, elapsed_seconds: float):
+        """后台索引建好：替换检索引擎，并补上建索引期间追加或修改的档案"""
+        self.context_index_worker.wait()
+        self.context_index_worker = None
+        if retriever is None:
+            return
+        self.context_retriever = retriever
+        self.context_index_ready = True
+        updated = self.context_retriever.sync(self.dossier_repository)
+        print(f"智能检索索引已建立: {chunk_count} 个片段，后台耗时 {elapsed_seconds:.1f} 秒"
+              f"（期间变化的片段 {updated} 个）")
+
+    def select_rumor_entries(self, character_names: list) -> str:
+        """
+        从风闻记录中挑选与提问者及相关人有关的条目和最近的几条，代替整份风闻记录放入Prompt
+
+        条目按【参与人员】索引（没有该部分的旧记录按正文是否提到角色判断），
+        数量由 config.json 中的 decision_rumor_max_entries（默认 20）和 decision_rumor_recent（默认 3）控制。
+        """
+        rumor_text = self.dossier_repository.read_rumors()
+        if rumor_text is None or not rumor_text.strip():
+            return "（暂无风闻记录）"
+
+        rumor_index = self.dossier_repository.rumor_index()
+        if not rumor_index.entries:
+            # 没有"## 记录时间:"条目的手写记录无法拆分，整份放入
+            return rumor_text.strip()
+
+        selected, related_count = rumor_index.select(
+            character_names,
+            recent=int(self.api_config.get("decision_rumor_recent", 3)),
+            max_related=int(self.api_config.get("decision_rumor_max_entries", 20))
+        )
+        selected_text = "\n\n".join(raw.strip() for _, _, raw in selected)
+        print(f"风闻记录: 共 {len(rumor_index.entries)} 条，选入 {len(selected)} 条"
+              f"（相关 {related_count} 条），{len(rumor_text)} 字 → {len(selected_text)} 字")
+        return (f"（共 {len(rumor_index.entries)} 条风闻记录，以下按时间顺序列出与提问者及相关人有关的 "
+                f"{related_count} 条和最近的记录）\n\n{selected_text}")
+
     def build_decision_prompt(self, game_analysis, supplement, questioner, related_characters, character_profiles, rumor_content):
         """构建游戏抉择建议的Prompt消息列表（最终战略版）"""
 
@@ -1900,12 +2558,66 @@ class MainWindow(QMainWindow):
 
         layout.addLayout(top_layout)
 
-        # 档案内容编辑区域
-        self.dossier_text_edit = QTextEdit()
+        # 全文搜索：搜索所有角色档案与风闻记录，双击结果跳转到对应条目
+        search_layout = QHBoxLayout()
+        self.dossier_search_edit = QLineEdit()
+        self.dossier_search_edit.setObjectName("dossier_search_edit")
+        self.dossier_search_edit.setPlaceholderText("搜索角色档案与风闻记录（多个关键字用空格分隔，回车搜索）")
+        self.dossier_search_edit.returnPressed.connect(self.search_dossiers)
+        search_layout.addWidget(self.dossier_search_edit)
+
+        self.dossier_search_button = QPushButton("搜索")
+        self.dossier_search_button.setObjectName("dossier_search_button")
+        self.dossier_search_button.clicked.connect(self.search_dossiers)
+        search_layout.addWidget(self.dossier_search_button)
+
+        self.dossier_search_status_label = QLabel("")
+        self.dossier_search_status_label.setStyleSheet("color: #888888; margin-left: 10px;")
+        search_layout.addWidget(self.dossier_search_status_label)
+
+        # SQLite 存储时可与 Markdown 文件双向同步
+        if isinstance(self.dossier_repository, SQLiteDossierRepository):
+            self.import_markdown_button = QPushButton("从Markdown导入")
+            self.import_markdown_button.setObjectName("import_markdown_button")
+            self.import_markdown_button.setToolTip("用 characters 文件夹和风闻记录文件覆盖数据库中的同名档案")
+            self.import_markdown_button.clicked.connect(self.import_markdown_dossiers)
+            search_layout.addWidget(self.import_markdown_button)
+
+            self.export_markdown_button = QPushButton("导出为Markdown")
+            self.export_markdown_button.setObjectName("export_markdown_button")
+            self.export_markdown_button.setToolTip("把数据库中的档案写回 characters 文件夹和风闻记录文件")
+            self.export_markdown_button.clicked.connect(self.export_markdown_dossiers)
+            search_layout.addWidget(self.export_markdown_button)
+
+        layout.addLayout(search_layout)
+
+        self.dossier_search_results = QListWidget()
+        self.dossier_search_results.setObjectName("dossier_search_results")
+        self.dossier_search_results.setMaximumHeight(160)
+        self.dossier_search_results.itemActivated.connect(self.open_dossier_search_result)
+        self.dossier_search_results.hide()
+        layout.addWidget(self.dossier_search_results)
+
+        # 档案内容编辑区域（纯文本，按页加载：先显示最近的记录，滚动到顶部时加载更早的记录）
+        self.dossier_text_edit = PagedDossierView(int(self.api_config.get("dossier_page_entries", 50)))
         self.dossier_text_edit.setObjectName("dossier_text_edit")
         self.dossier_text_edit.setPlaceholderText("请选择一个角色查看档案内容，或创建新角色...")
+        self.dossier_text_edit.page_loaded.connect(self.on_dossier_page_loaded)
         layout.addWidget(self.dossier_text_edit)
 
+        page_layout = QHBoxLayout()
+        self.dossier_page_label = QLabel("")
+        self.dossier_page_label.setStyleSheet("color: #888888;")
+        page_layout.addWidget(self.dossier_page_label)
+        page_layout.addStretch()
+
+        self.load_earlier_button = QPushButton("加载更早的记录")
+        self.load_earlier_button.setObjectName("load_earlier_button")
+        self.load_earlier_button.clicked.connect(self.dossier_text_edit.load_previous_page)
+        self.load_earlier_button.hide()
+        page_layout.addWidget(self.load_earlier_button)
+        layout.addLayout(page_layout)
+
         # 保存按钮
         self.save_dossier_button = QPushButton("保存当前修改")
         self.save_dossier_button.setObjectName("save_dossier_button")
@@ -1919,18 +2631,16 @@ class MainWindow(QMainWindow):
         """在角色档案与风闻记录视图之间切换"""
         try:
             if not self.is_viewing_rumors:
-                if os.path.exists(self.RUMOR_LOG_FILE):
-                    try:
-                        with open(self.RUMOR_LOG_FILE, 'r', encoding='utf-8') as rumor_file:
-                            rumor_text = rumor_file.read().strip()
-                        rumor_text = rumor_text if rumor_text else "（风闻记录目前为空）"
-                    except Exception as read_error:
-                        rumor_text = f"读取风闻记录失败：{read_error}"
-                else:
-                    rumor_text = "（尚未创建风闻记录文件）"
-
-                self.dossier_text_edit.setPlainText(rumor_text)
-                self.dossier_text_edit.setReadOnly(True)
+                try:
+                    rumor_text = self.dossier_repository.read_rumors()
+                    if rumor_text is None:
+                        rumor_text = "（尚未创建风闻记录文件）"
+                    else:
+                        rumor_text = rumor_text.strip() or "（风闻记录目前为空）"
+                except Exception as read_error:
+                    rumor_text = f"读取风闻记录失败：{read_error}"
+
+                self.dossier_text_edit.set_document(rumor_text, read_only=True)
                 self.character_combo.setEnabled(False)
                 self.create_character_button.setEnabled(False)
                 self.save_dossier_button.setEnabled(False)
@@ -1949,6 +2659,99 @@ class MainWindow(QMainWindow):
         except Exception as toggle_error:
             self.show_message("风闻记录", f"切换风闻视图时出现问题：\n{toggle_error}", "warning")
 
+    def search_dossiers(self):
+        """全文搜索角色档案与风闻记录，结果列在搜索框下方"""
+        query = self.dossier_search_edit.text().strip()
+        self.dossier_search_results.clear()
+        if not query:
+            self.dossier_search_results.hide()
+            self.dossier_search_status_label.setText("")
+            return
+
+        try:
+            start_time = time.perf_counter()
+            results = self.dossier_repository.search(query)
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+        except Exception as e:
+            print(f"搜索档案失败: {str(e)}")
+            self.dossier_search_results.hide()
+            self.dossier_search_status_label.setText("❌ 搜索失败")
+            self.dossier_search_status_label.setStyleSheet("color: #F44336; margin-left: 10px;")
+            QTimer.singleShot(3000, lambda: self.dossier_search_status_label.setText(""))
+            return
+
+        for result in results:
+            location = result["timestamp"] or result["section"] or "开头"
+            item = QListWidgetItem(f"{result['name']} · {location}    {result['snippet']}")
+            item.setData(Qt.ItemDataRole.UserRole, result)
+            self.dossier_search_results.addItem(item)
+        self.dossier_search_results.setVisible(bool(results))
+
+        if results:
+            self.dossier_search_status_label.setText(f"找到 {len(results)} 条（{elapsed_ms:.0f} ms），双击跳转")
+        else:
+            self.dossier_search_status_label.setText("未找到匹配的条目")
+        self.dossier_search_status_label.setStyleSheet("color: #888888; margin-left: 10px;")
+
+    def open_dossier_search_result(self, item):
+        """打开搜索结果所在的档案（或风闻记录）并定位到对应条目"""
+        result = item.data(Qt.ItemDataRole.UserRole)
+        if result["kind"] == DOCUMENT_RUMOR:
+            if not self.is_viewing_rumors:
+                self.toggle_rumor_view()
+        else:
+            if self.is_viewing_rumors:
+                self.toggle_rumor_view()
+            self.character_combo.setCurrentText(result["name"])
+
+        # 有记录时间时查找条目标题，否则查找章节标题或第一个关键字
+        if result["timestamp"]:
+            anchor = f"{ENTRY_HEADER_PREFIX} {result['timestamp']}"
+        elif result["section"]:
+            anchor = f"## {result['section']}"
+        else:
+            anchor = self.dossier_search_edit.text().split()[0]
+        self.dossier_text_edit.reveal(anchor)
+        self.dossier_text_edit.setFocus()
+
+    def on_dossier_page_loaded(self, loaded_count: int, total_count: int):
+        """档案视图加载了新的一页，更新底部的加载进度"""
+        if loaded_count < total_count:
+            self.dossier_page_label.setText(
+                f"已显示最近 {loaded_count} / {total_count} 条记录，滚动到顶部或点击右侧按钮加载更早的记录")
+        else:
+            self.dossier_page_label.setText("")
+        self.load_earlier_button.setVisible(loaded_count < total_count)
+
+    def import_markdown_dossiers(self):
+        """从 Markdown 档案文件导入到 SQLite 数据库"""
+        if not self.show_message("确认导入", "将用 characters 文件夹和风闻记录文件覆盖数据库中的同名档案，是否继续？", "question"):
+            return
+        try:
+            count = self.dossier_repository.import_markdown()
+        except Exception as e:
+            self.show_message("导入失败", f"导入Markdown档案时出错: {str(e)}", "critical")
+            return
+
+        self.load_character_list()
+        self.dossier_search_status_label.setText(f"✅ 已导入 {count} 个文件")
+        self.dossier_search_status_label.setStyleSheet("color: #4CAF50; margin-left: 10px;")
+        QTimer.singleShot(4000, lambda: self.dossier_search_status_label.setText(""))
+
+    def export_markdown_dossiers(self):
+        """把 SQLite 数据库中的档案导出为 Markdown 文件"""
+        if not self.show_message("确认导出", "将覆盖 characters 文件夹中的同名档案和风闻记录文件，是否继续？", "question"):
+            return
+        try:
+            count = self.dossier_repository.export_markdown()
+        except Exception as e:
+            self.show_message("导出失败", f"导出Markdown档案时出错: {str(e)}", "critical")
+            return
+
+        self.dossier_search_status_label.setText(f"✅ 已导出 {count} 个文件")
+        self.dossier_search_status_label.setStyleSheet("color: #4CAF50; margin-left: 10px;")
+        QTimer.singleShot(4000, lambda: self.dossier_search_status_label.setText(""))
+
     def create_api_settings_tab(self):
         """创建API设置标签页"""
         api_widget = QWidget()
@@ -2035,11 +2838,15 @@ class MainWindow(QMainWindow):
         stt_title.setStyleSheet("color: #9C27B0; margin-top: 20px;")
         form_layout.addWidget(stt_title, 10, 0, 1, 3)
 
-        # 提供商说明
+        # 语音识别提供商选择（本地服务可离线使用，省去网络往返）
         form_layout.addWidget(QLabel("提供商:"), 11, 0)
-        stt_provider_label = QLabel("硅基流动 (固定)")
-        stt_provider_label.setStyleSheet("color: #666666; font-size: 10px;")
-        form_layout.addWidget(stt_provider_label, 11, 1, 1, 2)
+        self.stt_provider_combo = QComboBox()
+        self.stt_provider_combo.setObjectName("stt_provider_combo")
+        self.stt_provider_combo.addItems(list(STT_PROVIDERS.keys()))
+        self.stt_provider_combo.setToolTip("本地服务需兼容 OpenAI 的 /v1/audio/transcriptions 接口，"
+                                           "如 faster-whisper-server、LocalAI")
+        self.stt_provider_combo.currentTextChanged.connect(self.on_stt_provider_changed)
+        form_layout.addWidget(self.stt_provider_combo, 11, 1, 1, 2)
 
         # API Key输入
         form_layout.addWidget(QLabel("API Key:"), 12, 0)
@@ -2049,11 +2856,83 @@ class MainWindow(QMainWindow):
         self.stt_api_key_edit.setPlaceholderText("请输入硅基流动API Key...")
         form_layout.addWidget(self.stt_api_key_edit, 12, 1, 1, 2)
 
+        form_layout.addWidget(QLabel("API端点:"), 13, 0)
+        self.stt_endpoint_edit = QLineEdit()
+        self.stt_endpoint_edit.setObjectName("stt_endpoint_edit")
+        self.stt_endpoint_edit.setPlaceholderText("语音识别API端点，例如 http://127.0.0.1:8000/v1/audio/transcriptions")
+        form_layout.addWidget(self.stt_endpoint_edit, 13, 1, 1, 2)
+
+        form_layout.addWidget(QLabel("模型名称:"), 14, 0)
+        self.stt_model_edit = QLineEdit()
+        self.stt_model_edit.setObjectName("stt_model_edit")
+        self.stt_model_edit.setPlaceholderText("语音识别模型名称...")
+        form_layout.addWidget(self.stt_model_edit, 14, 1, 1, 2)
+
         # 注册链接
-        stt_link_label = QLabel('<a href="https://cloud.siliconflow.cn/i/My0p5Jgs" style="color: #2196F3;">点击注册硅基流动账号</a>')
-        stt_link_label.setOpenExternalLinks(True)
-        stt_link_label.setStyleSheet("margin-bottom: 10px;")
-        form_layout.addWidget(stt_link_label, 13, 1, 1, 2)
+        self.stt_link_label = QLabel('<a href="https://cloud.siliconflow.cn/i/My0p5Jgs" style="color: #2196F3;">点击注册硅基流动账号</a>')
+        self.stt_link_label.setOpenExternalLinks(True)
+        self.stt_link_label.setStyleSheet("margin-bottom: 10px;")
+        form_layout.addWidget(self.stt_link_label, 15, 1, 1, 2)
+
+        # 上传格式：压缩后上传可显著减小长录音的体积
+        form_layout.addWidget(QLabel("上传格式:"), 16, 0)
+        self.stt_audio_format_combo = QComboBox()
+        self.stt_audio_format_combo.setObjectName("stt_audio_format_combo")
+        for audio_format in AUDIO_FORMATS:
+            self.stt_audio_format_combo.addItem(audio_format)
+            if not is_audio_format_available(audio_format):
+                index = self.stt_audio_format_combo.count() - 1
+                self.stt_audio_format_combo.setItemData(index, "需要安装 soundfile：pip install soundfile",
+                                                        Qt.ItemDataRole.ToolTipRole)
+        self.stt_audio_format_combo.setToolTip("FLAC 无损，体积约为 WAV 的一半；Opus 针对语音有损压缩，体积约为 WAV 的 1/10，但编码更耗CPU\n"
+                                               "所选格式不可用时自动回退到 WAV")
+        form_layout.addWidget(self.stt_audio_format_combo, 16, 1)
+
+        # 边录边识别开关
+        self.stt_streaming_checkbox = QCheckBox("边录边识别（按停顿分段并发识别）")
+        self.stt_streaming_checkbox.setObjectName("stt_streaming_checkbox")
+        self.stt_streaming_checkbox.setToolTip("长时间录音时，停止录音后几乎立即得到完整结果；各段文字按顺序插入")
+        form_layout.addWidget(self.stt_streaming_checkbox, 16, 2)
+
+        # 截图文字识别引擎配置区域
+        ocr_title = QLabel("截图文字识别引擎 (用于速记台)")
+        ocr_title.setFont(QFont("Microsoft YaHei", 12, QFont.Weight.Bold))
+        ocr_title.setStyleSheet("color: #FF9800; margin-top: 20px;")
+        form_layout.addWidget(ocr_title, 17, 0, 1, 3)
+
+        form_layout.addWidget(QLabel("识别引擎:"), 18, 0)
+        self.ocr_backend_combo = QComboBox()
+        self.ocr_backend_combo.setObjectName("ocr_backend_combo")
+        self.ocr_backend_combo.addItems(OCR_BACKENDS)
+        self.ocr_backend_combo.setToolTip("自动模式先用本地OCR，置信度不足时回退到云端多模态模型")
+        form_layout.addWidget(self.ocr_backend_combo, 18, 1, 1, 2)
+
+        form_layout.addWidget(QLabel("本地语言包:"), 19, 0)
+        self.local_ocr_lang_edit = QLineEdit()
+        self.local_ocr_lang_edit.setObjectName("local_ocr_lang_edit")
+        self.local_ocr_lang_edit.setPlaceholderText("chi_sim （可用 + 组合，如 chi_sim+eng）")
+        form_layout.addWidget(self.local_ocr_lang_edit, 19, 1, 1, 2)
+
+        form_layout.addWidget(QLabel("回退置信度:"), 20, 0)
+        self.local_ocr_confidence_edit = QLineEdit()
+        self.local_ocr_confidence_edit.setObjectName("local_ocr_confidence_edit")
+        self.local_ocr_confidence_edit.setPlaceholderText("70 （自动模式下低于该值改用云端模型，范围 0-100）")
+        form_layout.addWidget(self.local_ocr_confidence_edit, 20, 1, 1, 2)
+
+        form_layout.addWidget(QLabel("Tesseract路径:"), 21, 0)
+        self.tesseract_cmd_edit = QLineEdit()
+        self.tesseract_cmd_edit.setObjectName("tesseract_cmd_edit")
+        self.tesseract_cmd_edit.setPlaceholderText("留空则使用系统PATH，例如 C:\\Program Files\\Tesseract-OCR\\tesseract.exe")
+        form_layout.addWidget(self.tesseract_cmd_edit, 21, 1, 1, 2)
+
+        self.ocr_preprocess_label = QLabel("截图预处理:")
+        form_layout.addWidget(self.ocr_preprocess_label, 22, 0)
+        self.ocr_preprocess_combo = QComboBox()
+        self.ocr_preprocess_combo.setObjectName("ocr_preprocess_combo")
+        self.ocr_preprocess_combo.addItems(list(PREPROCESS_PRESETS.keys()))
+        self.ocr_preprocess_combo.setToolTip("识别前对截图做灰度、对比度拉伸、二值化或锐化处理，按游戏分别保存\n"
+                                             "（截图目标为「指定窗口」时按窗口关键字区分游戏）")
+        form_layout.addWidget(self.ocr_preprocess_combo, 22, 1, 1, 2)
 
         layout.addLayout(form_layout)
 
@@ -2062,7 +2941,9 @@ class MainWindow(QMainWindow):
 配置说明：
 • 多模态模型：用于处理截图识别和游戏画面分析
 • 对话模型：用于内容整合润色和游戏抉择建议
-• 语音识别：用于语音转文字输入功能
+• 语音识别：用于语音转文字输入功能；选择「本地 (OpenAI兼容)」可连接本机的 Whisper 服务离线识别
+• 截图文字识别引擎：本地OCR需要安装 pytesseract 与 Tesseract-OCR（含 chi_sim 语言包），不产生API费用
+• 截图预处理：复杂背景上的文字可选择二值化预设；预处理后为黑白图像，云端模型的画面描述会相应简化
 • 可以分别选择不同的提供商，也可以使用同一个
 • 所有字段都可以手动编辑和调整""")
         help_text.setStyleSheet("color: #888888; margin: 10px; padding: 10px; background-color: #3c3c3c; border-radius: 5px;")
@@ -2094,6 +2975,13 @@ class MainWindow(QMainWindow):
         self.test_stt_button.clicked.connect(self.test_stt_connection)
         button_layout.addWidget(self.test_stt_button)
 
+        # 语音识别延迟对比按钮
+        self.compare_stt_button = QPushButton("对比识别延迟")
+        self.compare_stt_button.setObjectName("compare_stt_button")
+        self.compare_stt_button.setToolTip("用同一段合成音频依次请求已配置的各个语音识别提供商，对比端到端耗时")
+        self.compare_stt_button.clicked.connect(self.compare_stt_latency)
+        button_layout.addWidget(self.compare_stt_button)
+
         # 保存配置按钮
         self.save_config_button = QPushButton("保存配置")
         self.save_config_button.setObjectName("save_config_button")
@@ -2118,10 +3006,30 @@ class MainWindow(QMainWindow):
         self.multimodal_provider_combo.setCurrentText(multimodal_provider)
         self.chat_provider_combo.setCurrentText(chat_provider)
 
+        # 加载截图目标与预设区域
+        capture_target = self.api_config.get("capture_target", CAPTURE_TARGET_PRIMARY)
+        self.capture_target_combo.setCurrentText(capture_target)
+        if capture_target == CAPTURE_TARGET_WINDOW:
+            self.capture_target_combo.setToolTip(f"截图目标：窗口「{self.api_config.get('capture_window_match', '')}」")
+        else:
+            self.capture_target_combo.setToolTip(f"截图目标：{capture_target}")
+        self.load_capture_regions_to_ui()
+
+        # 加载截图文字识别引擎配置
+        self.ocr_backend_combo.setCurrentText(self.api_config.get("ocr_backend", OCR_BACKEND_CLOUD))
+        self.local_ocr_lang_edit.setText(self.api_config.get("local_ocr_lang", "chi_sim"))
+        self.local_ocr_confidence_edit.setText(str(self.api_config.get("local_ocr_min_confidence", 70)))
+        self.tesseract_cmd_edit.setText(self.api_config.get("tesseract_cmd", ""))
+        self.refresh_preprocess_ui()
+
         # 加载语音识别API配置
-        if hasattr(self, 'stt_api_key_edit'):
-            stt_api_key = self.api_config.get("stt_siliconflow_api_key", "")
-            self.stt_api_key_edit.setText(stt_api_key)
+        stt_provider = self.api_config.get("stt_provider", STT_PROVIDER_SILICONFLOW)
+        self.stt_provider_combo.blockSignals(True)
+        self.stt_provider_combo.setCurrentText(stt_provider)
+        self.stt_provider_combo.blockSignals(False)
+        self.on_stt_provider_changed(stt_provider)
+        self.stt_streaming_checkbox.setChecked(self.api_config.get("stt_streaming", False))
+        self.stt_audio_format_combo.setCurrentText(self.api_config.get("stt_audio_format", AUDIO_FORMAT_WAV))
 
         # 触发配置加载（不会触发保存）
         self.on_multimodal_provider_changed(multimodal_provider)
@@ -2190,6 +3098,31 @@ class MainWindow(QMainWindow):
         self.chat_api_key_edit.setText(provider_config.get("chat_api_key", ""))
         self.chat_model_edit.setText(provider_config.get("chat_model", ""))
 
+    def on_stt_provider_changed(self, provider_name: str):
+        """当语音识别提供商改变时，加载对应配置"""
+        api_key, endpoint, model = get_stt_settings(self.api_config, provider_name)
+        self.stt_api_key_edit.setText(api_key)
+        self.stt_endpoint_edit.setText(endpoint)
+        self.stt_model_edit.setText(model)
+
+        is_siliconflow = provider_name == STT_PROVIDER_SILICONFLOW
+        self.stt_link_label.setVisible(is_siliconflow)
+        self.stt_api_key_edit.setPlaceholderText("请输入硅基流动API Key..." if is_siliconflow
+                                                 else "本地服务通常不需要，可留空")
+
+    def save_current_stt_config(self):
+        """保存当前语音识别配置到对应提供商"""
+        provider_name = self.stt_provider_combo.currentText()
+        api_key = self.stt_api_key_edit.text().strip()
+        if provider_name == STT_PROVIDER_SILICONFLOW:
+            self.api_config["stt_siliconflow_api_key"] = api_key
+            api_key = ""
+        self.api_config.setdefault("stt_providers", {})[provider_name] = {
+            "api_key": api_key,
+            "endpoint": self.stt_endpoint_edit.text().strip(),
+            "model": self.stt_model_edit.text().strip()
+        }
+
     def save_current_multimodal_config(self):
         """保存当前多模态配置到对应提供商"""
         if not hasattr(self, 'multimodal_provider_combo'):
@@ -2227,7 +3160,16 @@ class MainWindow(QMainWindow):
     def save_api_config(self):
         """保存API配置"""
         try:
-            # 先保存当前界面的配置
+            # 先校验输入，校验失败时不改动内存中的配置
+            try:
+                min_confidence = float(self.local_ocr_confidence_edit.text().strip() or 70)
+            except ValueError:
+                min_confidence = None
+            if min_confidence is None or not 0 <= min_confidence <= 100:
+                self.show_message("保存失败", "回退置信度必须是 0-100 之间的数字！", "warning")
+                return
+
+            # 保存当前界面的配置
             self.save_current_multimodal_config()
             self.save_current_chat_config()
 
@@ -2236,8 +3178,18 @@ class MainWindow(QMainWindow):
             self.api_config["chat_provider"] = self.chat_provider_combo.currentText()
 
             # 保存语音识别API配置
-            if hasattr(self, 'stt_api_key_edit'):
-                self.api_config["stt_siliconflow_api_key"] = self.stt_api_key_edit.text().strip()
+            self.save_current_stt_config()
+            self.api_config["stt_provider"] = self.stt_provider_combo.currentText()
+            self.api_config["stt_streaming"] = self.stt_streaming_checkbox.isChecked()
+            self.api_config["stt_audio_format"] = self.stt_audio_format_combo.currentText()
+
+            # 保存截图文字识别引擎配置
+            self.api_config["ocr_backend"] = self.ocr_backend_combo.currentText()
+            self.api_config["local_ocr_lang"] = self.local_ocr_lang_edit.text().strip() or "chi_sim"
+            self.api_config["local_ocr_min_confidence"] = min_confidence
+            self.api_config["tesseract_cmd"] = self.tesseract_cmd_edit.text().strip()
+            preprocess_presets = self.api_config.setdefault("ocr_preprocess_presets", {})
+            preprocess_presets[self.get_game_key()] = self.ocr_preprocess_combo.currentText()
 
             # 调用API服务保存配置
             if save_api_config(self.api_config):
@@ -2312,7 +3264,7 @@ class MainWindow(QMainWindow):
         QPushButton:pressed {
             background-color: #3a3a3a;
         }
-        QTextEdit {
+        QTextEdit, QPlainTextEdit {
             background-color: #2b2b2b;
             color: #ffffff;
             border: 1px solid #555555;
@@ -2357,10 +3309,9 @@ class MainWindow(QMainWindow):
         """加载角色列表"""
         self.character_combo.clear()
 
-        # 扫描 characters 文件夹下的所有 .md 文件
+        # 扫描 characters 文件夹下的所有 .md 文件（目录未变化时使用缓存的列表；SQLite 存储时从数据库读取）
         if os.path.exists(self.characters_dir):
-            md_files = [f for f in os.listdir(self.characters_dir) if f.endswith('.md')]
-            character_names = [os.path.splitext(f)[0] for f in md_files]
+            character_names = self.dossier_repository.character_names()
 
             if character_names:
                 self.character_combo.addItems(character_names)
@@ -2457,27 +3408,25 @@ class MainWindow(QMainWindow):
     def on_character_changed(self, character_name):
         """当角色选择改变时，加载对应的档案内容"""
         if character_name and character_name != self.NO_CHARACTER_NOTICE:
-            file_path = os.path.join(self.characters_dir, f"{character_name}.md")
-
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
-                        self.dossier_text_edit.setPlainText(content)
-                except Exception as e:
-                    self.dossier_text_edit.setPlainText(f"读取档案失败: {str(e)}")
-            else:
-                self.dossier_text_edit.setPlainText("档案文件不存在")
+            try:
+                content = self.dossier_repository.read_character(character_name)
+                self.dossier_text_edit.set_document(content if content is not None else "档案文件不存在")
+            except Exception as e:
+                self.dossier_text_edit.set_document(f"读取档案失败: {str(e)}")
         else:
-            self.dossier_text_edit.setPlainText("")
+            self.dossier_text_edit.set_document("")
 
-    def create_new_character(self, return_new_name=False):
-        """创建新角色"""
+    def prompt_text_input(self, title: str, label: str, text: str = ""):
+        """弹出文本输入对话框（浅色主题）
+
+        Returns:
+            tuple: (是否确认, 输入的文本)
+        """
         # 1. 创建QInputDialog实例
         dialog = QInputDialog(self)
-        dialog.setWindowTitle("创建新角色")
-        dialog.setLabelText("请输入新角色的名称:")
-        dialog.setTextValue("")  # 设置初始文本为空
+        dialog.setWindowTitle(title)
+        dialog.setLabelText(label)
+        dialog.setTextValue(text)
 
         # 2. 为该实例单独设置浅色主题样式
         dialog.setStyleSheet("""
@@ -2512,20 +3461,22 @@ class MainWindow(QMainWindow):
 
         # 3. 执行对话框并获取结果
         ok = dialog.exec()
-        character_name = dialog.textValue()
+        return bool(ok), dialog.textValue()
+
+    def create_new_character(self, return_new_name=False):
+        """创建新角色"""
+        ok, character_name = self.prompt_text_input("创建新角色", "请输入新角色的名称:")
 
-        # 4. 后续逻辑保持不变
         if ok and character_name.strip():
             character_name = character_name.strip()
-            file_path = os.path.join(self.characters_dir, f"{character_name}.md")
 
-            if os.path.exists(file_path):
+            if self.dossier_repository.has_character(character_name):
                 self.show_message("创建失败", f"角色 '{character_name}' 已存在！", "warning")
                 return None if return_new_name else None
 
             try:
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write(f"# {character_name}\n\n## 基本信息\n\n## 性格特点\n\n## 背景故事\n\n")
+                self.dossier_repository.write_character(
+                    character_name, f"# {character_name}\n\n## 基本信息\n\n## 性格特点\n\n## 背景故事\n\n")
 
                 self.load_character_list()
 
@@ -2581,18 +3532,132 @@ class MainWindow(QMainWindow):
         if self.show_message("确认保存", "是否确定要保存修改？", "question"):
             try:
                 # 获取文本内容
-                content = self.dossier_text_edit.toPlainText()
-                file_path = os.path.join(self.characters_dir, f"{current_character}.md")
+                content = self.dossier_text_edit.full_text()
 
-                # 保存到文件
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write(content)
+                # 保存到文件并更新内存中的档案
+                self.dossier_repository.write_character(current_character, content)
+                self.context_retriever.update_document(DOCUMENT_CHARACTER, current_character, content)
+                self.dossier_text_edit.document().setModified(False)
 
                 self.show_message("保存成功", f"角色 '{current_character}' 的档案已保存！", "information")
 
             except Exception as e:
                 self.show_message("保存失败", f"保存档案时出错: {str(e)}", "critical")
 
+    def get_chat_api_settings(self) -> tuple:
+        """当前对话服务商的 (API Key, 端点, 模型)"""
+        chat_provider = self.api_config.get("chat_provider", "硅基流动")
+        provider_key = self.get_provider_key(chat_provider)
+        provider_config = self.api_config.get(provider_key, {})
+
+        if provider_key == "custom":
+            endpoint = provider_config.get("chat_endpoint", "")
+        elif chat_provider == "硅基流动":
+            endpoint = "https://api.siliconflow.cn/v1/chat/completions"
+        elif chat_provider == "豆包":
+            endpoint = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+        elif chat_provider == "Gemini":
+            endpoint = "https://generativelanguage.googleapis.com/v1beta/openai/chat/completions"
+        else:
+            endpoint = ""
+        return provider_config.get("chat_api_key", ""), endpoint, provider_config.get("chat_model", "")
+
+    def schedule_dossier_compaction(self, character_name: str = ""):
+        """把超过大小阈值的角色档案加入后台压缩队列（不指定角色时检查所有档案）"""
+        if not self.api_config.get("dossier_compaction_enabled", False):
+            return
+        threshold = int(self.api_config.get("dossier_compaction_threshold_tokens", 8000))
+        names = [character_name] if character_name else self.dossier_repository.character_names()
+        for name in names:
+            if name in self.compaction_queue:
+                continue
+            content = self.dossier_repository.read_character(name)
+            if content and estimate_tokens(content) > threshold:
+                self.compaction_queue.append(name)
+        self.start_next_dossier_compaction()
+
+    def start_next_dossier_compaction(self):
+        """从队列中取出下一份需要压缩的档案，交给对话模型整理旧记录"""
+        if self.compaction_worker is not None or not self.compaction_queue:
+            return
+
+        api_key, endpoint, model = self.get_chat_api_settings()
+        if not api_key or not endpoint or not model:
+            print("对话API配置不完整，跳过档案压缩")
+            self.compaction_queue.clear()
+            return
+
+        keep_recent = int(self.api_config.get("dossier_compaction_keep_recent", 10))
+        threshold = int(self.api_config.get("dossier_compaction_threshold_tokens", 8000))
+        while self.compaction_queue:
+            name = self.compaction_queue.pop(0)
+            content = self.dossier_repository.read_character(name) or ""
+            plan = plan_compaction(content, keep_recent, threshold,
+                                   int(self.api_config.get("dossier_compaction_min_batch", 5)))
+            if plan is None:
+                continue
+
+            print(f"开始压缩「{name}」的档案：{plan['old_count']} 条旧记录，约 {estimate_tokens(content)} tokens")
+            self.compaction_worker = ChatWorker(build_compaction_prompt(name, plan), api_key, endpoint, model)
+            self.compaction_worker.chat_completed.connect(
+                lambda summary, name=name, content=content, plan=plan:
+                self.on_dossier_compaction_completed(name, content, plan, summary))
+            self.compaction_worker.chat_failed.connect(
+                lambda error, name=name: print(f"压缩「{name}」的档案失败: {error}"))
+            self.compaction_worker.finished.connect(self.on_dossier_compaction_finished)
+            self.compaction_worker.start()
+            return
+
+    def on_dossier_compaction_completed(self, character_name: str, original: str, plan: dict, summary: str):
+        """历史摘要生成完成：存档原文，用摘要替换旧记录并报告节省的 token"""
+        try:
+            current = self.dossier_repository.read_character(character_name)
+            # 整理期间追加的新记录接在压缩结果之后；档案被改写过则放弃本次压缩
+            if current is None or not current.startswith(original):
+                print(f"「{character_name}」的档案在压缩期间被修改，放弃本次压缩")
+                return
+            if (character_name == self.character_combo.currentText() and not self.is_viewing_rumors
+                    and self.dossier_text_edit.document().isModified()):
+                print(f"「{character_name}」的档案有未保存的修改，下次记录时再压缩")
+                return
+            if not summary.strip():
+                print(f"压缩「{character_name}」的档案失败: 对话模型返回了空摘要")
+                return
+
+            version = next_archive_version(self.DOSSIER_ARCHIVE_DIR, character_name)
+            compacted = compose_compacted_dossier(plan, summary, version) + current[len(original):]
+            before_tokens = estimate_tokens(current)
+            after_tokens = estimate_tokens(compacted)
+            if after_tokens >= before_tokens:
+                print(f"「{character_name}」的历史摘要没有比原文更短，放弃本次压缩")
+                return
+
+            archive_path = archive_dossier(self.DOSSIER_ARCHIVE_DIR, character_name, current, version)
+            self.dossier_repository.write_character(character_name, compacted)
+            self.context_retriever.update_document(DOCUMENT_CHARACTER, character_name, compacted)
+
+            saved_tokens = before_tokens - after_tokens
+            self.compaction_saved_tokens += saved_tokens
+            print(f"已压缩「{character_name}」的档案：{plan['old_count']} 条旧记录整理为历史摘要，"
+                  f"约 {before_tokens} → {after_tokens} tokens（每次放入Prompt节省约 {saved_tokens} tokens，"
+                  f"本次运行累计 {self.compaction_saved_tokens}），原文存档于 {archive_path}")
+
+            self.dossier_search_status_label.setText(
+                f"✅ 已压缩「{character_name}」档案，节省约 {saved_tokens} tokens（原文存档 v{version:03d}）")
+            self.dossier_search_status_label.setStyleSheet("color: #4CAF50; margin-left: 10px;")
+            QTimer.singleShot(6000, lambda: self.dossier_search_status_label.setText(""))
+
+            if character_name == self.character_combo.currentText() and not self.is_viewing_rumors:
+                self.on_character_changed(character_name)
+        except Exception as e:
+            print(f"压缩「{character_name}」的档案失败: {str(e)}")
+
+    def on_dossier_compaction_finished(self):
+        """压缩线程结束后继续处理队列中的下一份档案"""
+        self.compaction_worker.wait()
+        self.compaction_worker = None
+        self.start_next_dossier_compaction()
+
     def start_smart_screenshot(self):
         """智能截图统一入口 - 根据当前标签页选择不同的分析模式"""
         if self.is_capturing:
@@ -2617,6 +3682,7 @@ class MainWindow(QMainWindow):
 
             # 记录目标后，执行原有的截图逻辑
             self.is_capturing = True
+            self.capture_request_time = time.perf_counter()
             self.start_screenshot()
 
         except Exception as e:
@@ -2639,8 +3705,7 @@ class MainWindow(QMainWindow):
                 self.show_message("功能提示", "全屏截图功能仅在「速记与整理台」和「抉择辅助」标签页中可用。", "information")
                 return
 
-            screen = QApplication.primaryScreen()
-            full_pixmap = screen.grabWindow(0)
+            full_pixmap, target_geometry = self.grab_capture_target()
 
             if full_pixmap.isNull():
                 print("全屏截图失败，获取的图像为空。")
@@ -2648,27 +3713,182 @@ class MainWindow(QMainWindow):
                 return
 
             self.is_capturing = True
-            self.on_screenshot_completed(full_pixmap, screen.geometry())
+            self.on_screenshot_completed(full_pixmap, target_geometry)
 
         except Exception as e:
             self.is_capturing = False
             self.show_message("错误", f"全屏截图时出错: {str(e)}", "critical")
 
+    def grab_capture_target(self):
+        """按当前截图目标抓取画面，返回 (截图, 全局逻辑坐标区域)"""
+        return grab_capture_target(
+            self.api_config.get("capture_target", CAPTURE_TARGET_PRIMARY),
+            self.api_config.get("capture_window_match", "")
+        )
+
+    def on_capture_target_changed(self, index):
+        """切换截图目标；选择"指定窗口"时询问窗口标题或进程名"""
+        target = self.capture_target_combo.itemText(index)
+
+        if target == CAPTURE_TARGET_WINDOW:
+            ok, window_match = self.prompt_text_input(
+                "指定截图窗口", "请输入游戏窗口标题或进程名（如 game.exe）的关键字:",
+                self.api_config.get("capture_window_match", "")
+            )
+            window_match = window_match.strip()
+            if not ok or not window_match:
+                # 取消时恢复为之前的目标
+                self.capture_target_combo.setCurrentText(self.api_config.get("capture_target", CAPTURE_TARGET_PRIMARY))
+                return
+            self.api_config["capture_window_match"] = window_match
+            self.capture_target_combo.setToolTip(f"截图目标：窗口「{window_match}」")
+        else:
+            self.capture_target_combo.setToolTip(f"截图目标：{target}")
+
+        self.api_config["capture_target"] = target
+        save_api_config(self.api_config)
+        self.refresh_preprocess_ui()
+
+    def capture_preset_region(self):
+        """预设区域截图 - 不弹出遮罩，直接裁剪预设区域或自动识别的对话框区域"""
+        if self.is_capturing:
+            print("捕获已在进行中，忽略此次触发。")
+            return
+        try:
+            current_tab = self.tab_widget.tabText(self.tab_widget.currentIndex())
+            if current_tab == "速记与整理台":
+                self.screenshot_target = "notes"
+            elif current_tab == "抉择辅助":
+                self.screenshot_target = "decision"
+            else:
+                self.show_message("功能提示", "预设区域截图功能仅在「速记与整理台」和「抉择辅助」标签页中可用。", "information")
+                return
+
+            full_pixmap, _ = self.grab_capture_target()
+            if full_pixmap.isNull():
+                print("预设区域截图失败，获取的图像为空。")
+                return
+
+            region_name = self.api_config.get("active_capture_region", self.AUTO_REGION_NAME)
+            cropped_pixmap, logical_rect = self.crop_to_capture_region(full_pixmap, region_name)
+            if cropped_pixmap is None:
+                self.show_message("截图失败", f"预设区域「{region_name}」超出了当前屏幕范围，请重新保存该区域。", "warning")
+                return
+
+            self.is_capturing = True
+            self.on_screenshot_completed(cropped_pixmap, logical_rect)
+
+        except Exception as e:
+            self.is_capturing = False
+            self.show_message("错误", f"预设区域截图时出错: {str(e)}", "critical")
+
+    def crop_to_capture_region(self, full_pixmap: QPixmap, region_name: str, auto_detect: bool = True):
+        """按预设区域裁剪整屏截图
+
+        Args:
+            full_pixmap: 整屏截图
+            region_name: 预设区域名称，非已保存的名称时按自动识别处理
+            auto_detect: 为False时，自动识别模式直接返回整屏
+
+        Returns:
+            tuple: (裁剪后的截图, 逻辑坐标区域)，区域超出屏幕时返回 (None, None)
+        """
+        pixel_ratio = full_pixmap.devicePixelRatio() or 1.0
+        regions = self.api_config.get("capture_regions", {})
+
+        if region_name in regions:
+            # 预设区域以相对于截图目标的逻辑坐标保存，裁剪时换算为物理像素
+            x, y, w, h = regions[region_name]
+            logical_rect = QRect(x, y, w, h)
+            physical_rect = QRect(int(x * pixel_ratio), int(y * pixel_ratio),
+                                  int(w * pixel_ratio), int(h * pixel_ratio))
+        else:
+            physical_rect = detect_dialogue_region(full_pixmap.toImage()) if auto_detect else None
+            if physical_rect is None:
+                if auto_detect:
+                    print("未检测到对话框区域，改用全屏截图。")
+                physical_rect = full_pixmap.rect()
+            logical_rect = QRect(int(physical_rect.x() / pixel_ratio), int(physical_rect.y() / pixel_ratio),
+                                 int(physical_rect.width() / pixel_ratio), int(physical_rect.height() / pixel_ratio))
+
+        physical_rect = physical_rect.intersected(full_pixmap.rect())
+        if physical_rect.isEmpty():
+            return None, None
+
+        cropped_pixmap = full_pixmap.copy(physical_rect)
+        cropped_pixmap.setDevicePixelRatio(pixel_ratio)
+        return cropped_pixmap, logical_rect
+
+    def load_capture_regions_to_ui(self):
+        """刷新预设区域下拉框"""
+        regions = self.api_config.get("capture_regions", {})
+        active_region = self.api_config.get("active_capture_region", self.AUTO_REGION_NAME)
+
+        self.capture_region_combo.blockSignals(True)
+        self.capture_region_combo.clear()
+        self.capture_region_combo.addItem(self.AUTO_REGION_NAME)
+        self.capture_region_combo.addItems(list(regions.keys()))
+        if active_region not in regions:
+            active_region = self.AUTO_REGION_NAME
+        self.capture_region_combo.setCurrentText(active_region)
+        self.capture_region_combo.blockSignals(False)
+
+    def on_capture_region_changed(self, index):
+        """切换 Alt+3 使用的预设区域"""
+        self.api_config["active_capture_region"] = self.capture_region_combo.itemText(index)
+        save_api_config(self.api_config)
+
+    def save_last_capture_region(self):
+        """将最近一次框选的区域保存为命名预设"""
+        if self.last_capture_rect is None:
+            self.show_message("保存区域", "请先使用 Alt+1 框选一次截图区域，再保存为预设。", "information")
+            return
+
+        ok, region_name = self.prompt_text_input("保存截图区域", "请输入预设区域的名称:")
+        region_name = region_name.strip()
+        if not ok or not region_name:
+            return
+        if region_name == self.AUTO_REGION_NAME:
+            self.show_message("保存失败", f"「{self.AUTO_REGION_NAME}」为保留名称，请换一个名称。", "warning")
+            return
+
+        rect = self.last_capture_rect
+        regions = self.api_config.setdefault("capture_regions", {})
+        regions[region_name] = [rect.x(), rect.y(), rect.width(), rect.height()]
+        self.api_config["active_capture_region"] = region_name
+
+        if save_api_config(self.api_config):
+            self.load_capture_regions_to_ui()
+            self.show_message("保存成功", f"预设区域「{region_name}」已保存，按 Alt+3 即可直接截取该区域。", "information")
+        else:
+            self.show_message("保存失败", "无法保存配置文件，请检查文件权限！", "critical")
+
+    def on_snip_region_selected(self, pixmap: QPixmap, rect: QRect):
+        """框选截图完成 - 记录选区后进入统一的截图处理流程"""
+        self.last_capture_rect = QRect(rect)
+        self.on_screenshot_completed(pixmap, rect)
+
     def start_screenshot(self):
-        """开始截图 - 修复版本"""
-        # 完全隐藏主窗口
-        self.hide()
-        self.setWindowState(Qt.WindowState.WindowMinimized)
+        """开始截图 - 主窗口不会出现在截图中时立即抓屏，否则等主窗口真正隐藏后再抓屏"""
+        if self.excluded_from_capture or not self.isVisible() or self.isMinimized():
+            self.capture_and_snip()
+            return
 
-        # 增加延迟时间确保窗口完全消失，包括渐隐动画
-        QTimer.singleShot(500, self.capture_and_snip)
+        # 隐藏主窗口，由 hideEvent 触发抓屏
+        self.waiting_for_hide = True
+        self.hide()
+        if self.waiting_for_hide:
+            # 未收到隐藏事件（例如窗口已处于隐藏过程中），直接进入抓屏流程
+            self.waiting_for_hide = False
+            self.capture_after_hide()
 
     def capture_and_snip(self):
         """捕获屏幕并启动选择工具"""
         try:
-            # 执行屏幕捕获
-            screen = QApplication.primaryScreen()
-            pixmap = screen.grabWindow(0)
+            # 按截图目标执行屏幕捕获
+            grab_start = time.perf_counter()
+            pixmap, target_geometry = self.grab_capture_target()
+            self.capture_grab_ms = (time.perf_counter() - grab_start) * 1000
 
             # 检查pixmap是否有效
             if pixmap.isNull():
@@ -2683,11 +3903,12 @@ class MainWindow(QMainWindow):
                 return
 
             # 创建截图工具实例，传入捕获的图像
-            self.snipping_widget = SnippingWidget(pixmap)
+            self.snipping_widget = SnippingWidget(pixmap, target_geometry)
 
             # 连接信号
-            self.snipping_widget.screenshot_completed.connect(self.on_screenshot_completed)
+            self.snipping_widget.screenshot_completed.connect(self.on_snip_region_selected)
             self.snipping_widget.screenshot_cancelled.connect(self.on_screenshot_cancelled)
+            self.snipping_widget.overlay_painted.connect(self.on_snip_overlay_painted)
 
             # 显示截图窗口
             self.snipping_widget.show()
@@ -2704,6 +3925,15 @@ class MainWindow(QMainWindow):
             QTimer.singleShot(5000, lambda: self.ocr_status_label.setText(""))
             self.is_capturing = False
 
+    def on_snip_overlay_painted(self):
+        """截图遮罩首帧绘制完成 - 统计热键到遮罩显示的延迟"""
+        if self.capture_request_time is None:
+            return
+        latency_ms = (time.perf_counter() - self.capture_request_time) * 1000
+        self.capture_request_time = None
+        print(f"截图延迟: 热键→遮罩显示 {latency_ms:.0f} ms (其中抓屏 {self.capture_grab_ms:.0f} ms)")
+        self.screenshot_button.setToolTip(f"智能截图 (Alt+1)\n上次响应: {latency_ms:.0f} ms")
+
     def on_screenshot_completed(self, pixmap: QPixmap, rect: QRect):
         """处理截图完成事件 - 智能分支版本"""
         self.is_capturing = False
@@ -2738,26 +3968,14 @@ class MainWindow(QMainWindow):
             pixmap.save(filepath, "PNG")
 
             # 检查API配置
-            multimodal_provider = self.api_config.get("multimodal_provider", "硅基流动")
-            provider_key = self.get_provider_key(multimodal_provider)
-            provider_config = self.api_config.get(provider_key, {})
+            multimodal_provider, api_key, endpoint, model = self.get_multimodal_api_settings()
+            ocr_options = self.get_ocr_options()
 
-            api_key = provider_config.get("multimodal_api_key", "")
-            model = provider_config.get("multimodal_model", "")
+            # 速记台使用纯本地OCR时不需要多模态API
+            local_only = (ocr_options["backend"] == OCR_BACKEND_LOCAL and
+                          getattr(self, 'screenshot_target', 'notes') == "notes")
 
-            # 获取端点
-            if provider_key == "custom":
-                endpoint = provider_config.get("multimodal_endpoint", "")
-            elif multimodal_provider == "硅基流动":
-                endpoint = "https://api.siliconflow.cn/v1/chat/completions"
-            elif multimodal_provider == "豆包":
-                endpoint = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
-            elif multimodal_provider == "Gemini":
-                endpoint = "https://generativelanguage.googleapis.com/v1beta/openai/chat/completions"
-            else:
-                endpoint = ""
-
-            if not api_key or not endpoint or not model:
+            if (not api_key or not endpoint or not model) and not local_only:
                 error_msg = f"多模态API配置不完整，请前往【API设置】标签页配置{multimodal_provider}的API Key、端点和模型名称"
 
                 # 根据目标设置错误信息到对应位置
@@ -2782,7 +4000,7 @@ class MainWindow(QMainWindow):
                     self.ocr_status_label.setStyleSheet("color: #FF9800; margin-left: 10px; margin-top: 10px;")
 
                     # 创建并启动OCR工作线程（使用现有的系统Prompt）
-                    self.ocr_worker = OCRWorker(pixmap, api_key, endpoint, model)
+                    self.ocr_worker = OCRWorker(pixmap, api_key, endpoint, model, ocr_options)
                     self.ocr_worker.ocr_completed.connect(self.on_ocr_completed)
                     self.ocr_worker.ocr_failed.connect(self.on_ocr_failed)
                     self.ocr_worker.start()
@@ -2806,7 +4024,7 @@ class MainWindow(QMainWindow):
                 self.ocr_status_label.setText("🔍 正在识别中...")
                 self.ocr_status_label.setStyleSheet("color: #FF9800; margin-left: 10px; margin-top: 10px;")
 
-                self.ocr_worker = OCRWorker(pixmap, api_key, endpoint, model)
+                self.ocr_worker = OCRWorker(pixmap, api_key, endpoint, model, ocr_options)
                 self.ocr_worker.ocr_completed.connect(self.on_ocr_completed)
                 self.ocr_worker.ocr_failed.connect(self.on_ocr_failed)
                 self.ocr_worker.start()
@@ -2829,6 +4047,66 @@ class MainWindow(QMainWindow):
             # 恢复正常光标
             self.setCursor(Qt.CursorShape.ArrowCursor)
 
+    def get_multimodal_api_settings(self) -> tuple:
+        """读取当前多模态API配置
+
+        Returns:
+            tuple: (提供商名称, API Key, 端点, 模型名称)
+        """
+        multimodal_provider = self.api_config.get("multimodal_provider", "硅基流动")
+        provider_key = self.get_provider_key(multimodal_provider)
+        provider_config = self.api_config.get(provider_key, {})
+
+        api_key = provider_config.get("multimodal_api_key", "")
+        model = provider_config.get("multimodal_model", "")
+
+        # 获取端点
+        if provider_key == "custom":
+            endpoint = provider_config.get("multimodal_endpoint", "")
+        elif multimodal_provider == "硅基流动":
+            endpoint = "https://api.siliconflow.cn/v1/chat/completions"
+        elif multimodal_provider == "豆包":
+            endpoint = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+        elif multimodal_provider == "Gemini":
+            endpoint = "https://generativelanguage.googleapis.com/v1beta/openai/chat/completions"
+        else:
+            endpoint = ""
+
+        return multimodal_provider, api_key, endpoint, model
+
+    def get_ocr_options(self) -> dict:
+        """读取截图文字识别引擎的路由配置"""
+        return {
+            "backend": self.api_config.get("ocr_backend", OCR_BACKEND_CLOUD),
+            "lang": self.api_config.get("local_ocr_lang", "chi_sim"),
+            "min_confidence": self.api_config.get("local_ocr_min_confidence", 70),
+            "tesseract_cmd": self.api_config.get("tesseract_cmd", ""),
+            # 超大截图（默认约 600 万像素以上，如 4K 全屏）自动分块并行识别，设为 0 关闭
+            "tiling": {
+                "pixel_threshold": self.api_config.get("ocr_tile_pixel_threshold", 6000000),
+                "tile_size": self.api_config.get("ocr_tile_size", 1600),
+                "overlap": self.api_config.get("ocr_tile_overlap", 160),
+                "max_workers": self.api_config.get("ocr_tile_max_workers", 4)
+            },
+            "preprocess": self.get_preprocess_preset()
+        }
+
+    def get_game_key(self) -> str:
+        """当前游戏的标识：截图目标为指定窗口时使用窗口关键字，否则为「默认」"""
+        if self.api_config.get("capture_target") == CAPTURE_TARGET_WINDOW:
+            return self.api_config.get("capture_window_match", "") or "默认"
+        return "默认"
+
+    def get_preprocess_preset(self) -> str:
+        """读取当前游戏的OCR预处理预设，未单独设置时使用默认预设"""
+        presets = self.api_config.get("ocr_preprocess_presets", {})
+        return presets.get(self.get_game_key(), presets.get("默认", PREPROCESS_NONE))
+
+    def refresh_preprocess_ui(self):
+        """按当前游戏刷新预处理预设下拉框"""
+        self.ocr_preprocess_label.setText(f"截图预处理 ({self.get_game_key()}):")
+        self.ocr_preprocess_combo.setCurrentText(self.get_preprocess_preset())
+
     def on_ocr_completed(self, result: str):
         """OCR识别完成的回调"""
         # 将识别结果显示到文本框
@@ -2853,6 +4131,279 @@ class MainWindow(QMainWindow):
         # 5秒后自动消失
         QTimer.singleShot(5000, lambda: self.ocr_status_label.setText(""))
 
+    # ====== 回溯截图 ======
+    def toggle_retro_buffer(self):
+        """切换回溯缓冲采样"""
+        if self.retro_toggle_button.isChecked():
+            self.start_retro_buffer()
+        else:
+            self.stop_retro_buffer()
+
+    def start_retro_buffer(self):
+        """开始后台采样，帧数由缓冲时长和采样间隔决定，并受内存上限约束"""
+        interval_ms = max(50, int(self.api_config.get("retro_interval_ms", 250)))
+        buffer_seconds = float(self.api_config.get("retro_buffer_seconds", 5.0))
+        capture_seconds = float(self.api_config.get("retro_capture_seconds", 2.0))
+        max_frames = int(max(buffer_seconds, capture_seconds) * 1000 / interval_ms) + 1
+        self.retro_buffer = FrameRingBuffer(
+            max_frames=max_frames,
+            max_bytes=int(self.api_config.get("retro_buffer_mb", 256)) * 1024 * 1024,
+            scale=float(self.api_config.get("retro_scale", 1.0)),
+            # Alt+4 要取 capture_seconds 秒前的画面，至少保留这么多帧（放不下时自动缩小画面）
+            min_frames=int(capture_seconds * 1000 / interval_ms) + 2
+        )
+        self.retro_reported_size = None
+        self.retro_tick_count = 0
+        self.retro_tick_ms_total = 0.0
+        self.retro_timer.start(interval_ms)
+        self.retro_toggle_button.setChecked(True)
+        print(f"回溯缓冲已开启：采样间隔 {interval_ms} ms，最多保留 {buffer_seconds:g} 秒")
+
+    def stop_retro_buffer(self):
+        """停止采样并释放缓冲区内存"""
+        self.retro_timer.stop()
+        self.retro_toggle_button.setChecked(False)
+        if self.retro_buffer:
+            print(f"回溯缓冲已关闭：共采样 {self.retro_buffer.frames_pushed} 帧，"
+                  f"平均采样耗时 {self.retro_tick_ms_total / max(1, self.retro_tick_count):.1f} ms")
+            self.retro_buffer.clear()
+        self.retro_buffer = None
+        self.retro_toggle_button.setToolTip("回溯缓冲：后台保留最近几秒的画面，按 Alt+4 截取数秒前的画面")
+
+    def on_retro_tick(self):
+        """回溯采样定时器回调：抓取一帧写入环形缓冲，并统计采样开销"""
+        if self.is_capturing or self.retro_buffer is None:
+            return
+        tick_start = time.perf_counter()
+        try:
+            pixmap, target_geometry = self.grab_capture_target()
+            if pixmap.isNull():
+                return
+            self.mask_own_window(pixmap, target_geometry)
+            self.retro_buffer.push(pixmap.toImage(), target_geometry)
+        except Exception as e:
+            print(f"回溯采样出错: {str(e)}")
+            return
+        if self.retro_buffer.source_size != self.retro_reported_size:
+            self.report_retro_buffer_fit()
+
+        self.retro_tick_ms_total += (time.perf_counter() - tick_start) * 1000
+        self.retro_tick_count += 1
+        if self.retro_tick_count % 20 != 0:
+            return
+
+        # 每 20 帧检查一次采样开销：占用超过采样间隔的设定比例时自动放慢采样，避免影响游戏帧率
+        average_ms = self.retro_tick_ms_total / self.retro_tick_count
+        interval_ms = self.retro_timer.interval()
+        max_duty = float(self.api_config.get("retro_max_duty", 0.05))
+        if average_ms > interval_ms * max_duty and interval_ms < 2000:
+            new_interval = min(2000, int(interval_ms * 1.5))
+            self.retro_timer.setInterval(new_interval)
+            print(f"回溯采样平均耗时 {average_ms:.1f} ms，超过间隔的 {max_duty:.0%}，采样间隔调整为 {new_interval} ms")
+
+        self.retro_toggle_button.setToolTip(
+            f"回溯缓冲开启中 (Alt+4 截取 {self.api_config.get('retro_capture_seconds', 2.0)} 秒前的画面)\n"
+            f"已缓存 {self.retro_buffer.count}/{self.retro_buffer.capacity} 帧，覆盖 {self.retro_buffer.span_seconds():.1f} 秒，"
+            f"占用 {self.retro_buffer.memory_bytes / 1024 / 1024:.0f} MB\n"
+            f"平均采样耗时 {average_ms:.1f} ms（其中写入缓冲 {self.retro_buffer.average_push_ms:.1f} ms），"
+            f"间隔 {self.retro_timer.interval()} ms"
+        )
+
+    def report_retro_buffer_fit(self):
+        """画面尺寸确定（或变化）后，报告缓冲区是否自动缩小了画面、能否覆盖回溯截图的时长"""
+        buffer = self.retro_buffer
+        self.retro_reported_size = buffer.source_size
+        width, height = buffer.source_size
+        if buffer.effective_scale < buffer.scale:
+            print(f"回溯缓冲：{width}×{height} 的画面按 {buffer.scale:.0%} 缩放放不下 {buffer.min_frames} 帧，"
+                  f"已自动缩小到 {buffer.effective_scale:.0%}")
+        if buffer.capacity < buffer.min_frames:
+            covered = (buffer.capacity - 1) * self.retro_timer.interval() / 1000
+            self.ocr_status_label.setText(
+                f"⚠ 回溯缓冲内存不足，只能保留约 {covered:.1f} 秒的画面，请调大 retro_buffer_mb 或调小 retro_scale")
+            self.ocr_status_label.setStyleSheet("color: #FF9800; margin-left: 10px; margin-top: 10px;")
+            QTimer.singleShot(8000, lambda: self.ocr_status_label.setText(""))
+
+    def capture_retro_frame(self):
+        """回溯截图 - 从环形缓冲中取出数秒前的画面，直接进入截图处理流程"""
+        if self.is_capturing:
+            print("捕获已在进行中，忽略此次触发。")
+            return
+        try:
+            current_tab = self.tab_widget.tabText(self.tab_widget.currentIndex())
+            if current_tab == "速记与整理台":
+                self.screenshot_target = "notes"
+            elif current_tab == "抉择辅助":
+                self.screenshot_target = "decision"
+            else:
+                self.show_message("功能提示", "回溯截图功能仅在「速记与整理台」和「抉择辅助」标签页中可用。", "information")
+                return
+
+            if self.retro_buffer is None or self.retro_buffer.count == 0:
+                self.ocr_status_label.setText("⚠ 回溯缓冲未开启或尚无画面，请先点击工具栏 ⏪ 按钮")
+                self.ocr_status_label.setStyleSheet("color: #FF9800; margin-left: 10px; margin-top: 10px;")
+                QTimer.singleShot(5000, lambda: self.ocr_status_label.setText(""))
+                return
+
+            seconds_ago = float(self.api_config.get("retro_capture_seconds", 2.0))
+            image, target_geometry, age = self.retro_buffer.frame_before(seconds_ago)
+            full_pixmap = QPixmap.fromImage(image)
+            # 让逻辑尺寸与截图区域一致（缓冲区可能是缩小后的帧），以便按预设区域裁剪
+            full_pixmap.setDevicePixelRatio(image.width() / max(1, target_geometry.width()))
+            print(f"回溯截图：使用 {age:.2f} 秒前的画面")
+            retro_notice = ""
+            if age < seconds_ago:
+                # 缓冲区覆盖的时长不够（刚开启或内存受限），实际取到的画面比设定的更新
+                retro_notice = f"⚠ 回溯缓冲只覆盖 {age:.1f} 秒，使用的是 {age:.1f} 秒前（而非 {seconds_ago:g} 秒前）的画面"
+
+            # 选择了命名预设区域时只取该区域，否则使用整帧
+            region_name = self.api_config.get("active_capture_region", self.AUTO_REGION_NAME)
+            pixmap, logical_rect = self.crop_to_capture_region(full_pixmap, region_name, auto_detect=False)
+            if pixmap is None:
+                pixmap, logical_rect = full_pixmap, QRect(0, 0, target_geometry.width(), target_geometry.height())
+
+            self.is_capturing = True
+            self.on_screenshot_completed(pixmap, logical_rect)
+            if retro_notice:
+                self.ocr_status_label.setText(retro_notice)
+                self.ocr_status_label.setStyleSheet("color: #FF9800; margin-left: 10px; margin-top: 10px;")
+                QTimer.singleShot(5000, lambda: self.ocr_status_label.setText(""))
+
+        except Exception as e:
+            self.is_capturing = False
+            self.show_message("错误", f"回溯截图时出错: {str(e)}", "critical")
+
+    # ====== 监视模式 ======
+    def toggle_watch_mode(self):
+        """切换监视模式"""
+        if self.watch_toggle_button.isChecked():
+            self.start_watch_mode()
+        else:
+            self.stop_watch_mode()
+
+    def start_watch_mode(self):
+        """开始监视屏幕（或当前预设区域）"""
+        _, api_key, endpoint, model = self.get_multimodal_api_settings()
+        local_only = self.get_ocr_options()["backend"] == OCR_BACKEND_LOCAL
+        if (not api_key or not endpoint or not model) and not local_only:
+            self.watch_toggle_button.setChecked(False)
+            self.show_message("配置不完整", "监视模式需要多模态API，请先在【API设置】中完成配置。", "warning")
+            return
+
+        self.watch_detector = FrameChangeDetector(
+            change_ratio=float(self.api_config.get("watch_change_ratio", 0.003)),
+            settle_frames=int(self.api_config.get("watch_settle_frames", 2))
+        )
+        self.watch_pending_pixmap = None
+        self.last_watch_result = ""
+
+        interval_ms = max(100, int(self.api_config.get("watch_interval_ms", 500)))
+        self.watch_timer.start(interval_ms)
+        self.update_watch_status()
+        print(f"监视模式已开启，采样间隔 {interval_ms} ms")
+
+    def stop_watch_mode(self):
+        """停止监视"""
+        self.watch_timer.stop()
+        self.watch_pending_pixmap = None
+        self.watch_toggle_button.setChecked(False)
+        if self.watch_detector:
+            print(f"监视模式已关闭：共检测 {self.watch_detector.frames_seen} 帧，提交识别 {self.watch_detector.frames_submitted} 次")
+        self.watch_status_label.setText("")
+
+    def update_watch_status(self):
+        """刷新监视模式状态标签"""
+        if not self.watch_detector:
+            return
+        self.watch_status_label.setText(
+            f"👁 监视中：已检测 {self.watch_detector.frames_seen} 帧 | 识别 {self.watch_detector.frames_submitted} 次"
+        )
+
+    def mask_own_window(self, pixmap: QPixmap, origin: QRect):
+        """将截图中本程序主窗口所在区域涂黑，避免识别结果刷新后又触发画面变化
+
+        Args:
+            pixmap: 待处理的截图
+            origin: 截图对应的全局逻辑坐标区域
+        """
+        if self.excluded_from_capture or not self.isVisible() or self.isMinimized():
+            return
+        own_rect = self.frameGeometry().translated(-origin.x(), -origin.y())
+        own_rect = own_rect.intersected(QRect(0, 0, origin.width(), origin.height()))
+        if own_rect.isEmpty():
+            return
+        painter = QPainter(pixmap)
+        painter.fillRect(own_rect, Qt.GlobalColor.black)
+        painter.end()
+
+    def on_watch_tick(self):
+        """监视定时器回调：抓取一帧并判断是否需要识别"""
+        if self.is_capturing:
+            # 手动截图进行中，暂停采样
+            return
+        try:
+            full_pixmap, target_geometry = self.grab_capture_target()
+            if full_pixmap.isNull():
+                return
+
+            # 监视模式不做逐帧自动识别对话框（检测结果抖动会被误判为画面变化），
+            # 选择了命名预设时只监视该区域，否则监视整屏
+            region_name = self.api_config.get("active_capture_region", self.AUTO_REGION_NAME)
+            frame, logical_rect = self.crop_to_capture_region(full_pixmap, region_name, auto_detect=False)
+            if frame is None:
+                return
+            self.mask_own_window(frame, logical_rect.translated(target_geometry.topLeft()))
+
+            if self.watch_detector.feed(frame.toImage()):
+                self.submit_watch_frame(frame)
+            self.update_watch_status()
+
+        except Exception as e:
+            print(f"监视模式采样失败: {str(e)}")
+
+    def submit_watch_frame(self, pixmap: QPixmap):
+        """提交一帧稳定画面进行识别；识别进行中时只保留最新的一帧"""
+        if self.watch_ocr_worker and self.watch_ocr_worker.isRunning():
+            self.watch_pending_pixmap = pixmap
+            return
+
+        _, api_key, endpoint, model = self.get_multimodal_api_settings()
+        self.watch_ocr_worker = OCRWorker(pixmap, api_key, endpoint, model, self.get_ocr_options())
+        self.watch_ocr_worker.ocr_completed.connect(self.on_watch_ocr_completed)
+        self.watch_ocr_worker.ocr_failed.connect(self.on_watch_ocr_failed)
+        self.watch_ocr_worker.finished.connect(self.on_watch_ocr_finished)
+        self.watch_ocr_worker.start()
+
+    def on_watch_ocr_finished(self):
+        """监视识别线程结束后，继续处理排队中的最新画面"""
+        if self.watch_pending_pixmap is not None and self.watch_timer.isActive():
+            pixmap = self.watch_pending_pixmap
+            self.watch_pending_pixmap = None
+            self.submit_watch_frame(pixmap)
+
+    def on_watch_ocr_completed(self, result: str):
+        """监视识别完成：将新结果追加到截图识别结果末尾"""
+        result = result.strip()
+        if not result or result == self.last_watch_result:
+            return
+        self.last_watch_result = result
+
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        separator = "\n\n" if self.ocr_result_text.toPlainText().strip() else ""
+
+        cursor = self.ocr_result_text.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(f"{separator}[{timestamp}]\n{result}")
+        self.ocr_result_text.setTextCursor(cursor)
+        self.ocr_result_text.ensureCursorVisible()
+
+    def on_watch_ocr_failed(self, error_message: str):
+        """监视识别失败：仅提示，不中断监视"""
+        print(f"监视模式识别失败: {error_message}")
+        self.ocr_status_label.setText("❌ 监视识别失败")
+        self.ocr_status_label.setStyleSheet("color: #F44336; margin-left: 10px; margin-top: 10px;")
+        QTimer.singleShot(5000, lambda: self.ocr_status_label.setText(""))
+
     def on_screenshot_cancelled(self):
         """处理截图取消事件"""
         self.is_capturing = False
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+屏幕捕获模块
+按截图目标（主屏幕 / 鼠标所在屏幕 / 全部屏幕 / 指定窗口）抓取画面
+"""
+
+import os
+import sys
+import ctypes
+from typing import Optional, Tuple
+
+from PyQt6.QtCore import QRect
+from PyQt6.QtGui import QGuiApplication, QCursor, QPixmap, QPainter, QColor
+
+
+# 截图目标
+CAPTURE_TARGET_PRIMARY = "主屏幕"
+CAPTURE_TARGET_CURSOR = "鼠标所在屏幕"
+CAPTURE_TARGET_VIRTUAL = "全部屏幕"
+CAPTURE_TARGET_WINDOW = "指定窗口"
+CAPTURE_TARGETS = [CAPTURE_TARGET_PRIMARY, CAPTURE_TARGET_CURSOR, CAPTURE_TARGET_VIRTUAL, CAPTURE_TARGET_WINDOW]
+
+
+def _get_process_name(hwnd) -> str:
+    """获取窗口所属进程的可执行文件名 (Windows)"""
+    from ctypes import wintypes
+
+    user32 = ctypes.windll.user32
+    kernel32 = ctypes.windll.kernel32
+
+    pid = wintypes.DWORD()
+    user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+    if not handle:
+        return ""
+    try:
+        buffer = ctypes.create_unicode_buffer(260)
+        size = wintypes.DWORD(len(buffer))
+        if kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+            return os.path.basename(buffer.value)
+        return ""
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _find_window_native_rect(match: str) -> Optional[QRect]:
+    """
+    按标题或进程名查找第一个可见窗口，返回其物理像素区域 (Windows)
+
+    标题包含关键字，或进程名（如 game.exe）包含关键字均视为匹配，不区分大小写。
+    """
+    from ctypes import wintypes
+
+    user32 = ctypes.windll.user32
+    dwmapi = ctypes.windll.dwmapi
+    match_lower = match.lower()
+    own_pid = os.getpid()
+    found = []
+
+    EnumWindowsProc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+
+    def _callback(hwnd, _lparam):
+        if not user32.IsWindowVisible(hwnd) or user32.IsIconic(hwnd):
+            return True
+
+        pid = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        if pid.value == own_pid:
+            return True
+
+        length = user32.GetWindowTextLengthW(hwnd)
+        title_buffer = ctypes.create_unicode_buffer(length + 1)
+        user32.GetWindowTextW(hwnd, title_buffer, length + 1)
+        title = title_buffer.value
+
+        if match_lower not in title.lower() and match_lower not in _get_process_name(hwnd).lower():
+            return True
+
+        # 优先使用 DWM 扩展边框（不含不可见的缩放边框），失败时回退到 GetWindowRect
+        rect = wintypes.RECT()
+        DWMWA_EXTENDED_FRAME_BOUNDS = 9
+        if dwmapi.DwmGetWindowAttribute(hwnd, DWMWA_EXTENDED_FRAME_BOUNDS,
+                                        ctypes.byref(rect), ctypes.sizeof(rect)) != 0:
+            user32.GetWindowRect(hwnd, ctypes.byref(rect))
+
+        if rect.right - rect.left > 0 and rect.bottom - rect.top > 0:
+            found.append(QRect(rect.left, rect.top, rect.right - rect.left, rect.bottom - rect.top))
+            return False
+        return True
+
+    user32.EnumWindows(EnumWindowsProc(_callback), 0)
+    return found[0] if found else None
+
+
+def _native_to_logical(native_rect: QRect) -> QRect:
+    """将物理像素坐标换算为 Qt 逻辑坐标（Qt 在 Windows 上保留各屏幕的原点，只缩放尺寸）"""
+    for screen in QGuiApplication.screens():
+        geometry = screen.geometry()
+        ratio = screen.devicePixelRatio() or 1.0
+        native_geometry = QRect(geometry.x(), geometry.y(),
+                                int(geometry.width() * ratio), int(geometry.height() * ratio))
+        if native_geometry.contains(native_rect.center()):
+            return QRect(geometry.x() + int((native_rect.x() - geometry.x()) / ratio),
+                         geometry.y() + int((native_rect.y() - geometry.y()) / ratio),
+                         int(native_rect.width() / ratio), int(native_rect.height() / ratio))
+    return native_rect
+
+
+def find_window_geometry(match: str) -> Optional[QRect]:
+    """按标题或进程名查找窗口，返回其逻辑坐标区域；非Windows平台或未找到时返回None"""
+    if not match or sys.platform != "win32":
+        return None
+    try:
+        native_rect = _find_window_native_rect(match)
+    except Exception as e:
+        print(f"查找窗口失败: {str(e)}")
+        return None
+    return _native_to_logical(native_rect) if native_rect else None
+
+
+def _grab_area(screen, area: QRect) -> QPixmap:
+    """抓取单个屏幕，并裁剪出其中的逻辑区域"""
+    pixmap = screen.grabWindow(0)
+    ratio = pixmap.devicePixelRatio() or 1.0
+    local = area.translated(-screen.geometry().x(), -screen.geometry().y())
+    physical = QRect(int(local.x() * ratio), int(local.y() * ratio),
+                     int(local.width() * ratio), int(local.height() * ratio))
+    cropped = pixmap.copy(physical.intersected(pixmap.rect()))
+    cropped.setDevicePixelRatio(ratio)
+    return cropped
+
+
+def _grab_virtual_desktop() -> Tuple[QPixmap, QRect]:
+    """抓取所有屏幕并拼接为一张图（按最高缩放比例绘制，避免高DPI屏幕损失清晰度）"""
+    screens = QGuiApplication.screens()
+    virtual_geometry = QRect()
+    for screen in screens:
+        virtual_geometry = virtual_geometry.united(screen.geometry())
+    ratio = max(screen.devicePixelRatio() for screen in screens) or 1.0
+
+    canvas = QPixmap(int(virtual_geometry.width() * ratio), int(virtual_geometry.height() * ratio))
+    canvas.setDevicePixelRatio(ratio)
+    canvas.fill(QColor(0, 0, 0))
+
+    painter = QPainter(canvas)
+    for screen in screens:
+        target = screen.geometry().translated(-virtual_geometry.x(), -virtual_geometry.y())
+        painter.drawPixmap(target, screen.grabWindow(0))
+    painter.end()
+    return canvas, virtual_geometry
+
+
+def grab_capture_target(target: str, window_match: str = "") -> Tuple[QPixmap, QRect]:
+    """
+    按截图目标抓取画面
+
+    Args:
+        target: CAPTURE_TARGETS 中的一项
+        window_match: target 为"指定窗口"时用于匹配的窗口标题或进程名
+
+    Returns:
+        tuple: (截图, 截图区域的全局逻辑坐标)
+               指定窗口未找到时回退到鼠标所在屏幕
+    """
+    if target == CAPTURE_TARGET_VIRTUAL and len(QGuiApplication.screens()) > 1:
+        return _grab_virtual_desktop()
+
+    if target == CAPTURE_TARGET_WINDOW:
+        window_geometry = find_window_geometry(window_match)
+        if window_geometry is not None:
+            screen = QGuiApplication.screenAt(window_geometry.center()) or QGuiApplication.primaryScreen()
+            area = window_geometry.intersected(screen.geometry())
+            if not area.isEmpty():
+                return _grab_area(screen, area), area
+        print(f"未找到匹配「{window_match}」的窗口，改为截取鼠标所在屏幕。")
+        target = CAPTURE_TARGET_CURSOR
+
+    screen = QGuiApplication.primaryScreen()
+    if target == CAPTURE_TARGET_CURSOR:
+        screen = QGuiApplication.screenAt(QCursor.pos()) or screen
+
+    return screen.grabWindow(0), screen.geometry()
+
+
+def exclude_window_from_capture(win_id) -> bool:
+    """
+    让窗口不出现在屏幕截图中 (Windows 10 2004 及以上)，同时关闭窗口显示/隐藏动画
+
+    Returns:
+        bool: 是否成功排除；失败时调用方需要在截图前隐藏窗口
+    """
+    if sys.platform != "win32":
+        return False
+    try:
+        hwnd = ctypes.c_void_p(int(win_id))
+
+        # 关闭 DWM 过渡动画，窗口隐藏时立即从画面中消失
+        DWMWA_TRANSITIONS_FORCEDISABLED = 3
+        disabled = ctypes.c_int(1)
+        ctypes.windll.dwmapi.DwmSetWindowAttribute(hwnd, DWMWA_TRANSITIONS_FORCEDISABLED,
+                                                   ctypes.byref(disabled), ctypes.sizeof(disabled))
+
+        WDA_EXCLUDEFROMCAPTURE = 0x11
+        return bool(ctypes.windll.user32.SetWindowDisplayAffinity(hwnd, WDA_EXCLUDEFROMCAPTURE))
+    except Exception as e:
+        print(f"设置截图排除失败: {str(e)}")
+        return False
+
+
+def wait_for_compositor() -> bool:
+    """
+    阻塞到桌面合成器完成下一帧 (Windows DwmFlush)，确保刚隐藏的窗口已从屏幕画面中移除
+
+    Returns:
+        bool: 是否成功等待；非Windows平台或合成器不可用时返回False
+    """
+    if sys.platform != "win32":
+        return False
+    try:
+        return ctypes.windll.dwmapi.DwmFlush() == 0
+    except Exception:
+        return False
@@ -7,7 +7,7 @@
 
 from PyQt6.QtWidgets import QWidget, QApplication
 from PyQt6.QtCore import Qt, QRect, pyqtSignal
-from PyQt6.QtGui import QPainter, QPen, QColor, QPixmap
+from PyQt6.QtGui import QPainter, QPen, QColor, QPixmap, QRegion
 
 
 class SnippingWidget(QWidget):
@@ -16,17 +16,41 @@ class SnippingWidget(QWidget):
     # 自定义信号，当截图区域选择完成时发射
     screenshot_completed = pyqtSignal(QPixmap, QRect)  # 发射截图和区域信息
     screenshot_cancelled = pyqtSignal()  # 取消截图信号
+    overlay_painted = pyqtSignal()  # 遮罩首次绘制完成（用于统计热键响应延迟）
 
-    def __init__(self, screen_pixmap):
-        """初始化截图工具，接受已捕获的屏幕图像"""
+    def __init__(self, screen_pixmap, target_geometry=None):
+        """初始化截图工具，接受已捕获的屏幕图像
+
+        Args:
+            screen_pixmap: 已捕获的图像
+            target_geometry: 图像对应的全局逻辑坐标区域（某个屏幕、窗口或整个虚拟桌面），
+                             默认为主屏幕
+        """
         super().__init__()
         self.screen_pixmap = screen_pixmap  # 保存传入的屏幕截图
+        self.target_geometry = target_geometry
         self.start_point = None
         self.end_point = None
         self.is_selecting = False
+        self.has_painted = False
+
+        # 预先渲染一次带半透明遮罩的背景，拖动选区时只需局部贴图
+        self.dimmed_pixmap = self.create_dimmed_pixmap(screen_pixmap)
 
         self.init_ui()
 
+    @staticmethod
+    def create_dimmed_pixmap(screen_pixmap):
+        """生成叠加了半透明黑色遮罩的背景图（保持原图的物理像素和DPI比例）"""
+        if not screen_pixmap or screen_pixmap.isNull():
+            return screen_pixmap
+        dimmed = screen_pixmap.copy()
+        dimmed.setDevicePixelRatio(screen_pixmap.devicePixelRatio())
+        painter = QPainter(dimmed)
+        painter.fillRect(dimmed.rect(), QColor(0, 0, 0, 100))
+        painter.end()
+        return dimmed
+
     def init_ui(self):
         """初始化用户界面"""
         # 设置窗口属性
@@ -36,13 +60,15 @@ class SnippingWidget(QWidget):
         )
 
         # 设置窗口属性
-        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        # 背景图完全不透明，无需半透明窗口合成，也无需Qt预先擦除背景
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
         self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
 
-        # 设置为全屏
-        screen = QApplication.primaryScreen()
-        screen_geometry = screen.geometry()
-        self.setGeometry(screen_geometry)
+        # 覆盖截图目标所在的区域（默认主屏幕全屏）
+        if self.target_geometry is not None:
+            self.setGeometry(self.target_geometry)
+        else:
+            self.setGeometry(QApplication.primaryScreen().geometry())
 
         # 设置鼠标和键盘追踪
         self.setMouseTracking(True)
@@ -54,16 +80,65 @@ class SnippingWidget(QWidget):
     def mousePressEvent(self, event):
         """鼠标按下事件"""
         if event.button() == Qt.MouseButton.LeftButton:
+            old_region = self.selection_dirty_region()
             self.start_point = event.pos()
             self.end_point = event.pos()
             self.is_selecting = True
-            self.update()
+            self.update(old_region.united(self.selection_dirty_region()))
 
     def mouseMoveEvent(self, event):
-        """鼠标移动事件"""
+        """鼠标移动事件 - 只重绘新旧选区（含边框与尺寸标签）的并集"""
         if self.is_selecting and self.start_point:
+            old_region = self.selection_dirty_region()
             self.end_point = event.pos()
-            self.update()
+            self.update(old_region.united(self.selection_dirty_region()))
+
+    def pixel_ratio(self):
+        """截图的DPI缩放比例"""
+        pixel_ratio = self.screen_pixmap.devicePixelRatio() if self.screen_pixmap else 1.0
+        return pixel_ratio or 1.0
+
+    def to_physical_rect(self, logical_rect):
+        """将逻辑像素区域换算为截图中的物理像素区域"""
+        pixel_ratio = self.pixel_ratio()
+        return QRect(
+            int(logical_rect.x() * pixel_ratio),
+            int(logical_rect.y() * pixel_ratio),
+            int(logical_rect.width() * pixel_ratio),
+            int(logical_rect.height() * pixel_ratio)
+        )
+
+    def selection_rect(self):
+        """当前选区（逻辑像素），未在选择时返回空区域"""
+        if self.is_selecting and self.start_point and self.end_point:
+            return QRect(self.start_point, self.end_point).normalized()
+        return QRect()
+
+    def size_label_rect(self, logical_rect):
+        """尺寸标签背景框的位置；选区太小不显示标签时返回空区域"""
+        if logical_rect.width() <= 30 or logical_rect.height() <= 15:
+            return QRect()
+
+        size_text = f"{logical_rect.width()} × {logical_rect.height()}"
+        text_x = logical_rect.x() + 8
+        text_y = logical_rect.y() - 25
+        if text_y < 10:
+            text_y = logical_rect.y() + 20
+
+        text_rect = self.fontMetrics().boundingRect(size_text)
+        return QRect(text_x - 4, text_y - text_rect.height() + 2,
+                     text_rect.width() + 8, text_rect.height() + 4)
+
+    def selection_dirty_region(self):
+        """当前选区需要重绘的范围：选区 + 边框线宽 + 尺寸标签"""
+        logical_rect = self.selection_rect()
+        if logical_rect.isNull():
+            return QRegion()
+        region = QRegion(logical_rect.adjusted(-3, -3, 3, 3))
+        label_rect = self.size_label_rect(logical_rect)
+        if not label_rect.isNull():
+            region = region.united(QRegion(label_rect.adjusted(-2, -2, 2, 2)))
+        return region
 
     def mouseReleaseEvent(self, event):
         """鼠标松开事件"""
@@ -85,17 +160,10 @@ class SnippingWidget(QWidget):
 
             # 2. 获取屏幕的缩放比例 (例如 1.0, 1.5, 2.0)
             # screen_pixmap 是通过 grabWindow 捕获的，它知道自己来源屏幕的DPI信息
-            pixel_ratio = self.screen_pixmap.devicePixelRatio()
-            if not pixel_ratio:  # 安全回退
-                pixel_ratio = 1.0
+            pixel_ratio = self.pixel_ratio()
 
             # 3. 将"逻辑"坐标乘以缩放比例，得到"物理"像素坐标
-            physical_rect = QRect(
-                int(logical_rect.x() * pixel_ratio),
-                int(logical_rect.y() * pixel_ratio),
-                int(logical_rect.width() * pixel_ratio),
-                int(logical_rect.height() * pixel_ratio)
-            )
+            physical_rect = self.to_physical_rect(logical_rect)
 
             # 4. 裁剪时，使用修正后的"物理"坐标
             if logical_rect.width() > 5 and logical_rect.height() > 5:
@@ -120,64 +188,49 @@ class SnippingWidget(QWidget):
         self.close()
 
     def paintEvent(self, event):
-        """绘制事件 - 修复了高DPI下的预览问题"""
-        painter = QPainter(self)
-
+        """绘制事件 - 只重绘脏区域，背景遮罩已预先渲染"""
+        try:
+            self.paint_overlay(event)
+        finally:
+            # 首帧绘制完成后通知外部（用于统计热键到遮罩出现的延迟）
+            if not self.has_painted and self.screen_pixmap:
+                self.has_painted = True
+                self.overlay_painted.emit()
+
+    def paint_overlay(self, event):
+        """绘制遮罩背景、选区和尺寸信息"""
         if not self.screen_pixmap:
             return
 
-        # 1. 将完整的物理像素图绘制到逻辑像素的窗口上
-        # PyQt 会自动处理这里的缩放
-        painter.drawPixmap(self.rect(), self.screen_pixmap)
+        painter = QPainter(self)
+        dirty_rect = event.rect()
 
-        # 2. 绘制半透明黑色遮罩，覆盖整个屏幕
-        painter.fillRect(self.rect(), QColor(0, 0, 0, 100))
+        # 1. 从预渲染的遮罩背景中贴出脏区域（逻辑坐标 -> 物理像素源区域）
+        painter.drawPixmap(dirty_rect, self.dimmed_pixmap, self.to_physical_rect(dirty_rect))
 
         # 如果正在选择，处理选择区域
-        if self.is_selecting and self.start_point and self.end_point:
-            # 3. 获取"逻辑像素"单位的选择框
-            logical_rect = QRect(self.start_point, self.end_point).normalized()
+        logical_rect = self.selection_rect()
+        if logical_rect.isNull():
+            return
 
-            # 4. 获取DPI缩放比例
-            pixel_ratio = self.screen_pixmap.devicePixelRatio()
-            if not pixel_ratio:
-                pixel_ratio = 1.0
-
-            # 5. 计算出需要从源图 (物理像素) 中裁剪的区域
-            physical_source_rect = QRect(
-                int(logical_rect.x() * pixel_ratio),
-                int(logical_rect.y() * pixel_ratio),
-                int(logical_rect.width() * pixel_ratio),
-                int(logical_rect.height() * pixel_ratio)
-            )
-
-            # 6. 将物理像素的源区域，绘制到逻辑像素的目标区域
-            # 这会"擦除"掉选区内的黑色遮罩，并正确显示预览
-            painter.drawPixmap(logical_rect, self.screen_pixmap, physical_source_rect)
-
-            # 7. 绘制选择框边框 (使用逻辑坐标)
-            pen = QPen(QColor(0, 120, 215), 3)
-            painter.setPen(pen)
-            painter.setBrush(Qt.BrushStyle.NoBrush)
-            painter.drawRect(logical_rect)
-
-            # 8. 绘制尺寸信息 (使用逻辑坐标)
-            if logical_rect.width() > 30 and logical_rect.height() > 15:
-                size_text = f"{logical_rect.width()} × {logical_rect.height()}"
-
-                text_x = logical_rect.x() + 8
-                text_y = logical_rect.y() - 25
-
-                if text_y < 10:
-                    text_y = logical_rect.y() + 20
-
-                text_rect = painter.fontMetrics().boundingRect(size_text)
-                bg_rect = QRect(text_x - 4, text_y - text_rect.height() + 2,
-                               text_rect.width() + 8, text_rect.height() + 4)
-
-                painter.fillRect(bg_rect, QColor(255, 255, 255, 220))
-                painter.setPen(QColor(0, 0, 0))
-                painter.drawText(text_x, text_y, size_text)
+        # 2. 选区内显示原图（"擦除"遮罩），只绘制与脏区域相交的部分
+        visible_rect = logical_rect.intersected(dirty_rect)
+        if not visible_rect.isEmpty():
+            painter.drawPixmap(visible_rect, self.screen_pixmap, self.to_physical_rect(visible_rect))
+
+        # 3. 绘制选择框边框 (使用逻辑坐标)
+        pen = QPen(QColor(0, 120, 215), 3)
+        painter.setPen(pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawRect(logical_rect)
+
+        # 4. 绘制尺寸信息 (使用逻辑坐标)
+        bg_rect = self.size_label_rect(logical_rect)
+        if not bg_rect.isNull() and bg_rect.intersects(dirty_rect):
+            size_text = f"{logical_rect.width()} × {logical_rect.height()}"
+            painter.fillRect(bg_rect, QColor(255, 255, 255, 220))
+            painter.setPen(QColor(0, 0, 0))
+            painter.drawText(bg_rect.x() + 4, bg_rect.bottom() - 5, size_text)
 
     def closeEvent(self, event):
         """窗口关闭事件"""